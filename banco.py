@@ -0,0 +1,250 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import registro
+
+
+DB_PATH = os.environ.get('RESERVAS_DB', 'reservas.db')
+POOL_TAMANHO = int(os.environ.get('RESERVAS_POOL_TAMANHO', '8'))
+POOL_ESPERA = float(os.environ.get('RESERVAS_POOL_ESPERA', '5'))
+TRANSACAO_TENTATIVAS = int(os.environ.get('RESERVAS_TRANSACAO_TENTATIVAS', '6'))
+TRANSACAO_ESPERA_BASE = float(os.environ.get('RESERVAS_TRANSACAO_ESPERA_BASE', '0.01'))
+PERFIL = os.environ.get('RESERVAS_PERFIL', 'wal')
+CHECKPOINT_INTERVALO = float(os.environ.get('RESERVAS_CHECKPOINT_INTERVALO', '30'))
+WAL_LIMITE_PAGINAS = int(os.environ.get('RESERVAS_WAL_LIMITE_PAGINAS', '4000'))
+# Quanto o checkpoint TRUNCATE espera pelos leitores; enquanto espera, segura as escritas
+CHECKPOINT_TRUNCATE_ESPERA_MS = 200
+
+log = registro.obter('banco')
+
+# Perfis de armazenamento: PRAGMAs aplicados a cada conexão aberta pelo pool.
+# 'wal' deixa leitores e o escritor trabalharem em paralelo. O checkpoint fica
+# a cargo da thread de fundo do pool; wal_autocheckpoint só entra se o WAL
+# passar de WAL_LIMITE_PAGINAS (a thread parada ou atrasada), e aí o commit
+# que cruzou o limite paga um checkpoint. 'padrao' mantém o journal de
+# rollback do SQLite.
+PERFIS_ARMAZENAMENTO = {
+    'padrao': {
+        'journal_mode': 'DELETE',
+        'busy_timeout': 5000,
+    },
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': WAL_LIMITE_PAGINAS,
+    },
+}
+
+
+class PoolEsgotado(Exception):
+    pass
+
+
+class PoolConexoes:
+    """
+    Pool limitado de conexões SQLite reaproveitadas entre requisições.
+
+    A preparação do esquema roda uma única vez, antes da primeira conexão
+    ser entregue; depois disso obter() só devolve conexões já abertas.
+    fabrica é a classe das conexões (o factory de sqlite3.connect).
+    """
+
+    def __init__(self, caminho=DB_PATH, tamanho=POOL_TAMANHO, espera=POOL_ESPERA, preparar=None,
+                 perfil=PERFIL, checkpoint_intervalo=CHECKPOINT_INTERVALO, fabrica=sqlite3.Connection,
+                 wal_limite=WAL_LIMITE_PAGINAS):
+        if perfil not in PERFIS_ARMAZENAMENTO:
+            raise ValueError(f'Perfil de armazenamento desconhecido: {perfil}')
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.espera = espera
+        self.perfil = perfil
+        self.checkpoint_intervalo = checkpoint_intervalo
+        self.fabrica = fabrica
+        self.wal_limite = wal_limite
+        self._pragmas = dict(PERFIS_ARMAZENAMENTO[perfil])
+        if 'wal_autocheckpoint' in self._pragmas:
+            self._pragmas['wal_autocheckpoint'] = wal_limite
+        self._preparar = preparar
+        self._parar_checkpoints = threading.Event()
+        self._thread_checkpoints = None
+        self._preparado = False
+        self._livres = queue.LifoQueue()
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._estatisticas = {
+            'hits': 0, 'esperas': 0, 'abertas': 0, 'timeouts': 0,
+            'checkpoints': 0, 'checkpoints_truncate': 0, 'checkpoints_truncate_ocupado': 0,
+        }
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.caminho, check_same_thread=False, factory=self.fabrica)
+        conn.row_factory = sqlite3.Row
+        for pragma, valor in self._pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {valor}')
+        return conn
+
+    def abrir_dedicada(self):
+        """Conexão fora do pool, com os mesmos PRAGMAs, para uso exclusivo de uma thread de fundo."""
+        return self._abrir()
+
+    def _checkpoint(self, conn):
+        """
+        Checkpoint PASSIVE, que não espera ninguém. Se o WAL continuar acima de
+        wal_limite páginas (leitores em sequência impedem que ele recomece do
+        início), um TRUNCATE espera até CHECKPOINT_TRUNCATE_ESPERA_MS que os
+        leitores em andamento terminem, copia o resto e zera o arquivo.
+        """
+        _, paginas, _ = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        self._contar('checkpoints')
+        if paginas <= self.wal_limite:
+            return
+        conn.execute(f'PRAGMA busy_timeout = {CHECKPOINT_TRUNCATE_ESPERA_MS}')
+        try:
+            ocupado, _, _ = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {self._pragmas['busy_timeout']}")
+        self._contar('checkpoints_truncate' if not ocupado else 'checkpoints_truncate_ocupado')
+
+    def _executar_checkpoints(self):
+        conn = self._abrir()
+        try:
+            while not self._parar_checkpoints.wait(self.checkpoint_intervalo):
+                try:
+                    self._checkpoint(conn)
+                except sqlite3.Error as e:
+                    log.error('Checkpoint do WAL falhou: %s', e)
+        finally:
+            conn.close()
+
+    def _iniciar_checkpoints(self):
+        if self._pragmas.get('journal_mode') != 'WAL' or self.checkpoint_intervalo <= 0:
+            return
+        self._thread_checkpoints = threading.Thread(
+            target=self._executar_checkpoints, name='checkpoint-wal', daemon=True
+        )
+        self._thread_checkpoints.start()
+
+    def _contar(self, chave):
+        with self._lock:
+            self._estatisticas[chave] += 1
+
+    def preparar(self):
+        if self._preparado:
+            return
+        with self._lock:
+            if self._preparado:
+                return
+            if self._preparar:
+                conn = self._abrir()
+                try:
+                    self._preparar(conn)
+                finally:
+                    conn.close()
+            self._iniciar_checkpoints()
+            self._preparado = True
+
+    def obter(self):
+        self.preparar()
+
+        try:
+            conn = self._livres.get_nowait()
+            self._contar('hits')
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            pode_abrir = self._abertas < self.tamanho
+            if pode_abrir:
+                self._abertas += 1
+                self._estatisticas['abertas'] += 1
+
+        if pode_abrir:
+            try:
+                return self._abrir()
+            except Exception:
+                with self._lock:
+                    self._abertas -= 1
+                raise
+
+        self._contar('esperas')
+        try:
+            return self._livres.get(timeout=self.espera)
+        except queue.Empty:
+            self._contar('timeouts')
+            raise PoolEsgotado(f'Nenhuma conexao livre apos {self.espera}s')
+
+    def liberar(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._abertas -= 1
+            return
+        self._livres.put(conn)
+
+    def fechar(self):
+        self._parar_checkpoints.set()
+        if self._thread_checkpoints is not None:
+            self._thread_checkpoints.join()
+            self._thread_checkpoints = None
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._abertas -= 1
+
+    def estatisticas(self):
+        with self._lock:
+            dados = dict(self._estatisticas)
+            dados['perfil'] = self.perfil
+            dados['tamanho'] = self.tamanho
+            dados['espera'] = self.espera
+            dados['conexoes_abertas'] = self._abertas
+        dados['conexoes_livres'] = self._livres.qsize()
+        return dados
+
+
+def banco_ocupado(erro):
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+
+def executar_transacao(conn, operacao, tentativas=TRANSACAO_TENTATIVAS, espera_base=TRANSACAO_ESPERA_BASE):
+    """
+    Executa operacao(conn) dentro de BEGIN IMMEDIATE e faz o commit.
+
+    A trava de escrita é obtida antes da primeira leitura, então as
+    verificações feitas pela operação continuam válidas até o commit. Se o
+    banco estiver ocupado, a transação inteira é desfeita e repetida com
+    espera exponencial (com jitter) até esgotar as tentativas.
+    """
+    for tentativa in range(tentativas):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            resultado = operacao(conn)
+            conn.commit()
+            return resultado
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not banco_ocupado(e) or tentativa == tentativas - 1:
+                raise
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        time.sleep(espera_base * (2 ** tentativa) * (0.5 + random.random()))
@@ -0,0 +1,496 @@
+"""
+Teste de carga da API com o tráfego de um dia de restaurante.
+
+Gera bancos sintéticos do tamanho pedido (--linhas 10k 1M 10M) e, para cada
+um, dispara durante alguns segundos uma mistura de requisições: atendentes
+criando reservas e buscando mesa livre, garçons consultando a lista e
+confirmando reservas, o gerente tirando relatórios do período (MIX). Os GETs
+mandam If-None-Match com o último ETag recebido, como o navegador.
+
+Os alvos são o test client do Flask (--alvo cliente: um processo, uma thread
+por cliente, sem HTTP) e o servidor de verdade (--alvo servidor: python -m
+servidor serve, clientes em processos separados). Para cada rota saem
+requisições por segundo, p50/p95/p99 e a contagem por status; o resultado
+completo é gravado em JSON para comparar entre commits. Uso (na raiz do
+projeto):
+
+    python -m benchmarks.carga [--linhas 10k 1M] [--alvo cliente servidor] [--segundos 10]
+                               [--clientes 8] [--workers 2] [--threads 4] [--saida benchmarks/resultados]
+    python -m benchmarks.carga --comparar antes.json depois.json
+
+Com --comparar, mostra por rota o valor do primeiro arquivo e a variação no
+segundo. Os bancos gerados ficam em --dados e são reaproveitados no mesmo dia
+(as datas são relativas a hoje) enquanto o esquema não mudar; cada execução
+trabalha numa cópia. Gerar 10M linhas leva alguns
+minutos e ocupa alguns GB.
+"""
+import argparse
+import collections
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import migracoes
+from benchmarks.workers import aguardar_porta
+
+
+PORTA = 5098
+PERCENTIS = (50, 95, 99)
+HORAS = range(11, 23)
+DIAS_FUTUROS = 14
+OCUPACAO = 0.8
+CAPACIDADES = (2, 4, 4, 6, 8)
+ZONAS = ('salao', 'salao', 'varanda', 'terraco')
+GARCONS = tuple(f'Garcom {i}' for i in range(1, 11))
+MULTIPLICADORES = {'k': 1000, 'm': 1000000}
+
+
+def ler_tamanho(texto):
+    """'10k' -> 10000, '1M' -> 1000000."""
+    sufixo = texto[-1:].lower()
+    if sufixo in MULTIPLICADORES:
+        return int(float(texto[:-1]) * MULTIPLICADORES[sufixo])
+    return int(texto)
+
+
+def _linhas_sinteticas(linhas, mesas, hoje, rng):
+    """
+    Reservas de 60 minutos nas horas cheias de HORAS, ocupando OCUPACAO dos
+    horários de cada mesa, em dias seguidos até DIAS_FUTUROS depois de hoje:
+    as passadas finalizadas, as futuras reservadas ou confirmadas.
+    """
+    por_dia = len(mesas) * len(HORAS) * OCUPACAO
+    dia = hoje + DIAS_FUTUROS - int(linhas / por_dia)
+    geradas = 0
+    while geradas < linhas:
+        data = datetime.date.fromordinal(dia).isoformat()
+        criada_em = datetime.date.fromordinal(dia - 3).isoformat()
+        for hora in HORAS:
+            for mesa, capacidade in mesas:
+                if geradas >= linhas:
+                    return
+                if rng.random() >= OCUPACAO:
+                    continue
+                if dia < hoje:
+                    status = 'finalizada'
+                else:
+                    status = 'confirmada' if rng.random() < 0.3 else 'reservada'
+                garcom = rng.choice(GARCONS) if status != 'reservada' else None
+                confirmacao = (data, f'{hora - 1:02}:{rng.randrange(60):02}') if garcom else (None, None)
+                yield (data, f'{hora:02}:00', mesa, rng.randint(1, capacidade), f'Cliente {geradas}', status,
+                       f'{hora + 1:02}:00', garcom, dia, hora * 60, (hora + 1) * 60,
+                       f'{criada_em} 12:00', *confirmacao)
+                geradas += 1
+        dia += 1
+
+
+def gerar_banco(caminho, linhas, total_mesas, semente=1):
+    conn = sqlite3.connect(caminho)
+    try:
+        migracoes.migrar(conn)
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        rng = random.Random(semente)
+        mesas = [(mesa, CAPACIDADES[mesa % len(CAPACIDADES)]) for mesa in range(1, total_mesas + 1)]
+        conn.executemany(
+            'INSERT OR REPLACE INTO mesas (id, capacidade, zona) VALUES (?, ?, ?)',
+            ((mesa, capacidade, ZONAS[mesa % len(ZONAS)]) for mesa, capacidade in mesas)
+        )
+        conn.execute('DELETE FROM mesas WHERE id > ?', (total_mesas,))
+
+        # Os triggers de resumo e de alteracoes custariam uma escrita extra por
+        # linha; saem durante a carga e o resumo é recalculado de uma vez
+        gatilhos = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'reservas'"
+        ).fetchall()
+        for nome, _ in gatilhos:
+            conn.execute(f'DROP TRIGGER {nome}')
+        conn.executemany(
+            'INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, hora_fim, garcom, '
+            'data_ord, hora_min, hora_fim_min, criada_em, data_confirmacao, hora_confirmacao) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            _linhas_sinteticas(linhas, mesas, datetime.date.today().toordinal(), rng)
+        )
+        for _, sql in gatilhos:
+            conn.execute(sql)
+        migracoes.reconstruir_resumo_diario(conn)
+        conn.execute('DELETE FROM alteracoes')
+        conn.commit()
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+
+def banco_base(diretorio, linhas, mesas):
+    """Caminho de um banco gerado com esse tamanho, gerando-o se preciso."""
+    os.makedirs(diretorio, exist_ok=True)
+    hoje = datetime.date.today().isoformat()
+    caminho = os.path.join(diretorio, f'reservas-{linhas}-{mesas}-v{len(migracoes.MIGRACOES)}-{hoje}.db')
+    if not os.path.exists(caminho):
+        print(f'gerando {linhas} reservas em {caminho}...', file=sys.stderr)
+        inicio = time.perf_counter()
+        gerar_banco(caminho + '.tmp', linhas, mesas)
+        os.replace(caminho + '.tmp', caminho)
+        print(f'pronto em {time.perf_counter() - inicio:.1f}s', file=sys.stderr)
+    return caminho
+
+
+def ids_reservados(caminho, limite):
+    conn = sqlite3.connect(caminho)
+    try:
+        return [linha[0] for linha in conn.execute(
+            "SELECT id FROM reservas WHERE status = 'reservada' ORDER BY data_ord, hora_min LIMIT ?", (limite,)
+        )]
+    finally:
+        conn.close()
+
+
+# Cada ação devolve (rota, método, url, corpo); rota é o nome agregado no resultado
+
+def criar_reserva(rng, ctx):
+    mesa, capacidade = rng.choice(ctx['mesas'])
+    data = datetime.date.fromordinal(ctx['hoje'] + rng.randint(1, 60)).isoformat()
+    corpo = {'data': data, 'hora': f'{rng.choice(HORAS):02}:{rng.choice((0, 30)):02}', 'mesa': mesa,
+             'pessoas': rng.randint(1, capacidade), 'responsavel': f'Carga {rng.randrange(10 ** 6)}'}
+    return '/reserva', 'POST', '/reserva', corpo
+
+
+def buscar_disponibilidade(rng, ctx):
+    data = datetime.date.fromordinal(ctx['hoje'] + rng.randint(0, DIAS_FUTUROS)).isoformat()
+    return ('/disponibilidade', 'GET',
+            f'/disponibilidade?data={data}&hora={rng.choice(HORAS):02}:00&pessoas={rng.randint(1, 6)}', None)
+
+
+def listar_mesas(rng, ctx):
+    return '/mesas', 'GET', '/mesas', None
+
+
+def listar_pendentes(rng, ctx):
+    return '/reservas-disponiveis', 'GET', '/reservas-disponiveis?limit=50', None
+
+
+def mesas_em_uso(rng, ctx):
+    return '/mesas-em-uso', 'GET', '/mesas-em-uso', None
+
+
+def confirmar_reserva(rng, ctx):
+    reserva_id = ctx['ids'].pop() if ctx['ids'] else rng.randint(1, ctx['linhas'])
+    return '/confirmar/<id>', 'POST', f'/confirmar/{reserva_id}', {'garcom': rng.choice(GARCONS)}
+
+
+def relatorio_periodo(rng, ctx):
+    inicio = ctx['hoje'] - rng.randint(0, 60)
+    return ('/relatorio/periodo', 'GET',
+            f'/relatorio/periodo?inicio={_data(inicio)}&fim={_data(inicio + 6)}&limit=100', None)
+
+
+def relatorio_agregado(rng, ctx):
+    inicio = ctx['hoje'] - rng.randint(0, 60)
+    return ('/relatorio/agregado', 'GET',
+            f'/relatorio/agregado?inicio={_data(inicio - 30)}&fim={_data(inicio)}', None)
+
+
+def relatorio_mesa(rng, ctx):
+    mesa, _ = rng.choice(ctx['mesas'])
+    return '/relatorio/mesa/<mesa>', 'GET', f'/relatorio/mesa/{mesa}?limit=100', None
+
+
+def relatorio_garcom(rng, ctx):
+    return ('/relatorio/garcom/<nome>', 'GET',
+            f'/relatorio/garcom/{rng.choice(GARCONS).replace(" ", "%20")}?limit=100', None)
+
+
+def _data(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+# (peso, ação): garçons consultam muito mais do que os outros escrevem
+MIX = (
+    (12, criar_reserva),
+    (10, buscar_disponibilidade),
+    (3, listar_mesas),
+    (40, listar_pendentes),
+    (10, mesas_em_uso),
+    (12, confirmar_reserva),
+    (4, relatorio_periodo),
+    (4, relatorio_agregado),
+    (3, relatorio_mesa),
+    (2, relatorio_garcom),
+)
+
+
+class Amostras:
+    """Latências e status por rota de um cliente."""
+
+    def __init__(self):
+        self.latencias = collections.defaultdict(list)
+        self.status = collections.defaultdict(collections.Counter)
+
+    def registrar(self, rota, status, segundos):
+        self.latencias[rota].append(segundos)
+        self.status[rota][status] += 1
+
+    def juntar(self, outra):
+        for rota, valores in outra.latencias.items():
+            self.latencias[rota].extend(valores)
+        for rota, contagem in outra.status.items():
+            self.status[rota].update(contagem)
+
+
+def executar_cliente(enviar, ctx, semente, segundos, aquecimento):
+    """Repete ações sorteadas de MIX por aquecimento + segundos; só o final conta."""
+    rng = random.Random(semente)
+    acoes = [acao for _, acao in MIX]
+    pesos = [peso for peso, _ in MIX]
+    etags = {}
+    amostras = Amostras()
+    agora = time.perf_counter()
+    inicio_medicao, fim = agora + aquecimento, agora + aquecimento + segundos
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim:
+            return amostras
+        rota, metodo, url, corpo = rng.choices(acoes, pesos)[0](rng, ctx)
+        cabecalhos = {'If-None-Match': etags[url]} if metodo == 'GET' and url in etags else {}
+        status, etag = enviar(metodo, url, corpo, cabecalhos)
+        if etag:
+            etags[url] = etag
+        if agora >= inicio_medicao:
+            amostras.registrar(rota, status, time.perf_counter() - agora)
+
+
+def _contexto(caminho, linhas, ids):
+    conn = sqlite3.connect(caminho)
+    try:
+        mesas = conn.execute('SELECT id, capacidade FROM mesas ORDER BY id').fetchall()
+    finally:
+        conn.close()
+    return {'hoje': datetime.date.today().toordinal(), 'mesas': mesas, 'linhas': linhas, 'ids': ids}
+
+
+def _fatia(ids, n, total):
+    return ids[n::total]
+
+
+def processo_test_client(caminho, linhas, args, fila):
+    import servidor
+
+    ids = ids_reservados(caminho, 50000)
+    resultados = []
+
+    def cliente(n):
+        cliente_http = servidor.app.test_client()
+
+        def enviar(metodo, url, corpo, cabecalhos):
+            # buffered: lê o corpo e fecha a resposta, como faz um servidor WSGI
+            resposta = cliente_http.open(url, method=metodo, json=corpo, headers=cabecalhos, buffered=True)
+            return resposta.status_code, resposta.headers.get('ETag')
+
+        ctx = _contexto(caminho, linhas, _fatia(ids, n, args.clientes))
+        resultados.append(executar_cliente(enviar, ctx, n, args.segundos, args.aquecimento))
+
+    servidor.pool.preparar()
+    threads = [threading.Thread(target=cliente, args=(n,)) for n in range(args.clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = Amostras()
+    for amostras in resultados:
+        total.juntar(amostras)
+    fila.put(total)
+
+
+def processo_http(porta, ctx, semente, args, fila):
+    conexao = http.client.HTTPConnection('127.0.0.1', porta)
+
+    def enviar(metodo, url, corpo, cabecalhos):
+        if corpo is not None:
+            cabecalhos = dict(cabecalhos, **{'Content-Type': 'application/json'})
+            corpo = json.dumps(corpo)
+        conexao.request(metodo, url, body=corpo, headers=cabecalhos)
+        resposta = conexao.getresponse()
+        resposta.read()
+        return resposta.status, resposta.getheader('ETag')
+
+    try:
+        fila.put(executar_cliente(enviar, ctx, semente, args.segundos, args.aquecimento))
+    finally:
+        conexao.close()
+
+
+def medir_test_client(caminho, linhas, args):
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processo = contexto.Process(target=processo_test_client, args=(caminho, linhas, args, fila))
+    # banco.py lê RESERVAS_DB ao ser importado, e o processo novo importa
+    # este módulo (e com ele o banco) antes de rodar o alvo
+    anterior = os.environ.get('RESERVAS_DB')
+    os.environ['RESERVAS_DB'] = caminho
+    try:
+        processo.start()
+    finally:
+        if anterior is None:
+            del os.environ['RESERVAS_DB']
+        else:
+            os.environ['RESERVAS_DB'] = anterior
+    amostras = fila.get()
+    processo.join()
+    return amostras
+
+
+def medir_servidor(caminho, linhas, args):
+    comando = [sys.executable, '-m', 'servidor', 'serve', '--port', str(PORTA),
+               '--workers', str(args.workers), '--threads', str(args.threads)]
+    comando.append('--asgi' if args.asgi else '--wsgi')
+    servidor = subprocess.Popen(
+        comando, env=dict(os.environ, RESERVAS_DB=caminho),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        aguardar_porta(PORTA, espera=120)
+        ids = ids_reservados(caminho, 50000)
+        fila = multiprocessing.Queue()
+        clientes = [
+            multiprocessing.Process(target=processo_http, args=(
+                PORTA, _contexto(caminho, linhas, _fatia(ids, n, args.clientes)), n, args, fila,
+            ))
+            for n in range(args.clientes)
+        ]
+        for processo in clientes:
+            processo.start()
+        total = Amostras()
+        for _ in clientes:
+            total.juntar(fila.get())
+        for processo in clientes:
+            processo.join()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    return total
+
+
+ALVOS = {'cliente': medir_test_client, 'servidor': medir_servidor}
+
+
+def _percentis(latencias, segundos):
+    latencias = sorted(latencias)
+    resumo = {'requisicoes': len(latencias), 'req_s': round(len(latencias) / segundos, 1)}
+    for percentil in PERCENTIS:
+        indice = min(len(latencias) - 1, len(latencias) * percentil // 100)
+        resumo[f'p{percentil}_ms'] = round(latencias[indice] * 1000, 2) if latencias else None
+    return resumo
+
+
+def resumir(amostras, segundos):
+    rotas = {}
+    for rota in sorted(amostras.latencias):
+        rotas[rota] = _percentis(amostras.latencias[rota], segundos)
+        rotas[rota]['status'] = {str(status): n for status, n in sorted(amostras.status[rota].items())}
+    todas = [valor for valores in amostras.latencias.values() for valor in valores]
+    return {'total': _percentis(todas, segundos), 'rotas': rotas}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def comparar(antes_caminho, depois_caminho):
+    with open(antes_caminho) as f:
+        antes = json.load(f)
+    with open(depois_caminho) as f:
+        depois = json.load(f)
+    print(f"{antes['commit']} -> {depois['commit']}")
+    anteriores = {(execucao['alvo'], execucao['linhas']): execucao for execucao in antes['execucoes']}
+    for execucao in depois['execucoes']:
+        anterior = anteriores.get((execucao['alvo'], execucao['linhas']))
+        if anterior is None:
+            continue
+        print(f"\n{execucao['alvo']}, {execucao['linhas']} linhas")
+        print(f"{'rota':<28}{'req/s':>18}{'p50 ms':>18}{'p99 ms':>18}")
+        rotas = dict(execucao['rotas'], total=execucao['total'])
+        rotas_antes = dict(anterior['rotas'], total=anterior['total'])
+        for rota, atual in rotas.items():
+            velho = rotas_antes.get(rota)
+            if velho is None:
+                continue
+            colunas = ''.join(
+                f"{velho[chave] or 0:>8} {_variacao(velho[chave], atual[chave]):>9}"
+                for chave in ('req_s', 'p50_ms', 'p99_ms')
+            )
+            print(f'{rota:<28}{colunas}')
+
+
+def _variacao(antes, depois):
+    if not antes or depois is None:
+        return '-'
+    return f'{(depois - antes) / antes * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=ler_tamanho, nargs='+', default=[10000])
+    parser.add_argument('--mesas', type=int, default=40)
+    parser.add_argument('--alvo', choices=sorted(ALVOS), nargs='+', default=['cliente', 'servidor'])
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--aquecimento', type=float, default=1)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--asgi', action='store_true', help='alvo servidor com a variante ASGI')
+    parser.add_argument('--dados', default=os.path.join(tempfile.gettempdir(), 'reservas-carga'))
+    parser.add_argument('--saida', default=os.path.join('benchmarks', 'resultados'))
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'))
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    resultado = {
+        'commit': _commit(),
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'nucleos': os.cpu_count(),
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('dados', 'saida', 'comparar')},
+        'execucoes': [],
+    }
+    for linhas in args.linhas:
+        base = banco_base(args.dados, linhas, args.mesas)
+        for alvo in args.alvo:
+            diretorio = tempfile.mkdtemp(prefix='bench-carga-')
+            caminho = os.path.join(diretorio, 'reservas.db')
+            try:
+                shutil.copyfile(base, caminho)
+                amostras = ALVOS[alvo](caminho, linhas, args)
+            finally:
+                shutil.rmtree(diretorio, ignore_errors=True)
+            execucao = dict(alvo=alvo, linhas=linhas, **resumir(amostras, args.segundos))
+            resultado['execucoes'].append(execucao)
+            print(json.dumps({'alvo': alvo, 'linhas': linhas, **execucao['total']}))
+
+    os.makedirs(args.saida, exist_ok=True)
+    arquivo = os.path.join(args.saida, f"carga-{resultado['commit']}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(arquivo, 'w') as f:
+        json.dump(resultado, f, indent=2)
+    print(f'resultado em {arquivo}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Micro-benchmark das funções de formatação de horário do servidor.
+
+Compara a implementação baseada em strptime/strftime (reproduzida aqui como
+referência) com a tabela de minutos de horarios.py. Uso (na raiz do projeto):
+
+    python -m benchmarks.horarios [--linhas 10000] [--repeticoes 5]
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+import servidor
+
+
+def calcular_hora_fim_strptime(hora_inicio):
+    try:
+        hora_obj = datetime.datetime.strptime(hora_inicio, '%H:%M').time()
+        hora_datetime = datetime.datetime.combine(datetime.date.today(), hora_obj)
+        hora_fim = hora_datetime + datetime.timedelta(hours=1)
+        return hora_fim.strftime('%H:%M')
+    except ValueError:
+        return None
+
+
+def conflito_strptime(hora_inicio, reservas):
+    inicio = datetime.datetime.strptime(hora_inicio, '%H:%M').time()
+    fim = datetime.datetime.strptime(calcular_hora_fim_strptime(hora_inicio), '%H:%M').time()
+    for hora, hora_fim in reservas:
+        reserva_inicio = datetime.datetime.strptime(hora, '%H:%M').time()
+        reserva_fim = datetime.datetime.strptime(hora_fim, '%H:%M').time()
+        if inicio < reserva_fim and fim > reserva_inicio:
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    horas = [f'{(i // 4) % 12 + 11:02}:{(i * 15) % 60:02}' for i in range(args.linhas)]
+    linhas = [{'id': i, 'hora': hora, 'hora_fim': None} for i, hora in enumerate(horas)]
+    agenda = [(f'{h:02}:00', f'{h + 1:02}:00') for h in range(8, 22, 2)]
+
+    casos = {
+        'calcular_hora_fim': (
+            lambda: [calcular_hora_fim_strptime(hora) for hora in horas],
+            lambda: [servidor.calcular_hora_fim(hora) for hora in horas],
+        ),
+        'formatar_horario_completo': (
+            lambda: [f'{hora} - {calcular_hora_fim_strptime(hora)}' for hora in horas],
+            lambda: [servidor.formatar_horario_completo(hora) for hora in horas],
+        ),
+        'formatar_dados_com_horario': (
+            lambda: [dict(linha, hora=f"{linha['hora']} - {calcular_hora_fim_strptime(linha['hora'])}") for linha in linhas],
+            lambda: servidor.formatar_dados_com_horario([dict(linha) for linha in linhas]),
+        ),
+        'verificar_conflito_horario': (
+            lambda: [conflito_strptime(hora, agenda) for hora in horas],
+            lambda: [servidor.indice_intervalos.conflita(1, 1, m, m + 60) for m in map(servidor.horarios.para_minutos, horas)],
+        ),
+    }
+
+    resultados = {}
+    for nome, (antes, depois) in casos.items():
+        tempo_antes = min(timeit.repeat(antes, number=1, repeat=args.repeticoes))
+        tempo_depois = min(timeit.repeat(depois, number=1, repeat=args.repeticoes))
+        resultados[nome] = {
+            'strptime_ms': round(tempo_antes * 1000, 2),
+            'minutos_ms': round(tempo_depois * 1000, 2),
+            'ganho': round(tempo_antes / tempo_depois, 1) if tempo_depois else None,
+        }
+    print(json.dumps({'linhas': args.linhas, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
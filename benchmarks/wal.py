@@ -0,0 +1,120 @@
+"""
+Compara os perfis de armazenamento sob leitura e escrita concorrentes.
+
+Leitores repetem a consulta do relatório por período enquanto escritores
+inserem reservas em transações BEGIN IMMEDIATE, como fazem as rotas do
+servidor. Uso (na raiz do projeto):
+
+    python -m benchmarks.wal [--linhas 50000] [--leitores 8] [--escritores 2] [--segundos 5]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import banco
+import consultas
+import horarios
+import migracoes
+
+
+def popular(caminho, linhas):
+    conn = sqlite3.connect(caminho)
+    migracoes.migrar(conn)
+    conn.executemany(
+        'INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, hora_fim, data_ord, hora_min, hora_fim_min) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            (data, f'{i % 12 + 11:02}:00', i % 20 + 1, 2, f'Cliente {i}', 'finalizada', f'{i % 12 + 12:02}:00',
+             horarios.data_para_ordinal(data), (i % 12 + 11) * 60, (i % 12 + 12) * 60)
+            for i, data in ((i, f'2024-{i % 12 + 1:02}-{i % 28 + 1:02}') for i in range(linhas))
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def medir(perfil, args):
+    diretorio = tempfile.mkdtemp(prefix=f'bench-{perfil}-')
+    caminho = os.path.join(diretorio, 'reservas.db')
+    popular(caminho, args.linhas)
+
+    pool = banco.PoolConexoes(
+        caminho, tamanho=args.leitores + args.escritores, perfil=perfil,
+        preparar=migracoes.migrar, checkpoint_intervalo=1
+    )
+    pool.preparar()
+    fim = time.perf_counter() + args.segundos
+    leituras = [0] * args.leitores
+    escritas = [0] * args.escritores
+    latencias_leitura = []
+    trava = threading.Lock()
+
+    periodo = (horarios.data_para_ordinal('2024-03-01'), horarios.data_para_ordinal('2024-03-07'))
+
+    def leitor(n):
+        conn = pool.obter()
+        amostras = []
+        try:
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                conn.execute(consultas.SQL_RELATORIO_PERIODO, periodo).fetchall()
+                amostras.append(time.perf_counter() - inicio)
+                leituras[n] += 1
+        finally:
+            pool.liberar(conn)
+        with trava:
+            latencias_leitura.extend(amostras)
+
+    def escritor(n):
+        conn = pool.obter()
+
+        def inserir(con):
+            con.execute(
+                "INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, hora_fim, data_ord, hora_min, hora_fim_min) "
+                "VALUES ('2030-01-01', '12:00', ?, 2, 'bench', 'reservada', '13:00', ?, 720, 780)",
+                (n + 1, horarios.data_para_ordinal('2030-01-01'))
+            )
+
+        try:
+            while time.perf_counter() < fim:
+                banco.executar_transacao(conn, inserir)
+                escritas[n] += 1
+        finally:
+            pool.liberar(conn)
+
+    threads = [threading.Thread(target=leitor, args=(n,)) for n in range(args.leitores)]
+    threads += [threading.Thread(target=escritor, args=(n,)) for n in range(args.escritores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.fechar()
+
+    latencias_leitura.sort()
+    p99 = latencias_leitura[int(len(latencias_leitura) * 0.99)] if latencias_leitura else 0
+    return {
+        'perfil': perfil,
+        'leituras_por_segundo': round(sum(leituras) / args.segundos, 1),
+        'escritas_por_segundo': round(sum(escritas) / args.segundos, 1),
+        'leitura_p99_ms': round(p99 * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=50000)
+    parser.add_argument('--leitores', type=int, default=8)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--segundos', type=float, default=5)
+    args = parser.parse_args()
+
+    resultados = [medir(perfil, args) for perfil in ('padrao', 'wal')]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Mede a vazão do modo serve (python -m servidor serve) com números
+crescentes de workers.
+
+Para cada valor de --workers sobe o servidor num banco temporário, dispara
+requisições GET de vários processos clientes (conexões keep-alive) durante
+alguns segundos e mede requisições por segundo e latência. O cache de
+respostas fica desligado para que cada requisição faça a consulta e a
+serialização; com --cache ele fica ligado. Com --asgi mede a variante
+ASGI (servidor_asgi.py, requer uvicorn). Uso (na raiz do projeto):
+
+    python -m benchmarks.workers [--workers 1 2 4] [--threads 4] [--clientes 8] [--segundos 5] [--asgi]
+
+A vazão só cresce com os workers enquanto houver núcleos livres: numa
+máquina com um núcleo, todas as configurações ficam parecidas.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.wal import popular
+
+
+PORTA = 5099
+
+URLS = (
+    '/reservas-disponiveis?limit=50',
+    '/mesa/5/disponibilidade?data=2024-03-03',
+    '/relatorio/periodo?inicio=2024-03-01&fim=2024-03-07&limit=100',
+    '/relatorio/agregado?inicio=2024-01-01&fim=2024-12-31',
+    '/relatorio/mesa/7?limit=100',
+)
+
+
+def aguardar_porta(porta, espera=20):
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Servidor não respondeu na porta {porta}')
+
+
+def cliente(porta, segundos, resultados):
+    conexao = http.client.HTTPConnection('127.0.0.1', porta)
+    latencias = []
+    erros = 0
+    fim = time.perf_counter() + segundos
+    i = 0
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        conexao.request('GET', URLS[i % len(URLS)])
+        resposta = conexao.getresponse()
+        resposta.read()
+        if resposta.status != 200:
+            erros += 1
+        latencias.append(time.perf_counter() - inicio)
+        i += 1
+    conexao.close()
+    resultados.put((latencias, erros))
+
+
+def medir(workers, args, caminho):
+    ambiente = dict(os.environ, RESERVAS_DB=caminho)
+    if not args.cache:
+        ambiente['RESERVAS_CACHE_BYTES'] = '0'
+    comando = [sys.executable, '-m', 'servidor', 'serve', '--port', str(PORTA),
+               '--workers', str(workers), '--threads', str(args.threads)]
+    comando.append('--asgi' if args.asgi else '--wsgi')
+    servidor = subprocess.Popen(
+        comando, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        aguardar_porta(PORTA)
+        resultados = multiprocessing.Queue()
+        clientes = [
+            multiprocessing.Process(target=cliente, args=(PORTA, args.segundos, resultados))
+            for _ in range(args.clientes)
+        ]
+        for processo in clientes:
+            processo.start()
+        latencias, erros = [], 0
+        for _ in clientes:
+            parcial, erros_parcial = resultados.get()
+            latencias.extend(parcial)
+            erros += erros_parcial
+        for processo in clientes:
+            processo.join()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    latencias.sort()
+    return {
+        'workers': workers,
+        'req_s': round(len(latencias) / args.segundos),
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 2),
+        'p99_ms': round(latencias[int(len(latencias) * 0.99)] * 1000, 2),
+        'erros': erros,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--linhas', type=int, default=50000)
+    parser.add_argument('--cache', action='store_true', help='mantém o cache de respostas ligado')
+    parser.add_argument('--asgi', action='store_true', help='usa a variante ASGI (uvicorn)')
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix='bench-workers-'), 'reservas.db')
+    popular(caminho, args.linhas)
+    print(f'núcleos: {os.cpu_count()}')
+    for workers in args.workers:
+        print(json.dumps(medir(workers, args, caminho)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import collections
+import os
+import threading
+
+
+LIMITE_BYTES = int(os.environ.get('RESERVAS_CACHE_BYTES', 32 * 1024 * 1024))
+
+# Dependências de uma entrada: de que parte das reservas a resposta depende
+GLOBAL = ('global',)
+
+
+def dia(data_ord):
+    return ('dia', data_ord)
+
+
+def mesa(numero):
+    return ('mesa', numero)
+
+
+def garcom(nome):
+    return ('garcom', nome)
+
+
+def periodo(inicio_ord, fim_ord):
+    return ('periodo', inicio_ord, fim_ord)
+
+
+class _Entrada:
+    __slots__ = ('etag', 'corpo', 'mimetype', 'dependencias')
+
+    def __init__(self, etag, corpo, mimetype, dependencias):
+        self.etag = etag
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.dependencias = dependencias
+
+
+class CacheRespostas:
+    """
+    Cache LRU, em memória, do corpo já serializado das respostas de leitura.
+
+    A chave é a rota mais os parâmetros normalizados. Uma entrada só vale
+    enquanto a ETag atual da rota for a mesma com que ela foi gravada, e cada
+    alteração sincronizada remove na hora as entradas do dia, mesa ou garçom
+    que tocou (invalidar). O total guardado não passa de limite_bytes: as
+    entradas menos usadas saem primeiro.
+    """
+
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self.limite_entrada = limite_bytes // 8
+        self._entradas = collections.OrderedDict()
+        self._por_dependencia = collections.defaultdict(set)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidacoes = 0
+
+    def obter(self, chave, etag):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada.etag != etag:
+                if entrada is not None:
+                    self._remover(chave)
+                    self._invalidacoes += 1
+                self._misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self._hits += 1
+            return entrada
+
+    def guardar(self, chave, etag, corpo, mimetype, dependencias):
+        if len(corpo) > self.limite_entrada:
+            return False
+        with self._lock:
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = _Entrada(etag, corpo, mimetype, dependencias)
+            self._bytes += len(corpo)
+            for dependencia in dependencias:
+                self._por_dependencia[dependencia].add(chave)
+            while self._bytes > self.limite_bytes:
+                self._remover(next(iter(self._entradas)))
+                self._evictions += 1
+        return True
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave)
+        self._bytes -= len(entrada.corpo)
+        for dependencia in entrada.dependencias:
+            chaves = self._por_dependencia[dependencia]
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_dependencia[dependencia]
+
+    def invalidar(self, data_ord, numero_mesa, nome_garcom=None):
+        """Remove as entradas que dependem do dia, da mesa ou do garçom alterados."""
+        with self._lock:
+            afetadas = set(self._por_dependencia.get(GLOBAL, ()))
+            for dependencia in (dia(data_ord), mesa(numero_mesa), garcom(nome_garcom)):
+                afetadas.update(self._por_dependencia.get(dependencia, ()))
+            for dependencia, chaves in self._por_dependencia.items():
+                if dependencia[0] == 'periodo' and dependencia[1] <= data_ord <= dependencia[2]:
+                    afetadas.update(chaves)
+            for chave in afetadas:
+                self._remover(chave)
+            self._invalidacoes += len(afetadas)
+            return len(afetadas)
+
+    def limpar(self):
+        with self._lock:
+            self._invalidacoes += len(self._entradas)
+            self._entradas.clear()
+            self._por_dependencia.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidacoes': self._invalidacoes,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'limite_bytes': self.limite_bytes,
+            }
@@ -0,0 +1,64 @@
+import collections
+
+
+Mesa = collections.namedtuple('Mesa', 'id capacidade zona combinavel')
+
+SQL_MESAS = 'SELECT id, capacidade, zona, combinavel FROM mesas ORDER BY id'
+
+
+class CatalogoMesas:
+    """
+    Cadastro das mesas (tabela mesas) em memória, usado na validação das
+    reservas, na busca de disponibilidade e nas telas de ocupação sem ir ao
+    banco.
+
+    É carregado na inicialização e de novo a cada mudança na tabela, que os
+    triggers registram em alteracoes com o tipo 'mesa'. O cadastro inteiro é
+    trocado de uma vez: quem está lendo vê o antigo ou o novo, nunca metade.
+    """
+
+    def __init__(self):
+        self._mesas = {}
+        self._por_capacidade = ()
+
+    def carregar(self, conn):
+        mesas = {
+            mesa_id: Mesa(mesa_id, capacidade, zona, bool(combinavel))
+            for mesa_id, capacidade, zona, combinavel in conn.execute(SQL_MESAS)
+        }
+        self._mesas = mesas
+        # Menor mesa que comporta o grupo primeiro (best fit), depois o número
+        self._por_capacidade = tuple(sorted(mesas.values(), key=lambda mesa: (mesa.capacidade, mesa.id)))
+        return len(mesas)
+
+    def obter(self, mesa_id):
+        return self._mesas.get(mesa_id)
+
+    def validar(self, mesa_id, pessoas):
+        """
+        Confere se a mesa existe e comporta o grupo.
+
+        Raises:
+            ValueError: com a mensagem de erro da reserva
+        """
+        mesa = self._mesas.get(mesa_id)
+        if mesa is None:
+            raise ValueError(f'Mesa {mesa_id} nao cadastrada')
+        if pessoas < 1:
+            raise ValueError('Campo "pessoas" deve ser maior que zero')
+        if pessoas > mesa.capacidade:
+            raise ValueError(f'Mesa {mesa_id} comporta no maximo {mesa.capacidade} pessoas')
+        return mesa
+
+    def que_comportam(self, pessoas, zona=None):
+        """Mesas com lugar para o grupo, da menor para a maior."""
+        return [
+            mesa for mesa in self._por_capacidade
+            if mesa.capacidade >= pessoas and (zona is None or mesa.zona == zona)
+        ]
+
+    def __iter__(self):
+        return iter(list(self._mesas.values()))
+
+    def __len__(self):
+        return len(self._mesas)
@@ -0,0 +1,210 @@
+import sqlite3
+import sys
+
+import banco
+
+
+# Colunas expostas pela API; data_ord/hora_min/hora_fim_min são só para busca
+COLUNAS_RESERVA = '''
+    id, data, hora, mesa, pessoas, responsavel, status, garcom,
+    hora_fim, data_confirmacao, hora_confirmacao
+'''
+
+SQL_RESERVA_DUPLICADA = '''
+    SELECT * FROM reservas
+    WHERE mesa = ? AND data_ord = ? AND hora_min = ? AND status = 'reservada'
+'''
+
+# Mesmo critério de SQL_RESERVA_DUPLICADA para um lote inteiro: as chaves
+# (mesa, data_ord, hora_min) já reservadas no intervalo de datas do lote
+SQL_RESERVADAS_PERIODO = '''
+    SELECT mesa, data_ord, hora_min FROM reservas
+    WHERE data_ord BETWEEN ? AND ? AND status = 'reservada'
+'''
+
+# Intervalos ocupados de todas as mesas, para a busca de /disponibilidade
+SQL_OCUPACAO_PERIODO = '''
+    SELECT mesa, data_ord, hora_min, hora_fim_min FROM reservas
+    WHERE data_ord BETWEEN ? AND ? AND status IN ('reservada', 'confirmada')
+'''
+
+SQL_DISPONIBILIDADE_MESA = '''
+    SELECT hora, hora_fim, status, responsavel FROM reservas
+    WHERE mesa = ? AND data_ord = ? AND status IN ('reservada', 'confirmada')
+    ORDER BY hora_min
+'''
+
+SQL_RELATORIO_PERIODO = f'''
+    SELECT {COLUNAS_RESERVA} FROM reservas
+    WHERE data_ord BETWEEN ? AND ?
+'''
+
+SQL_RELATORIO_MESA = f'SELECT {COLUNAS_RESERVA} FROM reservas WHERE mesa = ?'
+
+SQL_RELATORIO_GARCOM = f'SELECT {COLUNAS_RESERVA} FROM reservas WHERE garcom = ?'
+
+SQL_RESERVAS_DISPONIVEIS = '''
+    SELECT id, data, hora, mesa, pessoas, responsavel, hora_fim FROM reservas
+    WHERE status = 'reservada'
+    ORDER BY data_ord, hora_min
+'''
+
+SQL_MESAS_EM_USO = '''
+    SELECT id, mesa, hora, hora_fim, responsavel, garcom
+    FROM reservas
+    WHERE status = 'confirmada'
+    AND data_ord = ?
+    AND hora_min <= ?
+    AND hora_fim_min > ?
+    ORDER BY mesa
+'''
+
+# Paginação por chave (data_ord, hora_min, id): cada página começa com uma
+# busca no índice logo após a última linha da anterior, então o custo não
+# cresce com a profundidade, ao contrário de OFFSET. O último parâmetro é o
+# LIMIT.
+_PAGINA = '''
+    AND (data_ord, hora_min, id) > (?, ?, ?)
+    ORDER BY data_ord, hora_min, id
+    LIMIT ?
+'''
+
+SQL_RELATORIO_PERIODO_PAGINA = f'''
+    SELECT {COLUNAS_RESERVA}, data_ord, hora_min FROM reservas
+    WHERE data_ord <= ?
+''' + _PAGINA
+
+SQL_RELATORIO_MESA_PAGINA = f'''
+    SELECT {COLUNAS_RESERVA}, data_ord, hora_min FROM reservas
+    WHERE mesa = ?
+''' + _PAGINA
+
+SQL_RELATORIO_GARCOM_PAGINA = f'''
+    SELECT {COLUNAS_RESERVA}, data_ord, hora_min FROM reservas
+    WHERE garcom = ?
+''' + _PAGINA
+
+SQL_RESERVAS_DISPONIVEIS_PAGINA = '''
+    SELECT id, data, hora, mesa, pessoas, responsavel, hora_fim, data_ord, hora_min FROM reservas
+    WHERE status = 'reservada'
+''' + _PAGINA
+
+# Agregações do painel do gerente, sempre sobre um intervalo de data_ord
+# Os agregados leem resumo_diario (mantida por triggers, ver migracoes.py):
+# o custo depende do número de dias x mesas x garçons do período, não do
+# número de reservas.
+_METRICAS = '''
+    SUM(reservas) AS reservas,
+    SUM(pessoas) AS pessoas,
+    SUM(CASE WHEN status = 'reservada' THEN reservas ELSE 0 END) AS reservadas,
+    SUM(CASE WHEN status = 'confirmada' THEN reservas ELSE 0 END) AS confirmadas,
+    SUM(CASE WHEN status = 'finalizada' THEN reservas ELSE 0 END) AS finalizadas,
+    SUM(confirmacoes_medidas) AS confirmacoes_medidas,
+    SUM(atraso_confirmacao_min) AS atraso_confirmacao_min
+'''
+
+SQL_AGREGADO_DIA = f'''
+    SELECT data_ord, {_METRICAS},
+        COUNT(DISTINCT CASE WHEN status IN ('confirmada', 'finalizada') THEN mesa END) AS mesas_ocupadas
+    FROM resumo_diario
+    WHERE data_ord BETWEEN ? AND ?
+    GROUP BY data_ord
+    ORDER BY data_ord
+'''
+
+SQL_AGREGADO_MESA = f'''
+    SELECT mesa, {_METRICAS}
+    FROM resumo_diario
+    WHERE data_ord BETWEEN ? AND ?
+    GROUP BY mesa
+    ORDER BY mesa
+'''
+
+SQL_AGREGADO_GARCOM = f'''
+    SELECT garcom, {_METRICAS}
+    FROM resumo_diario
+    WHERE data_ord BETWEEN ? AND ? AND garcom != ''
+    GROUP BY garcom
+    ORDER BY garcom
+'''
+
+SQL_TODAS_RESERVAS = f'SELECT {COLUNAS_RESERVA} FROM reservas ORDER BY data_ord, hora_min'
+
+# Consultas das rotas quentes com parâmetros de exemplo. Nenhuma delas pode
+# cair em varredura completa da tabela: verificar_planos() acusa a regressão.
+CONSULTAS_INDEXADAS = {
+    'criar_reserva': (SQL_RESERVA_DUPLICADA, (1, 739252, 720)),
+    'criar_reservas_lote': (SQL_RESERVADAS_PERIODO, (739252, 739282)),
+    'verificar_disponibilidade_mesa': (SQL_DISPONIBILIDADE_MESA, (1, 739252)),
+    'buscar_disponibilidade': (SQL_OCUPACAO_PERIODO, (739251, 739253)),
+    'relatorio_periodo': (SQL_RELATORIO_PERIODO, (739252, 739282)),
+    'relatorio_mesa': (SQL_RELATORIO_MESA, (1,)),
+    'relatorio_garcom': (SQL_RELATORIO_GARCOM, ('Joao',)),
+    'listar_reservas_disponiveis': (SQL_RESERVAS_DISPONIVEIS, ()),
+    'listar_mesas_em_uso': (SQL_MESAS_EM_USO, (739252, 720, 720)),
+    'relatorio_agregado (dia)': (SQL_AGREGADO_DIA, (739252, 739282)),
+    'relatorio_agregado (mesa)': (SQL_AGREGADO_MESA, (739252, 739282)),
+    'relatorio_agregado (garcom)': (SQL_AGREGADO_GARCOM, (739252, 739282)),
+    'relatorio_periodo (pagina)': (SQL_RELATORIO_PERIODO_PAGINA, (739282, 739252, 720, 10, 100)),
+    'relatorio_mesa (pagina)': (SQL_RELATORIO_MESA_PAGINA, (1, 739252, 720, 10, 100)),
+    'relatorio_garcom (pagina)': (SQL_RELATORIO_GARCOM_PAGINA, ('Joao', 739252, 720, 10, 100)),
+    'listar_reservas_disponiveis (pagina)': (SQL_RESERVAS_DISPONIVEIS_PAGINA, (739252, 720, 10, 100)),
+}
+
+# Consultas que podem percorrer um índice inteiro (SCAN ... USING INDEX), com o
+# índice permitido. idx_reservas_reservadas é parcial: só tem as reservas
+# ainda não confirmadas, que é justamente a lista devolvida inteira.
+VARREDURAS_PERMITIDAS = {
+    'listar_reservas_disponiveis': 'idx_reservas_reservadas',
+}
+
+
+def plano(conn, sql, parametros):
+    return [linha[3] for linha in conn.execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+
+
+def verificar_planos(conn):
+    """
+    Roda EXPLAIN QUERY PLAN em cada consulta indexada e devolve um dicionário
+    {rota: passos_do_plano} apenas com as que não fazem busca por faixa de
+    índice (SEARCH ... USING) em toda tabela lida. Percorrer um índice inteiro
+    (SCAN ... USING INDEX) só passa para o índice de VARREDURAS_PERMITIDAS; as
+    consultas paginadas também falham se precisarem ordenar o resultado inteiro.
+    """
+    falhas = {}
+    for rota, (sql, parametros) in CONSULTAS_INDEXADAS.items():
+        passos = plano(conn, sql, parametros)
+        if any(not _passo_aceito(rota, passo) for passo in passos) or (
+            'LIMIT' in sql and any('TEMP B-TREE' in passo for passo in passos)
+        ):
+            falhas[rota] = passos
+    return falhas
+
+
+def _passo_aceito(rota, passo):
+    if passo.startswith('SEARCH'):
+        return ' USING ' in passo
+    if passo.startswith('SCAN'):
+        indice = VARREDURAS_PERMITIDAS.get(rota)
+        return indice is not None and ' INDEX ' in passo and passo.split()[-1] == indice
+    return True
+
+
+def relatorio_planos(conn):
+    falhas = verificar_planos(conn)
+    for rota, (sql, parametros) in CONSULTAS_INDEXADAS.items():
+        situacao = 'FALHA' if rota in falhas else 'OK'
+        print(f"[{situacao}] {rota}: {' | '.join(plano(conn, sql, parametros))}")
+    return not falhas
+
+
+if __name__ == '__main__':
+    import migracoes
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else banco.DB_PATH
+    conn = sqlite3.connect(caminho)
+    try:
+        migracoes.migrar(conn)
+        sys.exit(0 if relatorio_planos(conn) else 1)
+    finally:
+        conn.close()
@@ -0,0 +1,157 @@
+import collections
+import json
+import queue
+import threading
+
+
+HISTORICO = 1000
+FILA_ASSINANTE = 256
+
+
+class Assinatura:
+    """
+    Fila de eventos de um cliente do /eventos. Se o cliente não consumir os
+    eventos a tempo e a fila encher, a assinatura é encerrada: o navegador
+    reconecta e recupera o que perdeu pelo Last-Event-ID (ou recarrega tudo).
+    """
+
+    __slots__ = ('fila', 'encerrada', 'avisar')
+
+    def __init__(self, tamanho, avisar=None):
+        self.fila = queue.Queue(maxsize=tamanho)
+        self.encerrada = False
+        # Chamado (na thread de quem publicou) a cada evento entregue; o
+        # /eventos assíncrono usa para acordar o event loop em vez de bloquear
+        self.avisar = avisar
+
+    def entregar(self, evento):
+        """Põe o evento na fila; levanta queue.Full se o cliente não acompanhou."""
+        self.fila.put_nowait(evento)
+        if self.avisar is not None:
+            self.avisar()
+
+    def proximo(self, espera):
+        """Devolve o próximo evento, ou None se nada chegou dentro da espera ou a assinatura foi encerrada."""
+        try:
+            return self.fila.get(timeout=espera)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    """
+    Pub/sub em memória das mudanças de reservas.
+
+    Cada processo tem o seu broker, alimentado pela sincronização com a
+    tabela alteracoes; o id de cada evento é o id da alteração, igual em
+    todos os workers, então um cliente que reconectou em outro processo
+    continua de onde parou. Os últimos eventos ficam guardados para que ele
+    receba o que perdeu em vez de recarregar a lista inteira.
+    """
+
+    def __init__(self, historico=HISTORICO, tamanho_fila=FILA_ASSINANTE):
+        self._assinaturas = set()
+        self._historico = collections.deque(maxlen=historico)
+        # Todo evento com id maior que _inicio ainda está no histórico
+        self._inicio = 0
+        self._proximo_id = 1
+        self._tamanho_fila = tamanho_fila
+        self._lock = threading.Lock()
+        self._publicados = 0
+        self._descartados = 0
+        self._recusadas = 0
+
+    def iniciar(self, ultimo_id):
+        """
+        Recomeça a partir da alteração ultimo_id, esquecendo o histórico. As
+        assinaturas abertas são encerradas: os clientes reconectam e, se
+        tiverem perdido algo, recebem 'ressincronizar'.
+        """
+        with self._lock:
+            self._historico.clear()
+            self._inicio = ultimo_id
+            self._proximo_id = ultimo_id + 1
+            self._encerrar_assinaturas()
+
+    def publicar(self, evento_id, tipo, dados):
+        with self._lock:
+            evento = (evento_id, tipo, json.dumps(dados))
+            self._proximo_id = evento_id + 1
+            if len(self._historico) == self._historico.maxlen:
+                self._inicio = self._historico[0][0]
+            self._historico.append(evento)
+            self._publicados += 1
+            for assinatura in list(self._assinaturas):
+                try:
+                    assinatura.entregar(evento)
+                except queue.Full:
+                    assinatura.encerrada = True
+                    if assinatura.avisar is not None:
+                        assinatura.avisar()
+                    self._assinaturas.discard(assinatura)
+                    self._descartados += 1
+        return evento_id
+
+    def avancar(self, ultimo_id):
+        """Registra uma alteração que não gerou evento, para que o Last-Event-ID dos clientes continue válido."""
+        with self._lock:
+            self._proximo_id = max(self._proximo_id, ultimo_id + 1)
+
+    def assinar(self, ultimo_id=None, avisar=None, limite=0):
+        """
+        Cria uma assinatura. Com ultimo_id (cabeçalho Last-Event-ID), os eventos
+        posteriores a ele já entram na fila; se parte deles já saiu do histórico
+        (ou é de antes de este processo carregar o estado), a fila começa com
+        um evento 'ressincronizar' e o cliente deve recarregar o estado.
+
+        avisar, se dado, é chamado a cada evento entregue (ver Assinatura).
+        Com limite, devolve None se já houver limite assinaturas abertas.
+        """
+        assinatura = Assinatura(self._tamanho_fila, avisar)
+        with self._lock:
+            if limite and len(self._assinaturas) >= limite:
+                self._recusadas += 1
+                return None
+            if ultimo_id is not None:
+                perdidos = [evento for evento in self._historico if evento[0] > ultimo_id]
+                if self._inicio <= ultimo_id < self._proximo_id and len(perdidos) < self._tamanho_fila:
+                    for evento in perdidos:
+                        assinatura.entregar(evento)
+                else:
+                    assinatura.entregar((self._proximo_id - 1, 'ressincronizar', '{}'))
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def _encerrar_assinaturas(self):
+        for assinatura in self._assinaturas:
+            assinatura.encerrada = True
+            try:
+                assinatura.entregar(None)
+            except queue.Full:
+                if assinatura.avisar is not None:
+                    assinatura.avisar()
+        self._assinaturas.clear()
+
+    def encerrar(self):
+        """Encerra todas as assinaturas (desligamento do servidor); cada stream termina na hora."""
+        with self._lock:
+            self._encerrar_assinaturas()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'assinantes': len(self._assinaturas),
+                'publicados': self._publicados,
+                'descartados': self._descartados,
+                'recusadas': self._recusadas,
+                'historico': len(self._historico),
+            }
+
+
+def formatar_sse(evento):
+    evento_id, tipo, dados = evento
+    return f'id: {evento_id}\nevent: {tipo}\ndata: {dados}\n\n'
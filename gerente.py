@@ -1,14 +1,22 @@
 
 from datetime import datetime
+from urllib.parse import quote, urlencode
 import requests
 
 
 BASE_URL = 'http://localhost:5000'  
+TAMANHO_PAGINA = 50
+
+# Última resposta de cada URL com a ETag recebida: {url: (etag, dados)}
+respostas_anteriores = {}
 
 def get_json_safe(url):
     """
     Faz uma requisição GET de forma segura e retorna dados JSON
     
+    Se a URL já foi consultada, envia a ETag recebida em If-None-Match e,
+    quando o servidor responde 304, reaproveita os dados da vez anterior
+    
     Args:
         url (str): URL completa para fazer a requisição
         
@@ -16,11 +24,19 @@ def get_json_safe(url):
         list: Lista com os dados JSON ou lista vazia em caso de erro
     """
     try:
-        response = requests.get(url)
+        anterior = respostas_anteriores.get(url)
+        headers = {'If-None-Match': anterior[0]} if anterior else {}
+        response = requests.get(url, headers=headers)
+        
+        if response.status_code == 304 and anterior:
+            return anterior[1]
         
         if response.status_code == 200:
             try:
-                return response.json()
+                dados = response.json()
+                if response.headers.get('ETag'):
+                    respostas_anteriores[url] = (response.headers['ETag'], dados)
+                return dados
             except ValueError:
                 print("❌ Erro: Resposta não é JSON válido.")
                 print(f"Resposta recebida: {response.text}")
@@ -52,26 +68,70 @@ def formatar_data(data_str):
     except ValueError:
         raise ValueError("Data deve estar no formato DD-MM-YYYY")
 
-def exibir_reservas(reservas, titulo):
+def buscar_paginas(url):
     """
-    Exibe uma lista de reservas de forma formatada
+    Percorre um relatório paginado, buscando uma página por vez
     
     Args:
-        reservas (list): Lista de reservas (dicionários)
+        url (str): URL do relatório, sem os parâmetros de paginação
+        
+    Yields:
+        tuple: (reservas da página, se existe uma próxima página)
+    """
+    separador = '&' if '?' in url else '?'
+    cursor = None
+    
+    while True:
+        params = {'limit': TAMANHO_PAGINA}
+        if cursor:
+            params['cursor'] = cursor
+        
+        pagina = get_json_safe(f"{url}{separador}{urlencode(params)}")
+        if not isinstance(pagina, dict):
+            return
+        
+        cursor = pagina.get('next_cursor')
+        yield pagina.get('reservas', []), bool(cursor)
+        
+        if not cursor:
+            return
+
+def exibir_relatorio(url, titulo):
+    """
+    Exibe um relatório página a página, só buscando a próxima se o usuário pedir
+    
+    Args:
+        url (str): URL do relatório, sem os parâmetros de paginação
         titulo (str): Título do relatório
     """
     print(f"\n{'='*60}")
     print(f"📊 {titulo}")
     print(f"{'='*60}")
     
-    if not reservas:
-        print("📝 Nenhuma reserva encontrada.")
-        return
+    total = 0
+    for reservas, tem_mais in buscar_paginas(url):
+        exibir_reservas(reservas, inicio=total + 1)
+        total += len(reservas)
+        
+        if not tem_mais:
+            break
+        if input("⏭️  ENTER para a próxima página ou 'q' para parar: ").strip().lower() == 'q':
+            break
     
-    print(f"📈 Total de reservas: {len(reservas)}")
-    print("-" * 60)
+    if total == 0:
+        print("📝 Nenhuma reserva encontrada.")
+    else:
+        print(f"📈 Reservas exibidas: {total}")
+
+def exibir_reservas(reservas, inicio=1):
+    """
+    Exibe uma lista de reservas de forma formatada
     
-    for i, reserva in enumerate(reservas, 1):
+    Args:
+        reservas (list): Lista de reservas (dicionários)
+        inicio (int): Número da primeira reserva da lista
+    """
+    for i, reserva in enumerate(reservas, inicio):
         print(f"🔸 Reserva #{i}")
         print(f"   ID: {reserva.get('id', 'N/A')}")
         print(f"   📅 Data: {reserva.get('data', 'N/A')}")
@@ -101,10 +161,9 @@ def relatorio_por_periodo():
         fim_formatado = formatar_data(fim)
         
         url = f'{BASE_URL}/relatorio/periodo?inicio={inicio_formatado}&fim={fim_formatado}'
-        reservas = get_json_safe(url)
         
         titulo = f"RESERVAS DE {inicio} A {fim}"
-        exibir_reservas(reservas, titulo)
+        exibir_relatorio(url, titulo)
         
     except ValueError as e:
         print(f"❌ Erro nos dados informados: {e}")
@@ -125,10 +184,9 @@ def relatorio_por_mesa():
             return
         
         url = f'{BASE_URL}/relatorio/mesa/{mesa}'
-        reservas = get_json_safe(url)
         
         titulo = f"RESERVAS DA MESA {mesa}"
-        exibir_reservas(reservas, titulo)
+        exibir_relatorio(url, titulo)
         
     except KeyboardInterrupt:
         print("\n⚠️ Operação cancelada pelo usuário")
@@ -146,16 +204,52 @@ def relatorio_por_garcom():
             print("❌ Nome do garçom não pode estar vazio")
             return
         
-        url = f'{BASE_URL}/relatorio/garcom/{nome}'
-        reservas = get_json_safe(url)
+        url = f'{BASE_URL}/relatorio/garcom/{quote(nome)}'
         
         titulo = f"RESERVAS CONFIRMADAS POR {nome.upper()}"
-        exibir_reservas(reservas, titulo)
+        exibir_relatorio(url, titulo)
         
     except KeyboardInterrupt:
         print("\n⚠️ Operação cancelada pelo usuário")
 
 
+def resumo_agregado():
+    """
+    Exibe os totais de um período calculados pelo servidor (por dia, mesa e garçom)
+    """
+    print("\n=== RESUMO DO PERÍODO ===")
+    
+    try:
+        inicio = input("📅 Data início (DD-MM-YYYY): ")
+        fim = input("📅 Data fim (DD-MM-YYYY): ")
+        
+        params = urlencode({'inicio': formatar_data(inicio), 'fim': formatar_data(fim)})
+        resumo = get_json_safe(f'{BASE_URL}/relatorio/agregado?{params}')
+        if not isinstance(resumo, dict):
+            return
+        
+        totais = resumo['totais']
+        print(f"\n{'='*60}")
+        print(f"📈 RESUMO DE {inicio} A {fim}")
+        print(f"{'='*60}")
+        print(f"   Reservas: {totais['reservas']}  |  Pessoas: {totais['pessoas']}  |  "
+              f"Média: {totais['media_pessoas']}  |  Ocupação: {totais['taxa_ocupacao']:.1%}")
+        
+        for titulo, chave, itens in (('POR DIA', 'data', resumo['por_dia']),
+                                     ('POR MESA', 'mesa', resumo['por_mesa']),
+                                     ('POR GARÇOM', 'garcom', resumo['por_garcom'])):
+            if not itens:
+                continue
+            print(f"\n🔸 {titulo}")
+            for item in itens:
+                print(f"   {str(item[chave]):<14} reservas: {item['reservas']:<5} "
+                      f"pessoas: {item['pessoas']:<6} média: {item['media_pessoas']}")
+        
+    except ValueError as e:
+        print(f"❌ Erro nos dados informados: {e}")
+    except KeyboardInterrupt:
+        print("\n⚠️ Operação cancelada pelo usuário")
+
 
 def exibir_menu():
     """
@@ -167,6 +261,7 @@ def exibir_menu():
     print("1 - Relatório por período")
     print("2 - Relatório por mesa")
     print("3 - Relatório por garçom")
+    print("4 - Resumo do período")
     print("0 - Sair")
     print("-" * 60)
 
@@ -186,13 +281,15 @@ def main():
                 relatorio_por_mesa()
             elif opcao == '3':
                 relatorio_por_garcom()
+            elif opcao == '4':
+                resumo_agregado()
             elif opcao == '0':
                 print("👋 Saindo do sistema de relatórios...")
                 break
             else:
-                print("❌ Opção inválida! Escolha um número de 0 a 3.")
+                print("❌ Opção inválida! Escolha um número de 0 a 4.")
         
-            if opcao in ['1', '2', '3']:
+            if opcao in ['1', '2', '3', '4']:
                 input("\n⏸️  Pressione ENTER para continuar...")
                 
         except KeyboardInterrupt:
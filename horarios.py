@@ -0,0 +1,52 @@
+import datetime
+from functools import lru_cache
+
+
+MINUTOS_DIA = 24 * 60
+DURACAO_RESERVA = 60
+
+# Tabela com as 1440 strings "HH:MM" de um dia; formatar um horário vira uma
+# indexação em vez de strftime.
+HORARIOS = tuple(f'{minuto // 60:02}:{minuto % 60:02}' for minuto in range(MINUTOS_DIA))
+
+
+@lru_cache(maxsize=4096)
+def para_minutos(hora):
+    """
+    Converte "HH:MM" em minutos desde a meia-noite.
+
+    Raises:
+        ValueError: se a hora não estiver no formato HH:MM
+    """
+    partes = hora.split(':')
+    if len(partes) != 2:
+        raise ValueError(f'Hora inválida: {hora!r}')
+    horas, minutos = int(partes[0]), int(partes[1])
+    if not (0 <= horas < 24 and 0 <= minutos < 60):
+        raise ValueError(f'Hora inválida: {hora!r}')
+    return horas * 60 + minutos
+
+
+def formatar(minutos):
+    return HORARIOS[minutos % MINUTOS_DIA]
+
+
+def fim_em_minutos(inicio, hora_fim=None):
+    """
+    Fim da reserva em minutos, sempre maior que o início: uma reserva que
+    atravessa a meia-noite (23:30 - 00:30) termina em 1470.
+    """
+    fim = para_minutos(hora_fim) if hora_fim else inicio + DURACAO_RESERVA
+    if fim <= inicio:
+        fim += MINUTOS_DIA
+    return fim
+
+
+@lru_cache(maxsize=4096)
+def data_para_ordinal(data):
+    return datetime.date.fromisoformat(data).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def ordinal_para_data(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
@@ -0,0 +1,185 @@
+"""
+Criação de reservas em lote: POST /reservas/lote e flask importar-reservas.
+
+O lote chega como array JSON, JSON Lines ou CSV (com cabeçalho). Cada linha
+passa pelas mesmas regras de criar_reserva: primeiro a validação dos campos
+(validar), fora da transação; depois, já com a trava de escrita, as checagens
+de reserva duplicada e de conflito com reservas confirmadas, feitas em
+memória para o lote inteiro, e um único executemany com as linhas válidas
+(inserir). As linhas com problema voltam em um relatório com o número da
+linha e a mesma mensagem que a rota de reserva única daria.
+"""
+import collections
+import csv
+import datetime
+import io
+import json
+
+import consultas
+import horarios
+import repositorio
+
+
+CAMPOS = ('data', 'hora', 'mesa', 'pessoas', 'responsavel')
+
+FORMATOS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'text/csv': 'csv',
+}
+
+EXTENSOES = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+
+ReservaLote = collections.namedtuple(
+    'ReservaLote', 'linha data hora mesa pessoas responsavel hora_fim data_ord hora_min hora_fim_min'
+)
+
+
+def ler(texto, formato):
+    """
+    Devolve a lista de (linha, dados) do lote; dados é None quando a própria
+    linha não pôde ser lida (JSON Lines com uma linha quebrada, por exemplo).
+
+    Raises:
+        ValueError: se o lote inteiro não puder ser lido
+    """
+    if formato == 'json':
+        try:
+            registros = json.loads(texto)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'JSON invalido: {e}')
+        if not isinstance(registros, list):
+            raise ValueError('O lote deve ser um array JSON de reservas')
+        return list(enumerate(registros, start=1))
+
+    if formato == 'jsonl':
+        linhas = []
+        for numero, linha in enumerate(texto.splitlines(), start=1):
+            if not linha.strip():
+                continue
+            try:
+                linhas.append((numero, json.loads(linha)))
+            except json.JSONDecodeError:
+                linhas.append((numero, None))
+        return linhas
+
+    if formato == 'csv':
+        leitor = csv.DictReader(io.StringIO(texto))
+        faltando = [campo for campo in CAMPOS if campo not in (leitor.fieldnames or ())]
+        if faltando:
+            raise ValueError(f'Cabecalho do CSV sem as colunas: {", ".join(faltando)}')
+        return [(leitor.line_num, registro) for registro in leitor]
+
+    raise ValueError(f'Formato de lote desconhecido: {formato}')
+
+
+def ler_inteiro(dados, campo):
+    """
+    Valor inteiro de dados[campo], aceitando também texto ("2") e números
+    sem parte fracionária (2.0, "2.0"). 2.7 é recusado, não truncado.
+
+    Raises:
+        KeyError, TypeError, ValueError: se o campo faltar ou não for inteiro
+    """
+    valor = dados[campo]
+    if isinstance(valor, bool):
+        raise ValueError
+    if isinstance(valor, int):
+        return valor
+    numero = float(valor)
+    if not numero.is_integer():
+        raise ValueError
+    return int(numero)
+
+
+def validar(linha, dados, catalogo, agora):
+    """
+    Confere e normaliza uma linha do lote.
+
+    Raises:
+        ValueError: com a mensagem de erro da linha
+    """
+    if not isinstance(dados, dict):
+        raise ValueError('Linha invalida')
+    for campo in CAMPOS:
+        if dados.get(campo) in (None, ''):
+            raise ValueError(f'Campo "{campo}" e obrigatorio')
+
+    try:
+        mesa, pessoas = ler_inteiro(dados, 'mesa'), ler_inteiro(dados, 'pessoas')
+    except (TypeError, ValueError):
+        raise ValueError('Campos "mesa" e "pessoas" devem ser numeros inteiros')
+    catalogo.validar(mesa, pessoas)
+
+    try:
+        data_ord = horarios.data_para_ordinal(str(dados['data']))
+    except ValueError:
+        raise ValueError('Campo "data" deve estar no formato AAAA-MM-DD')
+    try:
+        hora_min = horarios.para_minutos(str(dados['hora']))
+    except ValueError:
+        raise ValueError('Formato de hora inválido')
+    if (data_ord, hora_min) <= (agora.toordinal(), agora.hour * 60 + agora.minute):
+        raise ValueError('Não é possível fazer reservas para datas/horas passadas')
+
+    hora_fim_min = horarios.fim_em_minutos(hora_min)
+    return ReservaLote(
+        linha, horarios.ordinal_para_data(data_ord), horarios.formatar(hora_min), mesa,
+        pessoas, str(dados['responsavel']), horarios.formatar(hora_fim_min),
+        data_ord, hora_min, hora_fim_min,
+    )
+
+
+def validar_lote(registros, catalogo, agora=None):
+    """
+    Separa as linhas válidas das com erro; erros é uma lista de (linha,
+    mensagem). catalogo é o CatalogoMesas com as mesas e capacidades.
+    """
+    agora = agora or datetime.datetime.now()
+    reservas, erros = [], []
+    for linha, dados in registros:
+        try:
+            reservas.append(validar(linha, dados, catalogo, agora))
+        except ValueError as e:
+            erros.append((linha, str(e)))
+    return reservas, erros
+
+
+def inserir(con, reservas, indice, criada_em):
+    """
+    Grava as reservas válidas do lote; deve rodar dentro de uma transação de
+    escrita (banco.executar_transacao). indice é o IndiceIntervalos com as
+    reservas confirmadas, já em dia com o banco.
+
+    Devolve (criadas, erros): criadas é uma lista de (reserva, id).
+    """
+    if not reservas:
+        return [], []
+
+    periodo = (min(reserva.data_ord for reserva in reservas), max(reserva.data_ord for reserva in reservas))
+    ocupadas = {tuple(chave) for chave in con.execute(consultas.SQL_RESERVADAS_PERIODO, periodo)}
+
+    validas, erros = [], []
+    for reserva in reservas:
+        chave = (reserva.mesa, reserva.data_ord, reserva.hora_min)
+        if chave in ocupadas:
+            erros.append((reserva.linha, 'Mesa ja reservada nesse horario'))
+        elif indice.conflita(reserva.mesa, reserva.data_ord, reserva.hora_min, reserva.hora_fim_min):
+            erros.append((reserva.linha, 'Mesa em uso nesse horario'))
+        else:
+            ocupadas.add(chave)
+            validas.append(reserva)
+
+    if not validas:
+        return [], erros
+
+    con.executemany(repositorio.SQL_INSERIR_RESERVA, (
+        (reserva.data, reserva.hora, reserva.mesa, reserva.pessoas, reserva.responsavel, reserva.hora_fim,
+         reserva.data_ord, reserva.hora_min, reserva.hora_fim_min, criada_em)
+        for reserva in validas
+    ))
+    # Com AUTOINCREMENT e a trava de escrita, os ids do executemany são consecutivos
+    ultimo_id = con.execute('SELECT max(id) FROM reservas').fetchone()[0]
+    primeiro_id = ultimo_id - len(validas) + 1
+    return [(reserva, primeiro_id + i) for i, reserva in enumerate(validas)], erros
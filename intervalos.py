@@ -0,0 +1,132 @@
+import bisect
+import threading
+
+import horarios
+
+
+class _IntervalosMesa:
+    """
+    Intervalos confirmados de uma mesa em um dia, ordenados pelo início.
+
+    fins_max[i] guarda o maior fim entre os intervalos 0..i, o que permite
+    responder "algum intervalo começa antes de X e termina depois de Y?" com
+    uma única busca binária, mesmo que existam sobreposições antigas no banco.
+    """
+
+    __slots__ = ('inicios', 'fins', 'ids', 'fins_max')
+
+    def __init__(self):
+        self.inicios = []
+        self.fins = []
+        self.ids = []
+        self.fins_max = []
+
+    def _recalcular_maximos(self, posicao):
+        maximo = self.fins_max[posicao - 1] if posicao > 0 else -1
+        del self.fins_max[posicao:]
+        for fim in self.fins[posicao:]:
+            maximo = max(maximo, fim)
+            self.fins_max.append(maximo)
+
+    def adicionar(self, reserva_id, inicio, fim):
+        posicao = bisect.bisect_right(self.inicios, inicio)
+        self.inicios.insert(posicao, inicio)
+        self.fins.insert(posicao, fim)
+        self.ids.insert(posicao, reserva_id)
+        self._recalcular_maximos(posicao)
+
+    def remover(self, reserva_id):
+        try:
+            posicao = self.ids.index(reserva_id)
+        except ValueError:
+            return False
+        del self.inicios[posicao]
+        del self.fins[posicao]
+        del self.ids[posicao]
+        self._recalcular_maximos(posicao)
+        return True
+
+    def conflita(self, inicio, fim, ignorar_id=None):
+        limite = bisect.bisect_left(self.inicios, fim)
+        if limite == 0 or self.fins_max[limite - 1] <= inicio:
+            return False
+        if ignorar_id is None or ignorar_id not in self.ids:
+            return True
+        return any(
+            self.inicios[i] < fim and self.fins[i] > inicio
+            for i in range(limite) if self.ids[i] != ignorar_id
+        )
+
+
+class IndiceIntervalos:
+    """
+    Índice em memória das reservas confirmadas, por (mesa, data_ord), com
+    horários em minutos desde a meia-noite do próprio dia (ver horarios.py);
+    uma reserva que atravessa a meia-noite fica no dia em que começa, com fim
+    maior que 1440.
+
+    É a fonte da verificação de conflito de horário: precisa ser atualizado
+    sempre que uma reserva entra ou sai do status 'confirmada' e reconstruído
+    a partir do banco na inicialização (carregar).
+    """
+
+    def __init__(self):
+        self._mesas = {}
+        self._posicoes = {}
+        self._lock = threading.Lock()
+
+    def carregar(self, conn):
+        cursor = conn.execute('''
+            SELECT id, mesa, data_ord, hora_min, hora_fim_min FROM reservas
+            WHERE status = 'confirmada' AND data_ord IS NOT NULL AND hora_min IS NOT NULL
+        ''')
+        mesas = {}
+        posicoes = {}
+        for reserva_id, mesa, data_ord, inicio, fim in cursor:
+            mesas.setdefault((mesa, data_ord), _IntervalosMesa()).adicionar(reserva_id, inicio, fim)
+            posicoes[reserva_id] = (mesa, data_ord)
+        with self._lock:
+            self._mesas = mesas
+            self._posicoes = posicoes
+        return len(posicoes)
+
+    def adicionar(self, reserva_id, mesa, data_ord, inicio, fim):
+        with self._lock:
+            self._remover(reserva_id)
+            self._mesas.setdefault((mesa, data_ord), _IntervalosMesa()).adicionar(reserva_id, inicio, fim)
+            self._posicoes[reserva_id] = (mesa, data_ord)
+
+    def _remover(self, reserva_id):
+        chave = self._posicoes.pop(reserva_id, None)
+        if chave is None:
+            return False
+        intervalos = self._mesas[chave]
+        intervalos.remover(reserva_id)
+        if not intervalos.ids:
+            del self._mesas[chave]
+        return True
+
+    def remover(self, reserva_id):
+        with self._lock:
+            return self._remover(reserva_id)
+
+    def conflita(self, mesa, data_ord, inicio, fim, ignorar_id=None):
+        """
+        Verifica [inicio, fim) contra as reservas do dia e dos dias vizinhos:
+        uma reserva da véspera que passa da meia-noite (fim > 1440) ocupa o
+        começo de data_ord, e uma de data_ord que passa da meia-noite ocupa o
+        começo do dia seguinte.
+        """
+        vizinhos = (-1, 0, 1) if fim > horarios.MINUTOS_DIA else (-1, 0)
+        with self._lock:
+            for dias in vizinhos:
+                intervalos = self._mesas.get((mesa, data_ord + dias))
+                if intervalos is None:
+                    continue
+                deslocamento = dias * horarios.MINUTOS_DIA
+                if intervalos.conflita(inicio - deslocamento, fim - deslocamento, ignorar_id):
+                    return True
+            return False
+
+    def __len__(self):
+        return len(self._posicoes)
@@ -0,0 +1,269 @@
+"""
+Métricas do servidor no formato texto do Prometheus (GET /metrics).
+
+- reservas_requisicoes_total / reservas_erros_total: requisições por rota,
+  método e status (erros: status 5xx)
+- reservas_requisicao_segundos: latência por rota e método
+- reservas_sql_segundos: tempo de cada execute/executemany e de cada
+  fetchone/fetchmany/fetchall, por consulta (nome da constante SQL_* de
+  origem) e fase. Linhas lidas iterando direto sobre o cursor não entram.
+- reservas_serializacao_segundos: tempo de geração do JSON por rota
+
+Registrar uma observação custa uma busca binária nos limites do histograma
+e um incremento sob uma trava, sem alocação depois da primeira vez.
+
+Com vários workers, cada processo grava periodicamente os próprios números
+em RESERVAS_METRICAS_DIR (o modo serve cria um diretório temporário) e o
+/metrics de qualquer worker soma os de todos.
+"""
+import bisect
+import functools
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import catalogo
+import consultas
+import importacao
+import perfilador
+import registro
+import repositorio
+import sincronizacao
+import versoes
+
+
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICAS_DIR = os.environ.get('RESERVAS_METRICAS_DIR')
+METRICAS_INTERVALO = float(os.environ.get('RESERVAS_METRICAS_INTERVALO', '5'))
+
+log = registro.obter('metricas')
+
+NOMES_CONSULTAS = {
+    sql: nome[len('SQL_'):].lower()
+    for modulo in (consultas, catalogo, importacao, repositorio, sincronizacao, versoes)
+    for nome, sql in vars(modulo).items()
+    if nome.startswith('SQL_') and isinstance(sql, str)
+}
+
+# (nome, tipo, descrição, nomes dos rótulos)
+FAMILIAS = (
+    ('reservas_requisicoes_total', 'counter', 'Requisicoes atendidas', ('rota', 'metodo', 'status')),
+    ('reservas_erros_total', 'counter', 'Requisicoes que terminaram com status 5xx', ('rota', 'metodo')),
+    ('reservas_requisicao_segundos', 'histogram', 'Latencia das requisicoes', ('rota', 'metodo')),
+    ('reservas_sql_segundos', 'histogram', 'Tempo das chamadas ao SQLite', ('consulta', 'fase')),
+    ('reservas_serializacao_segundos', 'histogram', 'Tempo de geracao do JSON das respostas', ('rota',)),
+)
+
+
+@functools.lru_cache(maxsize=512)
+def nome_consulta(sql):
+    """Nome da constante SQL_* com esse texto ou, para SQL montado na hora, "verbo tabela"."""
+    nome = NOMES_CONSULTAS.get(sql)
+    if nome:
+        return nome
+    palavras = sql.split(None, 1)
+    verbo = palavras[0].lower() if palavras else ''
+    if verbo in ('create', 'drop', 'alter', 'pragma'):
+        return verbo
+    tabela = re.search(r'\b(?:FROM|INTO|UPDATE)\s+(\w+)', sql, re.IGNORECASE)
+    return f'{verbo} {tabela.group(1)}' if tabela else verbo
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}'
+
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Coletor:
+    """
+    Contadores e histogramas de um processo. Cada série é uma lista: nos
+    contadores, [total]; nos histogramas, a contagem de cada faixa de
+    LIMITES, a das acima do último limite e, por fim, a soma dos valores.
+    """
+
+    def __init__(self, diretorio=METRICAS_DIR, intervalo=METRICAS_INTERVALO):
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self._series = {familia[0]: {} for familia in FAMILIAS}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _contar(self, familia, rotulos):
+        with self._lock:
+            serie = self._series[familia].get(rotulos)
+            if serie is None:
+                serie = self._series[familia][rotulos] = [0]
+            serie[0] += 1
+
+    def _observar(self, familia, rotulos, valor):
+        faixa = bisect.bisect_left(LIMITES, valor)
+        with self._lock:
+            serie = self._series[familia].get(rotulos)
+            if serie is None:
+                serie = self._series[familia][rotulos] = [0] * (len(LIMITES) + 2)
+            serie[faixa] += 1
+            serie[-1] += valor
+
+    def observar_requisicao(self, rota, metodo, status, segundos):
+        self._contar('reservas_requisicoes_total', (rota, metodo, str(status)))
+        if status >= 500:
+            self._contar('reservas_erros_total', (rota, metodo))
+        self._observar('reservas_requisicao_segundos', (rota, metodo), segundos)
+
+    def observar_sql(self, consulta, fase, segundos):
+        self._observar('reservas_sql_segundos', (consulta, fase), segundos)
+
+    def observar_serializacao(self, rota, segundos):
+        self._observar('reservas_serializacao_segundos', (rota,), segundos)
+
+    def _copiar(self):
+        with self._lock:
+            return {familia: {rotulos: list(serie) for rotulos, serie in series.items()}
+                    for familia, series in self._series.items()}
+
+    def _arquivo(self):
+        return os.path.join(self.diretorio, f'{os.getpid()}.json')
+
+    def gravar(self):
+        """Grava os números deste processo em diretorio/<pid>.json."""
+        dados = {familia: list(series.items()) for familia, series in self._copiar().items()}
+        temporario = self._arquivo() + '.tmp'
+        with open(temporario, 'w') as f:
+            json.dump(dados, f)
+        os.replace(temporario, self._arquivo())
+
+    def _somar_processos(self):
+        self.gravar()
+        total = {familia[0]: {} for familia in FAMILIAS}
+        for caminho in glob.glob(os.path.join(self.diretorio, '*.json')):
+            try:
+                with open(caminho) as f:
+                    dados = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for familia, series in dados.items():
+                destino = total.get(familia)
+                if destino is None:
+                    continue
+                for rotulos, serie in series:
+                    rotulos = tuple(rotulos)
+                    atual = destino.get(rotulos)
+                    destino[rotulos] = serie if atual is None else [a + b for a, b in zip(atual, serie)]
+        return total
+
+    def exportar(self):
+        series_por_familia = self._somar_processos() if self.diretorio else self._copiar()
+        linhas = []
+        for familia, tipo, descricao, nomes in FAMILIAS:
+            linhas.append(f'# HELP {familia} {descricao}')
+            linhas.append(f'# TYPE {familia} {tipo}')
+            for rotulos, serie in sorted(series_por_familia[familia].items()):
+                if tipo == 'counter':
+                    linhas.append(f'{familia}{_rotulos(nomes, rotulos)} {serie[0]}')
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(LIMITES + ('+Inf',), serie[:-1]):
+                    acumulado += contagem
+                    faixa = _rotulos(nomes, rotulos, 'le="%s"' % limite)
+                    linhas.append(f'{familia}_bucket{faixa} {acumulado}')
+                linhas.append(f'{familia}_sum{_rotulos(nomes, rotulos)} {_formatar_numero(serie[-1])}')
+                linhas.append(f'{familia}_count{_rotulos(nomes, rotulos)} {acumulado}')
+        return '\n'.join(linhas) + '\n'
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.gravar()
+            except OSError as e:
+                log.error('Gravação das métricas falhou: %s', e)
+
+    def iniciar(self):
+        if not self.diretorio or self._thread is not None:
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name='metricas', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.gravar()
+
+
+coletor = Coletor()
+
+
+class CursorMedido(sqlite3.Cursor):
+    consulta = ''
+    sql = ''
+
+    def _medir(self, fase, metodo, *argumentos):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*argumentos)
+        finally:
+            segundos = time.perf_counter() - inicio
+            coletor.observar_sql(self.consulta, fase, segundos)
+            if perfilador.ativos:
+                perfilador.registrar_sql(self.sql, fase, segundos)
+
+    def execute(self, sql, parametros=()):
+        self.sql, self.consulta = sql, nome_consulta(sql)
+        return self._medir('execute', super().execute, sql, parametros)
+
+    def executemany(self, sql, parametros):
+        self.sql, self.consulta = sql, nome_consulta(sql)
+        return self._medir('execute', super().executemany, sql, parametros)
+
+    def fetchone(self):
+        return self._medir('fetch', super().fetchone)
+
+    def fetchmany(self, *argumentos):
+        return self._medir('fetch', super().fetchmany, *argumentos)
+
+    def fetchall(self):
+        return self._medir('fetch', super().fetchall)
+
+
+class ConexaoMedida(sqlite3.Connection):
+    """
+    Conexão cujos cursores medem cada chamada ao SQLite (uso:
+    sqlite3.connect(..., factory=ConexaoMedida), ou a fabrica do pool).
+    """
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            segundos = time.perf_counter() - inicio
+            coletor.observar_sql('commit', 'commit', segundos)
+            if perfilador.ativos:
+                perfilador.registrar_sql('COMMIT', 'commit', segundos)
@@ -0,0 +1,445 @@
+import sqlite3
+import sys
+
+import banco
+import registro
+
+
+log = registro.obter('migracoes')
+
+
+def _colunas(conn, tabela):
+    return {coluna[1] for coluna in conn.execute(f'PRAGMA table_info({tabela})')}
+
+
+def criar_tabela_reservas(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reservas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            hora TEXT NOT NULL,
+            mesa INTEGER NOT NULL,
+            pessoas INTEGER NOT NULL,
+            responsavel TEXT NOT NULL,
+            status TEXT DEFAULT 'reservada',
+            garcom TEXT,
+            hora_fim TEXT,
+            data_confirmacao TEXT,
+            hora_confirmacao TEXT
+        )
+    ''')
+
+
+# A versão antiga aceitava (e gravava) horas sem zero à esquerda, como
+# "9:30". As contas em SQL daqui (substr, strftime) exigem "HH:MM".
+_PADRONIZAR = "printf('%02d:%02d', CAST(substr({0}, 1, instr({0}, ':') - 1) AS INTEGER), CAST(substr({0}, instr({0}, ':') + 1) AS INTEGER))"
+
+
+def _padronizar_horas(conn):
+    total = 0
+    for coluna in ('hora', 'hora_fim'):
+        cur = conn.execute(f'''
+            UPDATE reservas SET {coluna} = {_PADRONIZAR.format(coluna)}
+            WHERE {coluna} LIKE '%:%' AND length({coluna}) < 5
+        ''')
+        total += cur.rowcount
+    if total > 0:
+        log.info('Horas sem zero à esquerda corrigidas em %d campos', total)
+
+
+def adicionar_colunas_horario(conn):
+    colunas_existentes = _colunas(conn, 'reservas')
+
+    for coluna in ('hora_fim', 'data_confirmacao', 'hora_confirmacao'):
+        if coluna not in colunas_existentes:
+            conn.execute(f'ALTER TABLE reservas ADD COLUMN {coluna} TEXT')
+            log.info("Coluna '%s' adicionada à tabela", coluna)
+
+    _padronizar_horas(conn)
+    cur = conn.execute('''
+        UPDATE reservas SET hora_fim = strftime('%H:%M', hora, '+1 hour')
+        WHERE hora_fim IS NULL AND hora IS NOT NULL
+    ''')
+    if cur.rowcount > 0:
+        log.info('Hora fim calculada para %d reservas', cur.rowcount)
+
+
+def _recriar_indices(conn, indices):
+    for nome, definicao in indices.items():
+        conn.execute(f'DROP INDEX IF EXISTS {nome}')
+        conn.execute(f'CREATE INDEX {nome} ON {definicao}')
+
+
+def criar_indices(conn):
+    _recriar_indices(conn, {
+        'idx_reservas_mesa_data': 'reservas(mesa, data, hora)',
+        'idx_reservas_data': 'reservas(data, hora)',
+        'idx_reservas_garcom': 'reservas(garcom) WHERE garcom IS NOT NULL',
+        'idx_reservas_confirmadas': "reservas(mesa, data, hora) WHERE status = 'confirmada'",
+        'idx_reservas_confirmadas_data': "reservas(data, hora) WHERE status = 'confirmada'",
+        'idx_reservas_reservadas': "reservas(data, hora) WHERE status = 'reservada'",
+    })
+
+
+_MINUTOS = "(CAST(substr({0}, 1, 2) AS INTEGER) * 60 + CAST(substr({0}, 4, 2) AS INTEGER))"
+_FIM = "(CASE WHEN {1} > {0} THEN {2} ELSE {2} + 1440 END)"
+
+
+def _intervalo(tabela):
+    hora = f'{tabela}.hora'
+    hora_fim = f'{tabela}.hora_fim'
+    return _MINUTOS.format(hora), _FIM.format(hora, hora_fim, _MINUTOS.format(hora_fim))
+
+
+def criar_guarda_sobreposicao(conn):
+    inicio_novo, fim_novo = _intervalo('NEW')
+    inicio, fim = _intervalo('r')
+    _recriar_guarda_sobreposicao(conn, f'''
+        r.mesa = NEW.mesa AND r.data = NEW.data
+        AND {inicio} < {fim_novo} AND {fim} > {inicio_novo}
+    ''', 'status, mesa, data, hora, hora_fim')
+
+
+def _recriar_guarda_sobreposicao(conn, condicao, colunas):
+    sobreposicao = f'''
+        SELECT RAISE(ABORT, 'conflito_horario') WHERE EXISTS (
+            SELECT 1 FROM reservas r
+            WHERE r.status = 'confirmada' AND r.id != NEW.id AND {condicao}
+        );
+    '''
+    conn.execute('DROP TRIGGER IF EXISTS reservas_sobreposicao_insert')
+    conn.execute('DROP TRIGGER IF EXISTS reservas_sobreposicao_update')
+    conn.execute(f'''
+        CREATE TRIGGER reservas_sobreposicao_insert
+        BEFORE INSERT ON reservas WHEN NEW.status = 'confirmada'
+        BEGIN {sobreposicao} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER reservas_sobreposicao_update
+        BEFORE UPDATE OF {colunas} ON reservas
+        WHEN NEW.status = 'confirmada'
+        BEGIN {sobreposicao} END
+    ''')
+
+
+def adicionar_horarios_inteiros(conn):
+    colunas_existentes = _colunas(conn, 'reservas')
+    for coluna in ('data_ord', 'hora_min', 'hora_fim_min'):
+        if coluna not in colunas_existentes:
+            conn.execute(f'ALTER TABLE reservas ADD COLUMN {coluna} INTEGER')
+
+    # data_ord segue date.toordinal() (0001-01-01 = 1); o julianday dessa data é 1721425.5
+    inicio, fim = _intervalo('reservas')
+    conn.execute(f'''
+        UPDATE reservas SET
+            data_ord = CAST(julianday(data) - 1721424.5 AS INTEGER),
+            hora_min = {inicio},
+            hora_fim_min = CASE WHEN hora_fim IS NULL THEN {inicio} + 60 ELSE {fim} END
+    ''')
+
+    _recriar_indices(conn, {
+        'idx_reservas_mesa_data': 'reservas(mesa, data_ord, hora_min)',
+        'idx_reservas_data': 'reservas(data_ord, hora_min)',
+        'idx_reservas_confirmadas': "reservas(mesa, data_ord, hora_min) WHERE status = 'confirmada'",
+        'idx_reservas_confirmadas_data': "reservas(data_ord, hora_min) WHERE status = 'confirmada'",
+        'idx_reservas_reservadas': "reservas(data_ord, hora_min) WHERE status = 'reservada'",
+    })
+    _recriar_guarda_sobreposicao(conn, '''
+        r.mesa = NEW.mesa AND r.data_ord = NEW.data_ord
+        AND r.hora_min < NEW.hora_fim_min AND r.hora_fim_min > NEW.hora_min
+    ''', 'status, mesa, data_ord, hora_min, hora_fim_min')
+
+
+def ordenar_indice_garcom(conn):
+    # Paginação por (data, hora, id) do relatório por garçom sem ordenação extra
+    _recriar_indices(conn, {
+        'idx_reservas_garcom': 'reservas(garcom, data_ord, hora_min) WHERE garcom IS NOT NULL',
+    })
+
+
+# Minutos entre a criação da reserva e a confirmação pelo garçom; NULL quando
+# algum dos dois não é conhecido (reservas anteriores a criada_em, por exemplo).
+_ATRASO_CONFIRMACAO = '''
+    CAST(round((julianday({0}.data_confirmacao || ' ' || {0}.hora_confirmacao) - julianday({0}.criada_em)) * 1440)
+         AS INTEGER)
+'''
+
+
+def _somar_resumo(linha, sinal):
+    atraso = _ATRASO_CONFIRMACAO.format(linha)
+    return f'''
+        INSERT INTO resumo_diario (data_ord, mesa, garcom, status, reservas, pessoas,
+                                   confirmacoes_medidas, atraso_confirmacao_min)
+        SELECT {linha}.data_ord, {linha}.mesa, coalesce({linha}.garcom, ''), {linha}.status, {sinal}1,
+               {sinal}{linha}.pessoas, {sinal}({atraso} IS NOT NULL), {sinal}coalesce({atraso}, 0)
+        WHERE {linha}.data_ord IS NOT NULL AND {linha}.status IS NOT NULL
+        ON CONFLICT (data_ord, mesa, garcom, status) DO UPDATE SET
+            reservas = reservas + excluded.reservas,
+            pessoas = pessoas + excluded.pessoas,
+            confirmacoes_medidas = confirmacoes_medidas + excluded.confirmacoes_medidas,
+            atraso_confirmacao_min = atraso_confirmacao_min + excluded.atraso_confirmacao_min;
+    '''
+
+
+def _descartar_resumo_vazio(linha):
+    return f'''
+        DELETE FROM resumo_diario
+        WHERE data_ord = {linha}.data_ord AND mesa = {linha}.mesa
+          AND garcom = coalesce({linha}.garcom, '') AND status = {linha}.status AND reservas = 0;
+    '''
+
+
+def reconstruir_resumo_diario(conn):
+    """
+    Recalcula resumo_diario inteiro a partir de reservas. Os triggers mantêm a
+    tabela em dia; isto serve para a carga inicial e para corrigir divergências.
+    Deve rodar dentro de uma transação.
+    """
+    atraso = _ATRASO_CONFIRMACAO.format('reservas')
+    conn.execute('DELETE FROM resumo_diario')
+    cur = conn.execute(f'''
+        INSERT INTO resumo_diario (data_ord, mesa, garcom, status, reservas, pessoas,
+                                   confirmacoes_medidas, atraso_confirmacao_min)
+        SELECT data_ord, mesa, coalesce(garcom, ''), status, COUNT(*), SUM(pessoas),
+               COUNT({atraso}), coalesce(SUM({atraso}), 0)
+        FROM reservas
+        WHERE data_ord IS NOT NULL AND status IS NOT NULL
+        GROUP BY data_ord, mesa, coalesce(garcom, ''), status
+    ''')
+    return cur.rowcount
+
+
+def criar_resumo_diario(conn):
+    if 'criada_em' not in _colunas(conn, 'reservas'):
+        conn.execute('ALTER TABLE reservas ADD COLUMN criada_em TEXT')
+
+    # Uma linha por dia x mesa x garçom x status; garcom '' agrupa as reservas
+    # ainda sem garçom (a chave primária não aceita NULL)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            data_ord INTEGER NOT NULL,
+            mesa INTEGER NOT NULL,
+            garcom TEXT NOT NULL,
+            status TEXT NOT NULL,
+            reservas INTEGER NOT NULL,
+            pessoas INTEGER NOT NULL,
+            confirmacoes_medidas INTEGER NOT NULL,
+            atraso_confirmacao_min INTEGER NOT NULL,
+            PRIMARY KEY (data_ord, mesa, garcom, status)
+        ) WITHOUT ROWID
+    ''')
+
+    for gatilho in ('resumo_diario_insert', 'resumo_diario_delete', 'resumo_diario_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+    conn.execute(f'''
+        CREATE TRIGGER resumo_diario_insert AFTER INSERT ON reservas
+        BEGIN {_somar_resumo('NEW', '+')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER resumo_diario_delete AFTER DELETE ON reservas
+        BEGIN {_somar_resumo('OLD', '-')} {_descartar_resumo_vazio('OLD')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER resumo_diario_update
+        AFTER UPDATE OF data_ord, mesa, garcom, status, pessoas, criada_em, data_confirmacao, hora_confirmacao
+        ON reservas
+        BEGIN {_somar_resumo('OLD', '-')} {_descartar_resumo_vazio('OLD')} {_somar_resumo('NEW', '+')} END
+    ''')
+
+    linhas = reconstruir_resumo_diario(conn)
+    log.info('Resumo diário calculado (%d linhas)', linhas)
+
+
+_COLUNAS_ALTERACAO = (
+    'reserva_id, tipo, status, data_ord, mesa, garcom, hora_min, hora_fim_min, '
+    'data, hora, hora_fim, pessoas, responsavel'
+)
+
+
+def _registrar_alteracao(linha, tipo):
+    return f'''
+        INSERT INTO alteracoes ({_COLUNAS_ALTERACAO})
+        VALUES ({linha}.id, {tipo}, {linha}.status, {linha}.data_ord, {linha}.mesa, {linha}.garcom,
+                {linha}.hora_min, {linha}.hora_fim_min, {linha}.data, {linha}.hora, {linha}.hora_fim,
+                {linha}.pessoas, {linha}.responsavel);
+    '''
+
+
+def criar_registro_alteracoes(conn):
+    # Cada mudança em reservas, feita por qualquer processo, vira uma linha
+    # aqui na mesma transação. Os workers do servidor leem a tabela em ordem
+    # de id para manter o estado em memória (índice, versões, cache, eventos).
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS alteracoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reserva_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            status TEXT,
+            data_ord INTEGER,
+            mesa INTEGER,
+            garcom TEXT,
+            hora_min INTEGER,
+            hora_fim_min INTEGER,
+            data TEXT,
+            hora TEXT,
+            hora_fim TEXT,
+            pessoas INTEGER,
+            responsavel TEXT
+        )
+    ''')
+
+    for gatilho in ('alteracoes_insert', 'alteracoes_delete', 'alteracoes_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+    conn.execute(f'''
+        CREATE TRIGGER alteracoes_insert AFTER INSERT ON reservas
+        BEGIN {_registrar_alteracao('NEW', "'criada'")} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER alteracoes_delete AFTER DELETE ON reservas
+        BEGIN {_registrar_alteracao('OLD', "'cancelada'")} END
+    ''')
+    tipo_update = '''
+        CASE WHEN NEW.status IS NOT OLD.status AND NEW.status IN ('confirmada', 'finalizada')
+             THEN NEW.status ELSE 'alterada' END
+    '''
+    # Se a reserva mudou de dia, mesa ou garçom, a posição antiga também é
+    # registrada ('movida') para que o que dependia dela seja invalidado
+    conn.execute(f'''
+        CREATE TRIGGER alteracoes_update AFTER UPDATE ON reservas
+        BEGIN
+            INSERT INTO alteracoes ({_COLUNAS_ALTERACAO})
+            SELECT OLD.id, 'movida', OLD.status, OLD.data_ord, OLD.mesa, OLD.garcom,
+                   OLD.hora_min, OLD.hora_fim_min, OLD.data, OLD.hora, OLD.hora_fim,
+                   OLD.pessoas, OLD.responsavel
+            WHERE OLD.data_ord IS NOT NEW.data_ord OR OLD.mesa IS NOT NEW.mesa
+               OR (OLD.garcom IS NOT NULL AND OLD.garcom IS NOT NEW.garcom);
+            {_registrar_alteracao('NEW', tipo_update)}
+        END
+    ''')
+
+
+MESAS_INICIAIS = 20
+CAPACIDADE_INICIAL = 4
+
+
+def criar_cadastro_mesas(conn):
+    # Substitui o intervalo fixo 1-20 de antes. As mesas existentes entram com
+    # capacidade suficiente para as reservas já feitas nelas.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mesas (
+            id INTEGER PRIMARY KEY,
+            capacidade INTEGER NOT NULL CHECK (capacidade > 0),
+            zona TEXT NOT NULL DEFAULT 'salao',
+            combinavel INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        WITH RECURSIVE numeros(id) AS (SELECT 1 UNION ALL SELECT id + 1 FROM numeros WHERE id < ?)
+        INSERT OR IGNORE INTO mesas (id, capacidade)
+        SELECT id, max(?, coalesce((SELECT max(pessoas) FROM reservas WHERE mesa = numeros.id), 0))
+        FROM numeros
+    ''', (MESAS_INICIAIS, CAPACIDADE_INICIAL))
+
+    # Mudanças no cadastro também passam por alteracoes (tipo 'mesa', sem
+    # reserva) para que todos os workers recarreguem o catálogo
+    for gatilho, evento, linha in (('mesas_insert', 'INSERT', 'NEW'), ('mesas_update', 'UPDATE', 'NEW'),
+                                   ('mesas_delete', 'DELETE', 'OLD')):
+        conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+        conn.execute(f'''
+            CREATE TRIGGER {gatilho} AFTER {evento} ON mesas
+            BEGIN INSERT INTO alteracoes (reserva_id, tipo, mesa) VALUES (0, 'mesa', {linha}.id); END
+        ''')
+
+
+def guardar_sobreposicao_entre_dias(conn):
+    # A guarda de adicionar_horarios_inteiros só comparava reservas do mesmo
+    # dia. As da véspera e as do dia seguinte são deslocadas para o dia de NEW
+    # (1440 minutos por dia de diferença): uma reserva de 23:30 às 00:30
+    # conflita com uma às 00:00 do dia seguinte, e vice-versa
+    _recriar_guarda_sobreposicao(conn, '''
+        r.mesa = NEW.mesa AND r.data_ord BETWEEN NEW.data_ord - 1 AND NEW.data_ord + 1
+        AND r.hora_min + (r.data_ord - NEW.data_ord) * 1440 < NEW.hora_fim_min
+        AND r.hora_fim_min + (r.data_ord - NEW.data_ord) * 1440 > NEW.hora_min
+    ''', 'status, mesa, data_ord, hora_min, hora_fim_min')
+
+
+def corrigir_horas_sem_zero(conn):
+    # Bancos migrados antes de _padronizar_horas ficaram com hora_fim NULL e
+    # hora_min errado nas reservas gravadas como "9:30". A guarda sai durante
+    # o reparo: os minutos corrigidos podem revelar conflitos antigos, que não
+    # devem impedir a migração
+    conn.execute('DROP TRIGGER IF EXISTS reservas_sobreposicao_insert')
+    conn.execute('DROP TRIGGER IF EXISTS reservas_sobreposicao_update')
+    _padronizar_horas(conn)
+    conn.execute('''
+        UPDATE reservas SET hora_fim = strftime('%H:%M', hora, '+1 hour')
+        WHERE hora_fim IS NULL AND hora IS NOT NULL
+    ''')
+    inicio, fim = _intervalo('reservas')
+    cur = conn.execute(f'''
+        UPDATE reservas SET hora_min = {inicio}, hora_fim_min = {fim}
+        WHERE hora_min IS NOT {inicio} OR hora_fim_min IS NOT {fim}
+    ''')
+    if cur.rowcount > 0:
+        log.info('Minutos recalculados para %d reservas', cur.rowcount)
+    guardar_sobreposicao_entre_dias(conn)
+
+
+# Lista ordenada: a posição (1, 2, ...) é a versão gravada em PRAGMA user_version
+# depois que a migração correspondente é aplicada. Nunca reordene nem remova itens.
+MIGRACOES = [
+    criar_tabela_reservas,
+    adicionar_colunas_horario,
+    criar_indices,
+    criar_guarda_sobreposicao,
+    adicionar_horarios_inteiros,
+    ordenar_indice_garcom,
+    criar_resumo_diario,
+    criar_registro_alteracoes,
+    criar_cadastro_mesas,
+    guardar_sobreposicao_entre_dias,
+    corrigir_horas_sem_zero,
+]
+
+
+def versao_atual(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrar(conn):
+    """
+    Aplica, em ordem, as migrações ainda não registradas no banco.
+
+    Cada migração roda na própria transação junto com a atualização de
+    user_version, então uma falha no meio não deixa o esquema pela metade.
+    """
+    if versao_atual(conn) >= len(MIGRACOES):
+        return 0
+
+    aplicadas = 0
+    for versao, migracao in enumerate(MIGRACOES, start=1):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if versao_atual(conn) >= versao:
+                conn.rollback()
+                continue
+            migracao(conn)
+            conn.execute(f'PRAGMA user_version = {versao}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas += 1
+        log.info('Migração %d aplicada: %s', versao, migracao.__name__, extra={'versao': versao})
+    return aplicadas
+
+
+if __name__ == '__main__':
+    registro.configurar()
+    caminho = sys.argv[1] if len(sys.argv) > 1 else banco.DB_PATH
+    conn = sqlite3.connect(caminho)
+    try:
+        aplicadas = migrar(conn)
+        print(f"Banco {caminho} na versão {versao_atual(conn)} ({aplicadas} migrações aplicadas)")
+    finally:
+        conn.close()
@@ -0,0 +1,66 @@
+import consultas
+import horarios
+
+
+# Reservas que começam perto da meia-noite ocupam o começo do dia seguinte
+MINUTOS = 2 * horarios.MINUTOS_DIA
+
+
+def _espalhar(bits, duracao):
+    """
+    Bit s do resultado ligado se algum bit de [s, s + duracao) estiver ligado
+    em bits, com log2(duracao) deslocamentos.
+    """
+    coberto = 1
+    while coberto < duracao:
+        passo = min(coberto, duracao - coberto)
+        bits |= bits >> passo
+        coberto += passo
+    return bits
+
+
+class OcupacaoDia:
+    """
+    Ocupação das mesas em um dia, para a busca de /disponibilidade.
+
+    Cada mesa é um inteiro usado como mapa de bits: o bit m ligado indica que
+    a mesa está ocupada (reservada ou confirmada) no minuto m do dia, contado
+    a partir da meia-noite (ver horarios.py). Saber em quais inícios cabe uma
+    reserva de DURACAO_RESERVA minutos vira um punhado de operações sobre
+    esse inteiro, para todos os horários do dia de uma vez.
+    """
+
+    def __init__(self, data_ord, mesas):
+        self.data_ord = data_ord
+        self._ocupados = dict.fromkeys(mesas, 0)
+
+    @classmethod
+    def carregar(cls, conn, data_ord, mesas):
+        """Lê em uma consulta as reservas do dia e as dos dias vizinhos que o alcançam."""
+        ocupacao = cls(data_ord, mesas)
+        for mesa, dia, inicio, fim in conn.execute(consultas.SQL_OCUPACAO_PERIODO, (data_ord - 1, data_ord + 1)):
+            deslocamento = (dia - data_ord) * horarios.MINUTOS_DIA
+            ocupacao.ocupar(mesa, inicio + deslocamento, fim + deslocamento)
+        return ocupacao
+
+    def ocupar(self, mesa, inicio, fim):
+        if mesa not in self._ocupados:
+            return
+        inicio, fim = max(inicio, 0), min(fim, MINUTOS)
+        if inicio < fim:
+            self._ocupados[mesa] |= ((1 << (fim - inicio)) - 1) << inicio
+
+    def livres(self, inicios, duracao=horarios.DURACAO_RESERVA):
+        """
+        Devolve {mesa: [inícios livres]} só com as mesas que têm algum dos
+        inícios (minutos do dia) livre por duracao minutos.
+        """
+        candidatos = 0
+        for inicio in inicios:
+            candidatos |= 1 << inicio
+        resultado = {}
+        for mesa, ocupados in self._ocupados.items():
+            livres = candidatos & ~_espalhar(ocupados, duracao)
+            if livres:
+                resultado[mesa] = [inicio for inicio in inicios if livres >> inicio & 1]
+        return resultado
@@ -0,0 +1,254 @@
+"""
+Perfis de requisições individuais, sob demanda.
+
+Uma requisição é perfilada quando traz o cabeçalho X-Perfil (valor
+"cprofile", o padrão, ou "amostragem") junto com X-Perfil-Token igual a
+RESERVAS_PERFIL_TOKEN, ou quando é sorteada pela taxa RESERVAS_PERFIL_TAXA
+(0 a 1, padrão 0; o modo é RESERVAS_PERFIL_MODO). Sem RESERVAS_PERFIL_TOKEN
+definido, o cabeçalho é ignorado: um cliente qualquer não consegue ligar o
+perfil (que custa CPU e disco) nem ler os perfis gravados. O perfil guarda:
+
+- cprofile: as funções chamadas, com o tempo de cada uma (cProfile), e o
+  arquivo .prof correspondente, que abre com pstats, snakeviz etc.
+- amostragem: as pilhas da thread da requisição lidas a cada
+  RESERVAS_PERFIL_INTERVALO segundos, no formato "folded" dos flame graphs.
+  Pesa menos que o cProfile em rotas com muitas chamadas pequenas.
+
+Nos dois modos entram também os comandos SQL executados pela requisição, com
+o tempo de cada um (medidos pelo cursor de metricas.py).
+
+Os perfis ficam em RESERVAS_PERFIS_DIR (os RESERVAS_PERFIS_MANTIDOS mais
+recentes) e são lidos de lá por /debug/perfis (com o mesmo X-Perfil-Token),
+de qualquer worker e mesmo depois de reiniciar o servidor. Sem cabeçalho e com a taxa em 0, o custo por
+requisição é a leitura de um cabeçalho; por comando SQL, a leitura de um
+inteiro.
+"""
+import collections
+import cProfile
+import datetime
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+PERFIS_DIR = os.environ.get('RESERVAS_PERFIS_DIR', os.path.join(tempfile.gettempdir(), 'reservas-perfis'))
+PERFIS_MANTIDOS = int(os.environ.get('RESERVAS_PERFIS_MANTIDOS', '200'))
+PERFIL_TAXA = float(os.environ.get('RESERVAS_PERFIL_TAXA', '0'))
+PERFIL_MODO = os.environ.get('RESERVAS_PERFIL_MODO', 'cprofile')
+PERFIL_INTERVALO = float(os.environ.get('RESERVAS_PERFIL_INTERVALO', '0.002'))
+PERFIL_TOKEN = os.environ.get('RESERVAS_PERFIL_TOKEN', '')
+CABECALHO = 'X-Perfil'
+CABECALHO_TOKEN = 'X-Perfil-Token'
+MODOS = ('cprofile', 'amostragem')
+FUNCOES_LISTADAS = 40
+
+# Perfis em andamento neste processo; o cursor só procura o da thread quando > 0
+ativos = 0
+_local = threading.local()
+_trava = threading.Lock()
+
+
+def autorizado(cabecalhos):
+    """Se a requisição traz o token de RESERVAS_PERFIL_TOKEN (sem token definido, nenhuma traz)."""
+    enviado = cabecalhos.get(CABECALHO_TOKEN)
+    return bool(PERFIL_TOKEN) and enviado is not None and hmac.compare_digest(enviado.encode(), PERFIL_TOKEN.encode())
+
+
+def modo_pedido(cabecalhos, taxa=PERFIL_TAXA):
+    """Modo de perfil pedido para a requisição, ou None."""
+    valor = cabecalhos.get(CABECALHO)
+    if valor is not None and autorizado(cabecalhos):
+        valor = valor.strip().lower()
+        return valor if valor in MODOS else MODOS[0]
+    if taxa and random.random() < taxa:
+        return PERFIL_MODO
+    return None
+
+
+def registrar_sql(sql, fase, segundos):
+    perfil = getattr(_local, 'perfil', None)
+    if perfil is not None:
+        perfil.sql.append((sql, fase, segundos))
+
+
+class Amostrador:
+    """
+    Uma thread que, enquanto houver requisições no modo amostragem, lê a
+    pilha de cada uma a cada intervalo e conta as pilhas iguais.
+    """
+
+    def __init__(self, intervalo=PERFIL_INTERVALO):
+        self.intervalo = intervalo
+        self._contagens = {}
+        self._trava = threading.Lock()
+        self._thread = None
+
+    def seguir(self, thread_id):
+        with self._trava:
+            self._contagens[thread_id] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='amostrador', daemon=True)
+                self._thread.start()
+
+    def soltar(self, thread_id):
+        with self._trava:
+            return self._contagens.pop(thread_id, collections.Counter())
+
+    def _executar(self):
+        while True:
+            time.sleep(self.intervalo)
+            with self._trava:
+                if not self._contagens:
+                    self._thread = None
+                    return
+                quadros = sys._current_frames()
+                for thread_id, contagem in self._contagens.items():
+                    quadro = quadros.get(thread_id)
+                    if quadro is not None:
+                        contagem[_pilha(quadro)] += 1
+
+
+def _pilha(quadro):
+    nomes = []
+    while quadro is not None:
+        codigo = quadro.f_code
+        nomes.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+        quadro = quadro.f_back
+    return ';'.join(reversed(nomes))
+
+
+amostrador = Amostrador()
+
+
+class Perfil:
+    def __init__(self, modo, metodo, rota, url):
+        self.id = f'{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.modo = modo
+        self.metodo = metodo
+        self.rota = rota
+        self.url = url
+        self.status = None
+        self.sql = []
+        self.amostras = None
+        self._perfilador = None
+        self._thread_id = threading.get_ident()
+        self._inicio = None
+        self._duracao = None
+
+    def iniciar(self):
+        global ativos
+        if self.modo == 'cprofile':
+            self._perfilador = cProfile.Profile()
+            try:
+                self._perfilador.enable()
+            except ValueError:
+                # A partir do Python 3.12 só um cProfile pode estar ligado por
+                # processo; com outro em andamento fica só o SQL
+                self._perfilador = None
+        else:
+            amostrador.seguir(self._thread_id)
+        with _trava:
+            ativos += 1
+        _local.perfil = self
+        self._inicio = time.perf_counter()
+
+    def encerrar(self):
+        global ativos
+        self._duracao = time.perf_counter() - self._inicio
+        _local.perfil = None
+        with _trava:
+            ativos -= 1
+        if self._perfilador is not None:
+            self._perfilador.disable()
+        if self.modo == 'amostragem':
+            self.amostras = amostrador.soltar(self._thread_id)
+
+    def gravar(self, diretorio=PERFIS_DIR):
+        """Grava <id>.json (e <id>.prof no modo cprofile) em diretorio."""
+        os.makedirs(diretorio, exist_ok=True)
+        sql_total = sum(segundos for _, _, segundos in self.sql)
+        dados = {
+            'id': self.id,
+            'modo': self.modo,
+            'metodo': self.metodo,
+            'rota': self.rota,
+            'url': self.url,
+            'status': self.status,
+            'processo': os.getpid(),
+            'duracao_ms': round(self._duracao * 1000, 3),
+            'sql_total_ms': round(sql_total * 1000, 3),
+            'sql': [
+                {'sql': ' '.join(sql.split()), 'fase': fase, 'ms': round(segundos * 1000, 3)}
+                for sql, fase, segundos in self.sql
+            ],
+        }
+        if self._perfilador is not None:
+            self._perfilador.dump_stats(os.path.join(diretorio, f'{self.id}.prof'))
+            saida = io.StringIO()
+            pstats.Stats(self._perfilador, stream=saida).sort_stats('cumulative').print_stats(FUNCOES_LISTADAS)
+            dados['funcoes'] = saida.getvalue()
+        if self.amostras is not None:
+            dados['intervalo_amostragem'] = amostrador.intervalo
+            dados['amostras'] = [f'{pilha} {contagem}' for pilha, contagem in self.amostras.most_common()]
+        temporario = os.path.join(diretorio, f'{self.id}.json.tmp')
+        with open(temporario, 'w') as f:
+            json.dump(dados, f, indent=1)
+        os.replace(temporario, os.path.join(diretorio, f'{self.id}.json'))
+        _descartar_antigos(diretorio)
+
+
+def _descartar_antigos(diretorio, mantidos=PERFIS_MANTIDOS):
+    perfis = sorted(nome for nome in os.listdir(diretorio) if nome.endswith('.json'))
+    for nome in perfis[:-mantidos] if mantidos else ():
+        for extensao in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(diretorio, nome[:-len('.json')] + extensao))
+            except FileNotFoundError:
+                pass
+
+
+_ID_VALIDO = re.compile(r'^[\w-]+$')
+
+
+def caminho(perfil_id, extensao, diretorio=PERFIS_DIR):
+    """Arquivo de um perfil gravado, ou None se o id não existir."""
+    if not _ID_VALIDO.match(perfil_id):
+        return None
+    arquivo = os.path.join(diretorio, perfil_id + extensao)
+    return arquivo if os.path.exists(arquivo) else None
+
+
+def listar(diretorio=PERFIS_DIR, limite=100):
+    """Resumo dos perfis gravados, do mais recente para o mais antigo."""
+    if not os.path.isdir(diretorio):
+        return []
+    resumo = []
+    for nome in sorted((nome for nome in os.listdir(diretorio) if nome.endswith('.json')), reverse=True)[:limite]:
+        try:
+            with open(os.path.join(diretorio, nome)) as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            continue
+        item = {chave: dados.get(chave) for chave in (
+            'id', 'modo', 'metodo', 'url', 'status', 'duracao_ms', 'sql_total_ms',
+        )}
+        item['comandos_sql'] = len(dados.get('sql', ()))
+        resumo.append(item)
+    return resumo
+
+
+def ler(perfil_id, diretorio=PERFIS_DIR):
+    arquivo = caminho(perfil_id, '.json', diretorio)
+    if arquivo is None:
+        return None
+    with open(arquivo) as f:
+        return json.load(f)
@@ -0,0 +1,93 @@
+"""
+Logs do servidor: uma linha JSON por evento, com nível, origem e os campos
+passados em extra=.
+
+A thread da requisição só coloca o registro em uma fila; formatar e escrever
+em stderr fica com a thread do QueueListener. O nível vem de
+RESERVAS_LOG_NIVEL (padrão INFO): com DEBUG desligado, log.debug('...', x)
+para na checagem de nível, sem montar a mensagem.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+
+LOG_NIVEL = os.environ.get('RESERVAS_LOG_NIVEL', 'INFO').upper()
+RAIZ = 'reservas'
+
+# Atributos de todo LogRecord; o que sobrar veio de extra=
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def obter(nome):
+    """Logger de um módulo, abaixo de 'reservas' (obter('banco'))."""
+    return logging.getLogger(f'{RAIZ}.{nome}')
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record):
+        evento = {
+            'hora': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'origem': record.name,
+            'processo': record.process,
+            'mensagem': record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                evento[chave] = valor
+        if record.exc_info:
+            evento['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class _HandlerFila(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # O QueueHandler padrão formata a mensagem e o traceback aqui, na
+        # thread de quem registrou; deixamos isso para o listener
+        return record
+
+
+class _Registro:
+    def __init__(self):
+        self.pid = None
+        self.listener = None
+        self.handler = None
+
+    def configurar(self, nivel=LOG_NIVEL, destino=None):
+        """
+        Liga o handler em fila no logger 'reservas'. Pode ser chamado de novo
+        depois de um fork: o processo filho ganha a própria fila e thread.
+        """
+        if self.pid == os.getpid():
+            return
+        raiz = logging.getLogger(RAIZ)
+        if self.handler is not None:
+            raiz.removeHandler(self.handler)
+        saida = logging.StreamHandler(destino or sys.stderr)
+        saida.setFormatter(FormatadorJSON())
+        fila = queue.SimpleQueue()
+        self.handler = _HandlerFila(fila)
+        self.listener = logging.handlers.QueueListener(fila, saida)
+        raiz.addHandler(self.handler)
+        raiz.setLevel(nivel)
+        raiz.propagate = False
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def encerrar(self):
+        """Escreve o que ainda está na fila e para a thread."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+        self.pid = None
+
+
+_registro = _Registro()
+configurar = _registro.configurar
+encerrar = _registro.encerrar
+atexit.register(encerrar)
@@ -0,0 +1,111 @@
+"""
+Leitura e gravação de reservas individuais pelas rotas de escrita (criar,
+cancelar, confirmar, finalizar, uma ou em lote) e pela importação em lote,
+sobre as conexões do pool de banco.py. As listagens e relatórios não passam
+por aqui: suas consultas ficam em consultas.py e as linhas vão direto do
+cursor para o JSON (ver transmitir_json em servidor.py).
+
+Os comandos SQL são constantes: o sqlite3 guarda o comando preparado de cada
+texto por conexão e os reaproveita a cada chamada. As linhas lidas viram
+Reserva, com as colunas como atributos.
+"""
+import collections
+import datetime
+import sqlite3
+
+
+Reserva = collections.namedtuple(
+    'Reserva',
+    'id data hora mesa pessoas responsavel status garcom hora_fim data_confirmacao hora_confirmacao '
+    'data_ord hora_min hora_fim_min criada_em'
+)
+
+_COLUNAS = ', '.join(Reserva._fields)
+
+SQL_RESERVA = f'SELECT {_COLUNAS} FROM reservas WHERE id = ?'
+SQL_RESERVA_COM_STATUS = f'SELECT {_COLUNAS} FROM reservas WHERE id = ? AND status = ?'
+SQL_INSERIR_RESERVA = '''
+    INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, hora_fim,
+                          data_ord, hora_min, hora_fim_min, criada_em)
+    VALUES (?, ?, ?, ?, ?, 'reservada', ?, ?, ?, ?, ?)
+'''
+SQL_EXCLUIR_RESERVA = 'DELETE FROM reservas WHERE id = ?'
+SQL_CONFIRMAR_RESERVA = '''
+    UPDATE reservas SET status = 'confirmada', garcom = ?, data_confirmacao = ?, hora_confirmacao = ?
+    WHERE id = ? AND status = 'reservada'
+'''
+SQL_FINALIZAR_RESERVA = "UPDATE reservas SET status = 'finalizada' WHERE id = ? AND status = 'confirmada'"
+
+
+def _reserva(linha):
+    return Reserva._make(linha) if linha is not None else None
+
+
+def buscar(con, reserva_id, status=None):
+    """A reserva com esse id (e status, se informado), ou None."""
+    if status is None:
+        return _reserva(con.execute(SQL_RESERVA, (reserva_id,)).fetchone())
+    return _reserva(con.execute(SQL_RESERVA_COM_STATUS, (reserva_id, status)).fetchone())
+
+
+def buscar_varias(con, ids, status):
+    """{id: Reserva} das reservas de ids que estão nesse status."""
+    marcadores = ', '.join('?' * len(ids))
+    cursor = con.execute(f'SELECT {_COLUNAS} FROM reservas WHERE id IN ({marcadores}) AND status = ?', (*ids, status))
+    return {reserva.id: reserva for reserva in map(Reserva._make, cursor)}
+
+
+def inserir(con, data, hora, mesa, pessoas, responsavel, hora_fim, data_ord, hora_min, hora_fim_min, agora=None):
+    """Grava uma reserva nova (status 'reservada') e devolve o id."""
+    agora = agora or datetime.datetime.now()
+    return con.execute(SQL_INSERIR_RESERVA, (
+        data, hora, mesa, pessoas, responsavel, hora_fim, data_ord, hora_min, hora_fim_min,
+        agora.strftime('%Y-%m-%d %H:%M'),
+    )).lastrowid
+
+
+def excluir(con, reserva_id):
+    con.execute(SQL_EXCLUIR_RESERVA, (reserva_id,))
+
+
+def confirmar(con, ids, garcom, agora=None):
+    """
+    Confirma as reservas de ids ainda reservadas, com o garçom e a hora da
+    confirmação, e devolve quantas mudaram.
+
+    Raises:
+        sqlite3.IntegrityError: 'conflito_horario', se a mesa já estiver
+            confirmada para outra reserva no mesmo horário
+    """
+    agora = agora or datetime.datetime.now()
+    data_confirmacao, hora_confirmacao = agora.strftime('%Y-%m-%d'), agora.strftime('%H:%M')
+    return con.executemany(
+        SQL_CONFIRMAR_RESERVA, ((garcom, data_confirmacao, hora_confirmacao, reserva_id) for reserva_id in ids)
+    ).rowcount
+
+
+def confirmar_separadas(con, ids, garcom, agora=None):
+    """
+    Como confirmar, mas cada reserva em um savepoint próprio: a que o trigger
+    recusar por conflito de horário não desfaz as outras. Devolve os ids
+    recusados.
+    """
+    agora = agora or datetime.datetime.now()
+    recusadas = []
+    for reserva_id in ids:
+        con.execute('SAVEPOINT confirmacao')
+        try:
+            confirmar(con, [reserva_id], garcom, agora)
+        except sqlite3.IntegrityError as e:
+            if 'conflito_horario' not in str(e):
+                raise
+            con.execute('ROLLBACK TO confirmacao')
+            recusadas.append(reserva_id)
+        finally:
+            con.execute('RELEASE confirmacao')
+    return recusadas
+
+
+def finalizar(con, ids):
+    """Finaliza as reservas de ids que estão confirmadas e devolve quantas mudaram."""
+    return con.executemany(SQL_FINALIZAR_RESERVA, ((reserva_id,) for reserva_id in ids)).rowcount
@@ -0,0 +1,125 @@
+"""
+Modo de produção do servidor: python -m servidor serve --workers N --threads M
+
+Com o uvicorn instalado (pip install uvicorn), usa a variante ASGI
+(servidor_asgi.py) com N processos, cada um com M threads para o acesso ao
+banco; os clientes do /eventos não ocupam threads.
+
+Sem o uvicorn, ou com --wsgi, usa o gunicorn (Linux/macOS) com N processos,
+cada um com M threads, ou o waitress (também no Windows), que roda um único
+processo com M threads. Os dois são dependências opcionais: pip install
+gunicorn (ou waitress). Nesse caso cada cliente do /eventos prende uma thread
+enquanto estiver conectado, e servidor.py limita quantos cada processo aceita
+(EVENTOS_MAXIMO).
+
+Cada worker carrega o próprio estado em memória (índice, versões, cache e
+eventos) e o mantém em dia pela tabela alteracoes (ver sincronizacao.py), de
+modo que escritas feitas em um worker valem na hora para todos os outros.
+"""
+import os
+import signal
+
+import registro
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+ENCERRAMENTO_ESPERA = 30
+
+log = registro.obter('servico')
+
+
+def _encadear_sinal(sinal, funcao):
+    anterior = signal.getsignal(sinal)
+
+    def tratar(numero, quadro):
+        funcao()
+        if callable(anterior):
+            anterior(numero, quadro)
+
+    signal.signal(sinal, tratar)
+
+
+if BaseApplication is not None:
+    class _AplicacaoGunicorn(BaseApplication):
+        def __init__(self, app, opcoes):
+            self.app = app
+            self.opcoes = opcoes
+            super().__init__()
+
+        def load_config(self):
+            for chave, valor in self.opcoes.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return self.app
+
+
+def servir_gunicorn(app, host, porta, workers, threads, iniciar_worker, encerrar_streams, encerrar_worker):
+    def post_worker_init(worker):
+        iniciar_worker()
+        # O gunicorn espera as requisições em andamento terminarem antes de
+        # sair; os streams do /eventos só terminam se forem encerrados aqui
+        _encadear_sinal(signal.SIGTERM, encerrar_streams)
+        _encadear_sinal(signal.SIGQUIT, encerrar_streams)
+
+    _AplicacaoGunicorn(app, {
+        'bind': f'{host}:{porta}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'graceful_timeout': ENCERRAMENTO_ESPERA,
+        'post_worker_init': post_worker_init,
+        'worker_exit': lambda servidor, worker: encerrar_worker(),
+    }).run()
+
+
+def servir_waitress(app, host, porta, threads, iniciar_worker, encerrar_streams, encerrar_worker):
+    def parar(numero, quadro):
+        encerrar_streams()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGINT, parar)
+    signal.signal(signal.SIGTERM, parar)
+    iniciar_worker()
+    try:
+        # send_bytes=1: cada evento do /eventos sai na hora, sem esperar encher o buffer
+        waitress.serve(app, host=host, port=porta, threads=threads, send_bytes=1)
+    finally:
+        encerrar_worker()
+
+
+def servir_asgi(host, porta, workers, threads):
+    if uvicorn is None:
+        raise SystemExit('Modo --asgi precisa do uvicorn: pip install uvicorn')
+    # Os workers importam servidor_asgi do zero e leem o tamanho do executor do ambiente
+    os.environ['RESERVAS_ASGI_THREADS'] = str(threads)
+    uvicorn.run('servidor_asgi:app', host=host, port=porta, workers=workers, lifespan='on',
+                timeout_graceful_shutdown=ENCERRAMENTO_ESPERA)
+
+
+def servir(app, host, porta, workers, threads, iniciar_worker, encerrar_streams, encerrar_worker):
+    if BaseApplication is not None:
+        servir_gunicorn(app, host, porta, workers, threads, iniciar_worker, encerrar_streams, encerrar_worker)
+    elif waitress is not None:
+        if workers > 1:
+            log.warning('waitress roda um único processo; --workers %d ignorado (use --threads)', workers)
+        servir_waitress(app, host, porta, threads, iniciar_worker, encerrar_streams, encerrar_worker)
+    else:
+        raise SystemExit(
+            'Modo serve precisa do uvicorn (pip install uvicorn) ou de um servidor WSGI: '
+            'pip install gunicorn (Linux/macOS) ou pip install waitress'
+        )
@@ -1,22 +1,85 @@
-from flask import Flask, request, jsonify, Response, render_template
+from flask import Flask, request, jsonify, Response, render_template, g, make_response, has_request_context, send_file
+from flask.json.provider import DefaultJSONProvider
 import sqlite3
 from collections import OrderedDict
 import datetime
 import json
+import os
+import shutil
+import tempfile
+import time
+import argparse
+import base64
+import functools
+import textwrap
+import click
 from flask_cors import CORS
+import banco
+import migracoes
+import consultas
+import intervalos
+import horarios
+import eventos
+import versoes
+import cache
+import sincronizacao
+import servico
+import importacao
+import ocupacao
+import catalogo
+import metricas
+import perfilador
+import registro
+import repositorio
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 CORS(app)
 
-DB_PATH = 'reservas.db'
+registro.configurar()
+log = registro.obter('servidor')
+
+def rota_atual():
+    return request.url_rule.rule if request.url_rule else 'nao_encontrada'
+
+def medir_serializacao(inicio):
+    metricas.coletor.observar_serializacao(rota_atual(), time.perf_counter() - inicio)
+
+def serializar_json(obj, **opcoes):
+    inicio = time.perf_counter()
+    texto = json.dumps(obj, **opcoes)
+    medir_serializacao(inicio)
+    return texto
+
+class ProvedorJSON(DefaultJSONProvider):
+    # As respostas de jsonify também entram no tempo de serialização
+    def dumps(self, obj, **opcoes):
+        inicio = time.perf_counter()
+        texto = super().dumps(obj, **opcoes)
+        if has_request_context():
+            medir_serializacao(inicio)
+        return texto
+
+app.json = ProvedorJSON(app)
+
+DB_PATH = banco.DB_PATH
+TAMANHO_LOTE = 500
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+MAXIMO_RESERVAS_LOTE = 50000
+MAXIMO_IDS_LOTE = 500
+PASSO_DISPONIBILIDADE = 15
+PROXIMOS_HORARIOS = 4
+EVENTOS_PING = 15
+EVENTOS_RECONEXAO_MS = 2000
+EVENTOS_RECONEXAO_LOTADO_MS = 10000
+# Clientes do /eventos por processo (0 = sem limite). No WSGI cada um ocupa
+# uma thread enquanto estiver conectado; serve ajusta o padrão a --threads
+EVENTOS_MAXIMO = int(os.environ.get('RESERVAS_EVENTOS_MAXIMO', '0'))
 
 def calcular_hora_fim(hora_inicio):
     try:
-        hora_obj = datetime.datetime.strptime(hora_inicio, '%H:%M').time()
-        hora_datetime = datetime.datetime.combine(datetime.date.today(), hora_obj)
-        hora_fim = hora_datetime + datetime.timedelta(hours=1)
-        return hora_fim.strftime('%H:%M')
-    except:
+        return horarios.formatar(horarios.para_minutos(hora_inicio) + horarios.DURACAO_RESERVA)
+    except (ValueError, TypeError, AttributeError):
         return None
 
 def formatar_horario_completo(hora_inicio, hora_fim=None):
@@ -30,80 +93,162 @@ def formatar_horario_completo(hora_inicio, hora_fim=None):
         return f"{hora_inicio} - {hora_fim}"
     return hora_inicio
 
-def formatar_dados_com_horario(reservas):
-    reservas_formatadas = []
-    for reserva in reservas:
-        reserva_dict = dict(reserva) if hasattr(reserva, 'keys') else reserva
-        
-        if 'hora' in reserva_dict and 'hora_fim' in reserva_dict:
-            reserva_dict['hora_inicio'] = reserva_dict['hora']
-            reserva_dict['hora'] = formatar_horario_completo(
-                reserva_dict['hora'], 
-                reserva_dict['hora_fim']
-            )
-        elif 'hora' in reserva_dict:
-            reserva_dict['hora_inicio'] = reserva_dict['hora']
-            hora_fim = calcular_hora_fim(reserva_dict['hora'])
-            reserva_dict['hora'] = formatar_horario_completo(reserva_dict['hora'], hora_fim)
-            if hora_fim:
-                reserva_dict['hora_fim'] = hora_fim
-        
-        reservas_formatadas.append(reserva_dict)
-    return reservas_formatadas
-
-def conectar():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  
-    criar_tabela(conn)
-    return conn
-
-def criar_tabela(conn):
-    cursor = conn.cursor()
+def formatar_reserva_com_horario(reserva):
+    reserva_dict = dict(reserva) if hasattr(reserva, 'keys') else reserva
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reservas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            hora TEXT NOT NULL,
-            mesa INTEGER NOT NULL,
-            pessoas INTEGER NOT NULL,
-            responsavel TEXT NOT NULL,
-            status TEXT DEFAULT 'reservada',
-            garcom TEXT,
-            hora_fim TEXT,
-            data_confirmacao TEXT,
-            hora_confirmacao TEXT
+    if 'hora' in reserva_dict and 'hora_fim' in reserva_dict:
+        reserva_dict['hora_inicio'] = reserva_dict['hora']
+        reserva_dict['hora'] = formatar_horario_completo(
+            reserva_dict['hora'], 
+            reserva_dict['hora_fim']
         )
-    ''')
-    
-    cursor.execute("PRAGMA table_info(reservas)")
-    colunas_existentes = [coluna[1] for coluna in cursor.fetchall()]
-    
-    if 'hora_fim' not in colunas_existentes:
-        cursor.execute('ALTER TABLE reservas ADD COLUMN hora_fim TEXT')
-        print("[INFO] Coluna 'hora_fim' adicionada à tabela")
-        
-    if 'data_confirmacao' not in colunas_existentes:
-        cursor.execute('ALTER TABLE reservas ADD COLUMN data_confirmacao TEXT')
-        print("[INFO] Coluna 'data_confirmacao' adicionada à tabela")
-        
-    if 'hora_confirmacao' not in colunas_existentes:
-        cursor.execute('ALTER TABLE reservas ADD COLUMN hora_confirmacao TEXT')
-        print("[INFO] Coluna 'hora_confirmacao' adicionada à tabela")
-    
-    cursor.execute('''
-        SELECT id, hora FROM reservas 
-        WHERE hora_fim IS NULL AND hora IS NOT NULL
-    ''')
-    reservas_sem_fim = cursor.fetchall()
-    
-    for reserva in reservas_sem_fim:
-        hora_fim = calcular_hora_fim(reserva[1])
+    elif 'hora' in reserva_dict:
+        reserva_dict['hora_inicio'] = reserva_dict['hora']
+        hora_fim = calcular_hora_fim(reserva_dict['hora'])
+        reserva_dict['hora'] = formatar_horario_completo(reserva_dict['hora'], hora_fim)
         if hora_fim:
-            cursor.execute('UPDATE reservas SET hora_fim = ? WHERE id = ?', (hora_fim, reserva[0]))
-            print(f"[INFO] Hora fim calculada para reserva ID {reserva[0]}: {reserva[1]} -> {hora_fim}")
+            reserva_dict['hora_fim'] = hora_fim
     
-    conn.commit()
+    return reserva_dict
+
+def formatar_dados_com_horario(reservas):
+    return [formatar_reserva_com_horario(reserva) for reserva in reservas]
+
+def conectar():
+    if 'con' not in g:
+        g.con = pool.obter()
+    return g.con
+
+@app.teardown_appcontext
+def liberar_conexao(exc):
+    con = g.pop('con', None)
+    if con is not None:
+        pool.liberar(con)
+
+indice_intervalos = intervalos.IndiceIntervalos()
+catalogo_mesas = catalogo.CatalogoMesas()
+broker = eventos.Broker()
+versoes_dados = versoes.VersoesDados()
+cache_respostas = cache.CacheRespostas()
+
+def aplicar_alteracao(conn, alteracao):
+    """Aplica ao estado em memória deste processo uma linha da tabela alteracoes."""
+    reserva_id, tipo = alteracao['reserva_id'], alteracao['tipo']
+    if tipo == 'mesa':
+        # Mudança no cadastro de mesas é rara: tudo o que foi calculado com o
+        # cadastro antigo (ETags e respostas em cache) deixa de valer
+        catalogo_mesas.carregar(conn)
+        versoes_dados.iniciar(alteracao['id'])
+        cache_respostas.limpar()
+        broker.avancar(alteracao['id'])
+        return
+
+    if tipo != 'movida':
+        if tipo != 'cancelada' and alteracao['status'] == 'confirmada' and alteracao['hora_min'] is not None:
+            indice_intervalos.adicionar(reserva_id, alteracao['mesa'], alteracao['data_ord'],
+                                        alteracao['hora_min'], alteracao['hora_fim_min'])
+        else:
+            indice_intervalos.remover(reserva_id)
+
+    versoes_dados.alterar(alteracao['id'], alteracao['data_ord'], alteracao['mesa'], alteracao['garcom'])
+    cache_respostas.invalidar(alteracao['data_ord'], alteracao['mesa'], alteracao['garcom'])
+
+    if tipo == 'criada':
+        broker.publicar(alteracao['id'], 'reserva_criada', formatar_reserva_com_horario({
+            'id': reserva_id, 'data': alteracao['data'], 'hora': alteracao['hora'], 'mesa': alteracao['mesa'],
+            'pessoas': alteracao['pessoas'], 'responsavel': alteracao['responsavel'],
+            'hora_fim': alteracao['hora_fim'],
+        }))
+    elif tipo == 'confirmada':
+        broker.publicar(alteracao['id'], 'reserva_confirmada', {
+            'id': reserva_id, 'mesa': alteracao['mesa'], 'data': alteracao['data'],
+            'hora': formatar_horario_completo(alteracao['hora'], alteracao['hora_fim']),
+            'garcom': alteracao['garcom'],
+        })
+    elif tipo == 'cancelada':
+        broker.publicar(alteracao['id'], 'reserva_cancelada', {'id': reserva_id})
+    elif tipo == 'finalizada':
+        broker.publicar(alteracao['id'], 'reserva_finalizada', {'id': reserva_id})
+    else:
+        broker.avancar(alteracao['id'])
+
+def recarregar_estado(conn, ultimo_id):
+    catalogo_mesas.carregar(conn)
+    indice_intervalos.carregar(conn)
+    versoes_dados.carregar(conn, ultimo_id)
+    cache_respostas.limpar()
+    broker.iniciar(ultimo_id)
+
+def preparar_banco(conn):
+    # Roda em cada worker depois do fork: a thread do log não passa pelo fork
+    registro.configurar()
+    migracoes.migrar(conn)
+    sincronizador.iniciar()
+    metricas.coletor.iniciar()
+
+pool = banco.PoolConexoes(DB_PATH, preparar=preparar_banco, fabrica=metricas.ConexaoMedida)
+sincronizador = sincronizacao.Sincronizador(pool, aplicar_alteracao, recarregar_estado)
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.before_request
+def preparar_estado():
+    # Rotas que respondem sem abrir conexão (cache, /eventos) também dependem do estado carregado
+    pool.preparar()
+
+@app.before_request
+def iniciar_perfil():
+    modo = perfilador.modo_pedido(request.headers)
+    if modo:
+        g.perfil = perfilador.Perfil(modo, request.method, rota_atual(), request.full_path.rstrip('?'))
+        g.perfil.iniciar()
+
+def concluir_medicao(rota, metodo, status, inicio, perfil):
+    """Registra a latência da requisição e grava o perfil, se houver."""
+    if inicio is not None:
+        metricas.coletor.observar_requisicao(rota, metodo, status, time.perf_counter() - inicio)
+    if perfil is not None:
+        perfil.encerrar()
+        perfil.status = status
+        try:
+            perfil.gravar()
+        except OSError as e:
+            log.error('Gravação do perfil %s falhou: %s', perfil.id, e)
+
+@app.after_request
+def guardar_status(resposta):
+    g.status_resposta = resposta.status_code
+    perfil = g.get('perfil')
+    if perfil is not None:
+        resposta.headers['X-Perfil-Id'] = perfil.id
+    if resposta.is_streamed:
+        # O teardown roda antes de o corpo em stream ser gerado: a medição
+        # termina quando o servidor fecha a resposta, depois do último byte
+        resposta.call_on_close(functools.partial(
+            concluir_medicao, rota_atual(), request.method, resposta.status_code,
+            g.pop('inicio_requisicao', None), g.pop('perfil', None),
+        ))
+    return resposta
+
+@app.teardown_request
+def medir_requisicao(exc):
+    status = 500 if exc is not None else g.pop('status_resposta', 500)
+    concluir_medicao(rota_atual(), request.method, status, g.pop('inicio_requisicao', None), g.pop('perfil', None))
+
+def encerrar_worker():
+    """Desligamento gracioso: encerra os streams do /eventos e fecha as conexões."""
+    broker.encerrar()
+    sincronizador.parar()
+    metricas.coletor.parar()
+    pool.fechar()
+    registro.encerrar()
+
+def erro_interno(e):
+    """Resposta 500 das rotas; chamar dentro do except para o traceback ir ao log."""
+    log.exception('Erro ao atender a requisição', extra={'rota': rota_atual(), 'metodo': request.method})
+    return jsonify({'error': str(e)}), 500
 
 def converter_para_json(obj):
     if isinstance(obj, (datetime.date, datetime.datetime)):
@@ -118,77 +263,247 @@ def converter_para_json(obj):
         return f"{horas:02}:{minutos:02}:{segundos:02}"
     raise TypeError(f"Tipo não serializável: {type(obj)}")
 
+CAMPOS_GERENTE = ('id', 'data', 'hora', 'mesa', 'pessoas', 'responsavel', 'status', 'garcom')
+
+def filtrar_reserva_gerente(reserva):
+    reserva_dict = dict(reserva) if hasattr(reserva, 'keys') else reserva
+    return {campo: reserva_dict.get(campo) for campo in CAMPOS_GERENTE if campo in reserva_dict}
+
 def filtrar_campos_gerente(reservas):
-    campos_manter = ['id', 'data', 'hora', 'mesa', 'pessoas', 'responsavel', 'status', 'garcom']
-    
-    reservas_filtradas = []
-    for reserva in reservas:
-        reserva_dict = dict(reserva) if hasattr(reserva, 'keys') else reserva
-        reserva_filtrada = {campo: reserva_dict.get(campo) for campo in campos_manter if campo in reserva_dict}
-        reservas_filtradas.append(reserva_filtrada)
-    return reservas_filtradas
+    return [filtrar_reserva_gerente(reserva) for reserva in reservas]
+
+def formatar_reserva_gerente(row):
+    return filtrar_reserva_gerente(formatar_reserva_com_horario(dict(row)))
+
+def transmitir_json(cursor, transformar, indent=None):
+    """
+    Responde com um array JSON gerado sob demanda a partir do cursor, lendo
+    TAMANHO_LOTE linhas por vez: a memória usada não depende do tamanho do
+    resultado e o primeiro byte sai antes de a consulta ser toda lida.
+
+    O texto gerado é idêntico ao de json.dumps(lista, indent=indent).
+    """
+    def serializar(linha):
+        texto = json.dumps(transformar(linha), default=converter_para_json, indent=indent)
+        return textwrap.indent(texto, ' ' * indent) if indent else texto
+
+    abertura, separador, fechamento = ('[\n', ',\n', '\n]') if indent else ('[', ', ', ']')
+    rota = rota_atual()
+    # O teardown (e com ele liberar_conexao) roda antes de o stream começar:
+    # a conexão do cursor fica com a resposta e volta ao pool quando ela fecha.
+    # gerar() não usa o contexto da requisição (nada de stream_with_context):
+    # tudo o que ela precisa é lido aqui, e ela pode rodar, ou ser fechada sem
+    # ter rodado, depois que o contexto saiu de cena
+    con = g.pop('con', None)
+
+    def gerar():
+        serializacao = 0.0
+        try:
+            linhas = cursor.fetchmany(TAMANHO_LOTE)
+            if not linhas:
+                yield '[]'
+                return
+            yield abertura
+            primeiro_lote = True
+            while linhas:
+                inicio = time.perf_counter()
+                lote = separador.join(serializar(linha) for linha in linhas)
+                serializacao += time.perf_counter() - inicio
+                yield lote if primeiro_lote else separador + lote
+                primeiro_lote = False
+                linhas = cursor.fetchmany(TAMANHO_LOTE)
+            yield fechamento
+        finally:
+            cursor.close()
+            metricas.coletor.observar_serializacao(rota, serializacao)
+
+    resposta = Response(gerar(), mimetype='application/json')
+    if con is not None:
+        resposta.call_on_close(functools.partial(pool.liberar, con))
+    return resposta
 
 def verificar_conflito_horario(mesa, data, hora_inicio, reserva_id=None):
     try:
-        con = conectar()
-        cur = con.cursor()
-        
-        query = '''
-            SELECT id, hora, hora_fim, status FROM reservas 
-            WHERE mesa = ? AND data = ? AND status = 'confirmada'
-        '''
-        params = [mesa, data]
-        
-        if reserva_id:
-            query += ' AND id != ?'
-            params.append(reserva_id)
-            
-        cur.execute(query, params)
-        reservas_existentes = cur.fetchall()
-        cur.close()
-        con.close()
-        
-        print(f"[DEBUG] Verificando conflito para mesa {mesa}, data {data}, hora {hora_inicio}")
-        print(f"[DEBUG] Reservas confirmadas encontradas: {len(reservas_existentes)}")
-        
-        if not reservas_existentes:
-            print("[DEBUG] Nenhuma reserva confirmada encontrada - OK")
-            return False
-        
-        hora_fim_nova = calcular_hora_fim(hora_inicio)
-        print(f"[DEBUG] Nova reserva: {hora_inicio} até {hora_fim_nova}")
-        
-        try:
-            hora_inicio_obj = datetime.datetime.strptime(hora_inicio, '%H:%M').time()
-            hora_fim_obj = datetime.datetime.strptime(hora_fim_nova, '%H:%M').time()
-        except Exception as e:
-            print(f"[DEBUG] Erro ao converter horários: {e}")
+        # Chamada dentro da transação de escrita: o índice fica com tudo o que
+        # outros workers gravaram antes de esta transação obter a trava
+        sincronizador.sincronizar()
+        inicio = horarios.para_minutos(hora_inicio)
+        fim = horarios.fim_em_minutos(inicio)
+        if indice_intervalos.conflita(mesa, horarios.data_para_ordinal(data), inicio, fim, ignorar_id=reserva_id):
+            log.debug('Conflito de horário: mesa %s, data %s, hora %s', mesa, data, hora_inicio)
             return True
-        
-        for reserva in reservas_existentes:
-            print(f"[DEBUG] Verificando contra reserva ID {reserva['id']}: {reserva['hora']} até {reserva['hora_fim']}")
-            
-            try:
-                reserva_inicio = datetime.datetime.strptime(reserva['hora'], '%H:%M').time()
-                reserva_fim = datetime.datetime.strptime(reserva['hora_fim'], '%H:%M').time()
-                
-                if (hora_inicio_obj < reserva_fim and hora_fim_obj > reserva_inicio):
-                    print(f"[DEBUG] CONFLITO DETECTADO! Nova reserva {hora_inicio_obj}-{hora_fim_obj} sobrepõe com {reserva_inicio}-{reserva_fim}")
-                    return True
-                else:
-                    print(f"[DEBUG] Sem conflito com esta reserva")
-                    
-            except Exception as e:
-                print(f"[DEBUG] Erro ao processar reserva {reserva['id']}: {e}")
-                return True
-                
-        print("[DEBUG] Nenhum conflito encontrado - OK")
         return False
-        
-    except Exception as e:
-        print(f"[DEBUG] Erro geral ao verificar conflito: {e}")
+    except Exception:
+        log.exception('Erro ao verificar conflito: mesa %s, data %s, hora %s', mesa, data, hora_inicio)
         return True
 
+def codificar_cursor(data_ord, hora_min, reserva_id):
+    texto = f'{data_ord}.{hora_min}.{reserva_id}'
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data_ord, hora_min, reserva_id = (int(parte) for parte in texto.split('.'))
+        return data_ord, hora_min, reserva_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Parametro "cursor" invalido')
+
+def ler_paginacao():
+    """
+    Lê os parâmetros limit/cursor da requisição. Sem nenhum dos dois a rota
+    mantém a resposta antiga (array completo) e o retorno é None; caso
+    contrário devolve (limite, chave) para a consulta paginada.
+    """
+    limite = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limite is None and cursor is None:
+        return None
+
+    try:
+        limite = int(limite) if limite is not None else LIMITE_PADRAO
+    except ValueError:
+        raise ValueError('Parametro "limit" deve ser um numero inteiro')
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f'Parametro "limit" deve estar entre 1 e {LIMITE_MAXIMO}')
+
+    chave = decodificar_cursor(cursor) if cursor else (-1, -1, -1)
+    return limite, chave
+
+def responder_pagina(cursor, transformar, limite):
+    linhas = cursor.fetchmany(limite + 1)
+    cursor.close()
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        proximo = codificar_cursor(ultima['data_ord'], ultima['hora_min'], ultima['id'])
+
+    resposta = {'reservas': [transformar(linha) for linha in linhas], 'next_cursor': proximo}
+    return Response(serializar_json(resposta, default=converter_para_json), mimetype='application/json')
+
+def condicional(escopo):
+    """
+    Responde 304 Not Modified quando o If-None-Match do cliente ainda vale e,
+    fora isso, devolve o corpo guardado em cache_respostas enquanto a ETag não
+    mudar: em nenhum dos dois casos a rota abre conexão ou serializa algo.
+
+    escopo recebe os mesmos argumentos da rota e devolve (partes da versão,
+    dependências da resposta), ou None quando não dá para calcular a versão
+    (parâmetros inválidos, por exemplo); nesse caso a própria rota responde.
+
+    A ETag é calculada antes da consulta: se uma escrita acontecer no meio,
+    a resposta sai com a versão antiga e o cliente busca de novo na próxima.
+    Pelo mesmo motivo a rota aceita o estado sincronizado há menos de
+    RESERVAS_SINCRONIZACAO_RECENTE segundos, sem disputar a trava do
+    sincronizador a cada requisição.
+    """
+    def decorador(rota):
+        @functools.wraps(rota)
+        def rota_condicional(*args, **kwargs):
+            sincronizador.sincronizar(leitura=True)
+            calculado = escopo(*args, **kwargs)
+            if calculado is None:
+                return rota(*args, **kwargs)
+            partes, dependencias = calculado
+            etag = versoes_dados.etag(*partes)
+            if request.if_none_match.contains(etag):
+                resposta = Response(status=304)
+            else:
+                chave = (request.path, tuple(sorted(request.args.items(multi=True))))
+                entrada = cache_respostas.obter(chave, etag)
+                if entrada is not None:
+                    resposta = Response(entrada.corpo, mimetype=entrada.mimetype)
+                else:
+                    resposta = make_response(rota(*args, **kwargs))
+                    if resposta.status_code != 200:
+                        return resposta
+                    guardar_em_cache(resposta, chave, etag, dependencias)
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+        return rota_condicional
+    return decorador
+
+def guardar_em_cache(resposta, chave, etag, dependencias):
+    """
+    Respostas em stream continuam saindo por partes: o corpo é copiado para o
+    cache à medida que é enviado e só é guardado se chegar ao fim sem passar
+    do limite de uma entrada.
+    """
+    if not resposta.is_streamed:
+        cache_respostas.guardar(chave, etag, resposta.get_data(), resposta.mimetype, dependencias)
+        return
+
+    original = resposta.response
+
+    def copiar():
+        partes, tamanho = [], 0
+        try:
+            for parte in original:
+                if isinstance(parte, str):
+                    parte = parte.encode()
+                if partes is not None:
+                    tamanho += len(parte)
+                    if tamanho <= cache_respostas.limite_entrada:
+                        partes.append(parte)
+                    else:
+                        partes = None
+                yield parte
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+        if partes is not None:
+            cache_respostas.guardar(chave, etag, b''.join(partes), resposta.mimetype, dependencias)
+
+    resposta.response = copiar()
+
+def escopo_global():
+    return (versoes_dados.versao(),), (cache.GLOBAL,)
+
+def escopo_periodo():
+    try:
+        inicio_ord = horarios.data_para_ordinal(request.args.get('inicio'))
+        fim_ord = horarios.data_para_ordinal(request.args.get('fim'))
+    except (TypeError, ValueError):
+        return None
+    return (versoes_dados.versao_periodo(inicio_ord, fim_ord),), (cache.periodo(inicio_ord, fim_ord),)
+
+def escopo_relatorio_mesa(mesa):
+    return (versoes_dados.versao_mesa(mesa),), (cache.mesa(mesa),)
+
+def escopo_relatorio_garcom(nome):
+    return (versoes_dados.versao_garcom(nome),), (cache.garcom(nome),)
+
+def escopo_disponibilidade_mesa(mesa):
+    try:
+        data_ord = horarios.data_para_ordinal(request.args.get('data'))
+    except (TypeError, ValueError):
+        return None
+    versao = max(versoes_dados.versao_mesa(mesa), versoes_dados.versao_dia(data_ord))
+    return (versao,), (cache.mesa(mesa), cache.dia(data_ord))
+
+def escopo_disponibilidade():
+    try:
+        data_ord = horarios.data_para_ordinal(request.args.get('data'))
+    except (TypeError, ValueError):
+        return None
+    # Reservas do dia anterior e do seguinte podem alcançar o dia pedido
+    dias = (data_ord - 1, data_ord, data_ord + 1)
+    partes = (max(versoes_dados.versao_dia(dia) for dia in dias),)
+    agora = datetime.datetime.now()
+    if data_ord == agora.toordinal():
+        # Para hoje os horários que já passaram saem da resposta
+        partes += (agora.hour * 60 + agora.minute,)
+    return partes, tuple(cache.dia(dia) for dia in dias)
+
+def escopo_mesas_em_uso():
+    # A lista também muda com o relógio, então o minuto atual faz parte da versão
+    agora = datetime.datetime.now()
+    hoje = agora.toordinal()
+    return (versoes_dados.versao_dia(hoje), hoje, agora.hour * 60 + agora.minute), (cache.dia(hoje),)
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -209,8 +524,15 @@ def pagina_gerente():
 def criar_reserva():
     dados = request.json
     try:
-        if dados['mesa'] > 20 or dados['mesa'] < 1:
-            return jsonify({'mensagem': 'Mesa deve estar entre 1 e 20'}), 400
+        try:
+            dados['mesa'] = importacao.ler_inteiro(dados, 'mesa')
+            dados['pessoas'] = importacao.ler_inteiro(dados, 'pessoas')
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'mensagem': 'Campos "mesa" e "pessoas" devem ser numeros inteiros'}), 400
+        try:
+            catalogo_mesas.validar(dados['mesa'], dados['pessoas'])
+        except ValueError as e:
+            return jsonify({'mensagem': str(e)}), 400
 
         data_obj = datetime.datetime.strptime(dados['data'], '%Y-%m-%d')
         hora_obj = datetime.datetime.strptime(dados['hora'], '%H:%M').time()
@@ -225,70 +547,116 @@ def criar_reserva():
         if not hora_fim:
             return jsonify({'mensagem': 'Formato de hora inválido'}), 400
 
-        con = conectar()
-        cur = con.cursor()
+        data_ord = horarios.data_para_ordinal(dados['data'])
+        hora_min = horarios.para_minutos(dados['hora'])
+        hora_fim_min = horarios.fim_em_minutos(hora_min)
 
-        cur.execute('''
-            SELECT * FROM reservas
-            WHERE mesa = ? AND data = ? AND hora = ? AND status = 'reservada'
-        ''', (dados['mesa'], dados['data'], dados['hora']))
+        def inserir(con):
+            cur = con.execute(consultas.SQL_RESERVA_DUPLICADA, (dados['mesa'], data_ord, hora_min))
+            if cur.fetchone():
+                return None, 'Mesa ja reservada nesse horario'
 
-        if cur.fetchone():
-            cur.close()
-            con.close()
-            return jsonify({'mensagem': 'Mesa ja reservada nesse horario'}), 400
+            if verificar_conflito_horario(dados['mesa'], dados['data'], dados['hora']):
+                return None, 'Mesa em uso nesse horario'
 
-        if verificar_conflito_horario(dados['mesa'], dados['data'], dados['hora']):
-            cur.close()
-            con.close()
-            return jsonify({'mensagem': 'Mesa em uso nesse horario'}), 400
+            return repositorio.inserir(con, dados['data'], dados['hora'], dados['mesa'], dados['pessoas'],
+                                       dados['responsavel'], hora_fim, data_ord, hora_min, hora_fim_min), None
 
-        cur.execute('''
-            INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, hora_fim)
-            VALUES (?, ?, ?, ?, ?, 'reservada', ?)
-        ''', (dados['data'], dados['hora'], dados['mesa'], dados['pessoas'], dados['responsavel'], hora_fim))
-        reserva_id = cur.lastrowid
+        reserva_id, erro = banco.executar_transacao(conectar(), inserir)
+        if erro:
+            return jsonify({'mensagem': erro}), 400
 
-        con.commit()
-        cur.close()
-        con.close()
+        sincronizador.sincronizar()
 
         resposta = OrderedDict([
             ('mensagem', 'Reserva criada com sucesso'),
             ('id', reserva_id),
             ('horario', formatar_horario_completo(dados['hora'], hora_fim))
         ])
-        return Response(json.dumps(resposta), mimetype='application/json')
+        return Response(serializar_json(resposta), mimetype='application/json')
     except Exception as e:
-        print(f"Erro ao criar reserva: {e}")
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+def indice_em_dia(con):
+    sincronizador.sincronizar()
+    return indice_intervalos
+
+def indice_do_banco(con):
+    indice = intervalos.IndiceIntervalos()
+    indice.carregar(con)
+    return indice
+
+def importar_lote(con, registros, cadastro, obter_indice):
+    """
+    Valida e grava um lote de reservas (ver importacao.py) em uma transação.
+    cadastro é o CatalogoMesas usado na validação; obter_indice(con) devolve,
+    já dentro da transação, o índice de reservas confirmadas usado na
+    verificação de conflito.
+    """
+    reservas, erros = importacao.validar_lote(registros, cadastro)
+    criada_em = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+
+    def inserir(con):
+        return importacao.inserir(con, reservas, obter_indice(con), criada_em)
+
+    criadas, conflitos = banco.executar_transacao(con, inserir)
+    erros = sorted(erros + conflitos)
+    return OrderedDict([
+        ('mensagem', f'{len(criadas)} reservas criadas, {len(erros)} com erro'),
+        ('criadas', len(criadas)),
+        ('reservas', [
+            {'linha': reserva.linha, 'id': reserva_id, 'horario': formatar_horario_completo(reserva.hora, reserva.hora_fim)}
+            for reserva, reserva_id in criadas
+        ]),
+        ('erros', [{'linha': linha, 'mensagem': mensagem} for linha, mensagem in erros]),
+    ])
+
+@app.route('/reservas/lote', methods=['POST'])
+def criar_reservas_lote():
+    """
+    Cria várias reservas de uma vez. O corpo é um array JSON
+    (application/json), JSON Lines (application/x-ndjson) ou CSV com
+    cabeçalho (text/csv), com os campos de POST /reserva. As linhas válidas
+    são gravadas; as demais voltam em "erros" com o número da linha.
+    """
+    formato = importacao.FORMATOS.get(request.mimetype)
+    if not formato:
+        return jsonify({'mensagem': 'Envie o lote como application/json, application/x-ndjson ou text/csv'}), 415
+    try:
+        registros = importacao.ler(request.get_data(as_text=True), formato)
+    except ValueError as e:
+        return jsonify({'mensagem': str(e)}), 400
+    if len(registros) > MAXIMO_RESERVAS_LOTE:
+        return jsonify({'mensagem': f'O lote deve ter no maximo {MAXIMO_RESERVAS_LOTE} reservas'}), 413
+
+    try:
+        relatorio = importar_lote(conectar(), registros, catalogo_mesas, indice_em_dia)
+        if relatorio['criadas']:
+            sincronizador.sincronizar()
+        return Response(serializar_json(relatorio), mimetype='application/json')
+    except Exception as e:
+        return erro_interno(e)
 
 @app.route('/reserva/<int:id>', methods=['DELETE'])
 def cancelar_reserva(id):
     try:
-        con = conectar()
-        cur = con.cursor()
+        def excluir(con):
+            reserva = repositorio.buscar(con, id)
+            if not reserva:
+                return {'mensagem': 'Reserva nao encontrada'}, 404
 
-        cur.execute('SELECT status FROM reservas WHERE id = ?', (id,))
-        reserva = cur.fetchone()
-        
-        if not reserva:
-            cur.close()
-            con.close()
-            return jsonify({'mensagem': 'Reserva nao encontrada'}), 404
+            if reserva.status == 'confirmada':
+                return {'mensagem': 'Nao e possivel cancelar reserva ja confirmada pelo garcom'}, 400
 
-        if reserva['status'] == 'confirmada':
-            cur.close()
-            con.close()
-            return jsonify({'mensagem': 'Nao e possivel cancelar reserva ja confirmada pelo garcom'}), 400
+            repositorio.excluir(con, id)
+            return {'mensagem': 'Reserva cancelada com sucesso'}, 200
 
-        cur.execute('DELETE FROM reservas WHERE id = ?', (id,))
-        con.commit()
-        cur.close()
-        con.close()
-        return jsonify({'mensagem': 'Reserva cancelada com sucesso'})
+        resposta, status = banco.executar_transacao(conectar(), excluir)
+        if status == 200:
+            sincronizador.sincronizar()
+        return jsonify(resposta), status
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
 
 @app.route('/confirmar/<int:id>', methods=['POST'])
 def confirmar_reserva(id):
@@ -296,77 +664,178 @@ def confirmar_reserva(id):
     if not garcom:
         return jsonify({'mensagem': 'Campo "garcom" e obrigatorio'}), 400
     try:
-        con = conectar()
-        cur = con.cursor()
+        def confirmar(con):
+            reserva = repositorio.buscar(con, id, 'reservada')
+            if not reserva:
+                return reserva, ({'mensagem': 'Reserva nao encontrada ou ja confirmada'}, 404)
 
-        cur.execute('SELECT * FROM reservas WHERE id = ? AND status = "reservada"', (id,))
-        reserva = cur.fetchone()
-        if not reserva:
-            cur.close()
-            con.close()
-            return jsonify({'mensagem': 'Reserva nao encontrada ou ja confirmada'}), 404
+            if verificar_conflito_horario(reserva.mesa, reserva.data, reserva.hora, id):
+                return reserva, ({'mensagem': 'Mesa em uso nesse horario'}, 400)
 
-        if verificar_conflito_horario(reserva['mesa'], reserva['data'], reserva['hora'], id):
-            cur.close()
-            con.close()
+            repositorio.confirmar(con, [id], garcom)
+            return reserva, None
+
+        try:
+            reserva, erro = banco.executar_transacao(conectar(), confirmar)
+        except sqlite3.IntegrityError as e:
+            if 'conflito_horario' not in str(e):
+                raise
             return jsonify({'mensagem': 'Mesa em uso nesse horario'}), 400
+        if erro:
+            return jsonify(erro[0]), erro[1]
 
-        agora = datetime.datetime.now()
-        data_confirmacao = agora.strftime('%Y-%m-%d')
-        hora_confirmacao = agora.strftime('%H:%M')
-
-        cur.execute('''
-            UPDATE reservas SET status = 'confirmada', garcom = ?, 
-            data_confirmacao = ?, hora_confirmacao = ?
-            WHERE id = ?
-        ''', (garcom, data_confirmacao, hora_confirmacao, id))
-        con.commit()
-        cur.close()
-        con.close()
+        sincronizador.sincronizar()
         return jsonify({
             'mensagem': 'Reserva confirmada',
-            'horario': formatar_horario_completo(reserva['hora'], reserva['hora_fim'])
+            'horario': formatar_horario_completo(reserva.hora, reserva.hora_fim)
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
 
 @app.route('/finalizar/<int:id>', methods=['POST'])
 def finalizar_reserva(id):
     try:
-        con = conectar()
-        cur = con.cursor()
+        def finalizar(con):
+            return repositorio.finalizar(con, [id])
 
-        cur.execute('SELECT * FROM reservas WHERE id = ? AND status = "confirmada"', (id,))
-        if not cur.fetchone():
-            cur.close()
-            con.close()
+        if not banco.executar_transacao(conectar(), finalizar):
             return jsonify({'mensagem': 'Reserva nao encontrada ou nao confirmada'}), 404
 
-        cur.execute('UPDATE reservas SET status = "finalizada" WHERE id = ?', (id,))
-        con.commit()
-        cur.close()
-        con.close()
+        sincronizador.sincronizar()
         return jsonify({'mensagem': 'Reserva finalizada com sucesso'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+def ler_ids_lote(dados):
+    """
+    Lista de ids de /confirmar/lote e /finalizar/lote, sem repetições e na
+    ordem enviada.
+
+    Raises:
+        ValueError: com a mensagem de erro da requisição
+    """
+    ids = dados.get('ids') if isinstance(dados, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('Campo "ids" deve ser uma lista de ids de reserva')
+    if len(ids) > MAXIMO_IDS_LOTE:
+        raise ValueError(f'O lote deve ter no maximo {MAXIMO_IDS_LOTE} ids')
+    if not all(isinstance(reserva_id, int) and not isinstance(reserva_id, bool) for reserva_id in ids):
+        raise ValueError('Campo "ids" deve conter apenas numeros inteiros')
+    return list(dict.fromkeys(ids))
+
+def resposta_lote(resultados, chave):
+    concluidas = sum(1 for resultado in resultados if resultado['status'] == 200)
+    return jsonify({
+        'mensagem': f'{concluidas} de {len(resultados)} reservas {chave}',
+        chave: concluidas,
+        'resultados': resultados,
+    })
+
+@app.route('/confirmar/lote', methods=['POST'])
+def confirmar_reservas_lote():
+    """
+    Confirma várias reservas em uma transação. Cada id recebe o próprio
+    resultado (status e mensagem iguais aos de /confirmar/<id>); as reservas
+    do lote também são conferidas umas contra as outras.
+    """
+    dados = request.get_json(silent=True)
+    try:
+        ids = ler_ids_lote(dados)
+    except ValueError as e:
+        return jsonify({'mensagem': str(e)}), 400
+    garcom = dados.get('garcom')
+    if not garcom:
+        return jsonify({'mensagem': 'Campo "garcom" e obrigatorio'}), 400
+
+    try:
+        def confirmar(con):
+            # Dentro da transação de escrita, como em verificar_conflito_horario
+            sincronizador.sincronizar()
+            reservas = repositorio.buscar_varias(con, ids, 'reservada')
+            lote = intervalos.IndiceIntervalos()
+            resultados, confirmadas = [], []
+            for reserva_id in ids:
+                reserva = reservas.get(reserva_id)
+                if reserva is None:
+                    resultados.append({'id': reserva_id, 'status': 404, 'mensagem': 'Reserva nao encontrada ou ja confirmada'})
+                    continue
+                intervalo = (reserva.mesa, reserva.data_ord, reserva.hora_min, reserva.hora_fim_min)
+                if indice_intervalos.conflita(*intervalo) or lote.conflita(*intervalo):
+                    resultados.append({'id': reserva_id, 'status': 400, 'mensagem': 'Mesa em uso nesse horario'})
+                    continue
+                lote.adicionar(reserva_id, *intervalo)
+                confirmadas.append(reserva_id)
+                resultados.append({
+                    'id': reserva_id, 'status': 200, 'mensagem': 'Reserva confirmada',
+                    'horario': formatar_horario_completo(reserva.hora, reserva.hora_fim),
+                })
+
+            con.execute('SAVEPOINT lote')
+            try:
+                repositorio.confirmar(con, confirmadas, garcom)
+            except sqlite3.IntegrityError as e:
+                if 'conflito_horario' not in str(e):
+                    raise
+                # O trigger achou um conflito que o índice não tinha: refaz uma
+                # a uma e só as recusadas ficam de fora
+                con.execute('ROLLBACK TO lote')
+                posicoes = {resultado['id']: posicao for posicao, resultado in enumerate(resultados)}
+                for reserva_id in repositorio.confirmar_separadas(con, confirmadas, garcom):
+                    resultados[posicoes[reserva_id]] = {
+                        'id': reserva_id, 'status': 400, 'mensagem': 'Mesa em uso nesse horario',
+                    }
+            finally:
+                con.execute('RELEASE lote')
+            return resultados
+
+        resultados = banco.executar_transacao(conectar(), confirmar)
+        sincronizador.sincronizar()
+        return resposta_lote(resultados, 'confirmadas')
+    except Exception as e:
+        return erro_interno(e)
+
+@app.route('/finalizar/lote', methods=['POST'])
+def finalizar_reservas_lote():
+    """Finaliza várias reservas confirmadas em uma transação, com um resultado por id."""
+    try:
+        ids = ler_ids_lote(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'mensagem': str(e)}), 400
+
+    try:
+        def finalizar(con):
+            confirmadas = repositorio.buscar_varias(con, ids, 'confirmada')
+            repositorio.finalizar(con, confirmadas)
+            return [
+                {'id': reserva_id, 'status': 200, 'mensagem': 'Reserva finalizada com sucesso'}
+                if reserva_id in confirmadas else
+                {'id': reserva_id, 'status': 404, 'mensagem': 'Reserva nao encontrada ou nao confirmada'}
+                for reserva_id in ids
+            ]
+
+        resultados = banco.executar_transacao(conectar(), finalizar)
+        sincronizador.sincronizar()
+        return resposta_lote(resultados, 'finalizadas')
+    except Exception as e:
+        return erro_interno(e)
 
 @app.route('/mesa/<int:mesa>/disponibilidade', methods=['GET'])
+@condicional(escopo_disponibilidade_mesa)
 def verificar_disponibilidade_mesa(mesa):
     data = request.args.get('data')
     if not data:
         return jsonify({'error': 'Parametro "data" e obrigatorio'}), 400
+    try:
+        data_ord = horarios.data_para_ordinal(data)
+    except ValueError:
+        return jsonify({'error': 'Parametro "data" deve estar no formato AAAA-MM-DD'}), 400
         
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute('''
-            SELECT hora, hora_fim, status, responsavel FROM reservas 
-            WHERE mesa = ? AND data = ? AND status IN ('reservada', 'confirmada')
-            ORDER BY hora
-        ''', (mesa, data))
+        cur.execute(consultas.SQL_DISPONIBILIDADE_MESA, (mesa, data_ord))
         reservas = cur.fetchall()
         cur.close()
-        con.close()
         
         horarios_ocupados = []
         for reserva in reservas:
@@ -378,108 +847,293 @@ def verificar_disponibilidade_mesa(mesa):
                 'responsavel': reserva['responsavel']
             })
             
-        return Response(json.dumps({
+        return Response(serializar_json({
             'mesa': mesa,
             'data': data,
             'horarios_ocupados': horarios_ocupados
         }, default=converter_para_json), mimetype='application/json')
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+@app.route('/disponibilidade', methods=['GET'])
+@condicional(escopo_disponibilidade)
+def buscar_disponibilidade():
+    """
+    Mesas livres em um dia para uma reserva começando em "hora", ou em
+    qualquer horário entre "inicio" e "fim" (de PASSO_DISPONIBILIDADE em
+    PASSO_DISPONIBILIDADE minutos), mais os horários livres mais próximos
+    fora da janela. O salão inteiro sai de uma consulta (ver ocupacao.py).
+
+    Só entram as mesas que comportam "pessoas" (e da "zona", se informada),
+    da menor para a maior, para que a primeira seja a que melhor se ajusta.
+    """
+    data = request.args.get('data')
+    if not data:
+        return jsonify({'error': 'Parametro "data" e obrigatorio'}), 400
+    try:
+        data_ord = horarios.data_para_ordinal(data)
+    except ValueError:
+        return jsonify({'error': 'Parametro "data" deve estar no formato AAAA-MM-DD'}), 400
+    pessoas = request.args.get('pessoas', type=int)
+    if pessoas is None or pessoas < 1:
+        return jsonify({'error': 'Parametro "pessoas" deve ser um numero inteiro positivo'}), 400
+    try:
+        if request.args.get('hora'):
+            inicio = fim = horarios.para_minutos(request.args['hora'])
+        elif request.args.get('inicio') and request.args.get('fim'):
+            inicio, fim = horarios.para_minutos(request.args['inicio']), horarios.para_minutos(request.args['fim'])
+        else:
+            return jsonify({'error': 'Informe o parametro "hora" ou os parametros "inicio" e "fim"'}), 400
+    except ValueError:
+        return jsonify({'error': 'Formato de hora inválido'}), 400
+    if fim < inicio:
+        return jsonify({'error': 'Parametro "fim" deve ser depois de "inicio"'}), 400
+
+    # Horários candidatos do dia inteiro, alinhados ao início pedido e sem os que já passaram
+    agora = datetime.datetime.now()
+    hoje = agora.toordinal()
+    primeiro = inicio % PASSO_DISPONIBILIDADE
+    if data_ord < hoje:
+        primeiro = horarios.MINUTOS_DIA
+    elif data_ord == hoje:
+        agora_min = agora.hour * 60 + agora.minute
+        if primeiro <= agora_min:
+            primeiro += (agora_min - primeiro) // PASSO_DISPONIBILIDADE * PASSO_DISPONIBILIDADE + PASSO_DISPONIBILIDADE
+    candidatos = range(primeiro, horarios.MINUTOS_DIA, PASSO_DISPONIBILIDADE)
+
+    try:
+        cabem = catalogo_mesas.que_comportam(pessoas, request.args.get('zona'))
+        livres = ocupacao.OcupacaoDia.carregar(conectar(), data_ord, [mesa.id for mesa in cabem]).livres(candidatos)
+
+        mesas = []
+        por_horario = {}
+        for mesa in cabem:
+            inicios = livres.get(mesa.id, ())
+            na_janela = [horarios.formatar(minuto) for minuto in inicios if inicio <= minuto <= fim]
+            if na_janela:
+                mesas.append({'mesa': mesa.id, 'capacidade': mesa.capacidade, 'zona': mesa.zona, 'horarios': na_janela})
+            for minuto in inicios:
+                por_horario.setdefault(minuto, []).append(mesa.id)
+        fora = sorted(
+            (minuto for minuto in por_horario if not inicio <= minuto <= fim),
+            key=lambda minuto: (max(inicio - minuto, minuto - fim), minuto),
+        )[:PROXIMOS_HORARIOS]
+
+        return Response(serializar_json(OrderedDict([
+            ('data', horarios.ordinal_para_data(data_ord)),
+            ('pessoas', pessoas),
+            ('inicio', horarios.formatar(inicio)),
+            ('fim', horarios.formatar(fim)),
+            ('mesas', mesas),
+            ('proximos', [{'hora': horarios.formatar(minuto), 'mesas': por_horario[minuto]} for minuto in fora]),
+        ])), mimetype='application/json')
+    except Exception as e:
+        return erro_interno(e)
 
 @app.route('/relatorio/periodo', methods=['GET'])
+@condicional(escopo_periodo)
 def relatorio_periodo():
     inicio = request.args.get('inicio')
     fim = request.args.get('fim')
 
     if not inicio or not fim:
         return jsonify({'error': 'Parametros "inicio" e "fim" sao obrigatorios.'}), 400
+    try:
+        inicio_ord = horarios.data_para_ordinal(inicio)
+        fim_ord = horarios.data_para_ordinal(fim)
+    except ValueError:
+        return jsonify({'error': 'Parametros "inicio" e "fim" devem estar no formato AAAA-MM-DD.'}), 400
+    try:
+        pagina = ler_paginacao()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute('''
-            SELECT * FROM reservas
-            WHERE data BETWEEN ? AND ?
-        ''', (inicio, fim))
-        rows = cur.fetchall()
-        
-        reservas_formatadas = formatar_dados_com_horario([dict(row) for row in rows])
-        reservas = filtrar_campos_gerente(reservas_formatadas)
-        
-        cur.close()
-        con.close()
-        return Response(json.dumps(reservas, default=converter_para_json), mimetype='application/json')
+        if pagina:
+            limite, chave = pagina
+            chave = max(chave, (inicio_ord, -1, -1))
+            cur.execute(consultas.SQL_RELATORIO_PERIODO_PAGINA, (fim_ord, *chave, limite + 1))
+            return responder_pagina(cur, formatar_reserva_gerente, limite)
+        cur.execute(consultas.SQL_RELATORIO_PERIODO, (inicio_ord, fim_ord))
+        return transmitir_json(cur, formatar_reserva_gerente)
+    except Exception as e:
+        return erro_interno(e)
+
+def metricas_agregadas(row):
+    return {
+        'reservas': row['reservas'],
+        'pessoas': row['pessoas'] or 0,
+        'media_pessoas': round((row['pessoas'] or 0) / row['reservas'], 2) if row['reservas'] else 0,
+        'por_status': {
+            'reservada': row['reservadas'],
+            'confirmada': row['confirmadas'],
+            'finalizada': row['finalizadas'],
+        },
+        'atraso_medio_confirmacao_min': round(
+            row['atraso_confirmacao_min'] / row['confirmacoes_medidas'], 1
+        ) if row['confirmacoes_medidas'] else None,
+    }
+
+@app.route('/relatorio/agregado', methods=['GET'])
+@condicional(escopo_periodo)
+def relatorio_agregado():
+    inicio = request.args.get('inicio')
+    fim = request.args.get('fim')
+
+    if not inicio or not fim:
+        return jsonify({'error': 'Parametros "inicio" e "fim" sao obrigatorios.'}), 400
+    try:
+        inicio_ord = horarios.data_para_ordinal(inicio)
+        fim_ord = horarios.data_para_ordinal(fim)
+    except ValueError:
+        return jsonify({'error': 'Parametros "inicio" e "fim" devem estar no formato AAAA-MM-DD.'}), 400
+
+    try:
+        con = conectar()
+        periodo = (inicio_ord, fim_ord)
+
+        # Sem mesas cadastradas a ocupação é 0, não uma divisão por zero
+        total_mesas = len(catalogo_mesas)
+        por_dia = []
+        confirmacoes_medidas = atraso_confirmacao_min = 0
+        for row in con.execute(consultas.SQL_AGREGADO_DIA, periodo):
+            dia = {'data': horarios.ordinal_para_data(row['data_ord'])}
+            dia.update(metricas_agregadas(row))
+            dia['mesas_ocupadas'] = row['mesas_ocupadas']
+            dia['taxa_ocupacao'] = round(row['mesas_ocupadas'] / total_mesas, 4) if total_mesas else 0
+            por_dia.append(dia)
+            confirmacoes_medidas += row['confirmacoes_medidas']
+            atraso_confirmacao_min += row['atraso_confirmacao_min']
+
+        por_mesa = [
+            dict(mesa=row['mesa'], **metricas_agregadas(row))
+            for row in con.execute(consultas.SQL_AGREGADO_MESA, periodo)
+        ]
+        por_garcom = [
+            dict(garcom=row['garcom'], **metricas_agregadas(row))
+            for row in con.execute(consultas.SQL_AGREGADO_GARCOM, periodo)
+        ]
+
+        total_reservas = sum(dia['reservas'] for dia in por_dia)
+        total_pessoas = sum(dia['pessoas'] for dia in por_dia)
+        dias_periodo = fim_ord - inicio_ord + 1 if fim_ord >= inicio_ord else 0
+        totais = {
+            'reservas': total_reservas,
+            'pessoas': total_pessoas,
+            'media_pessoas': round(total_pessoas / total_reservas, 2) if total_reservas else 0,
+            'por_status': {
+                status: sum(dia['por_status'][status] for dia in por_dia)
+                for status in ('reservada', 'confirmada', 'finalizada')
+            },
+            'atraso_medio_confirmacao_min': round(
+                atraso_confirmacao_min / confirmacoes_medidas, 1
+            ) if confirmacoes_medidas else None,
+            'taxa_ocupacao': round(
+                sum(dia['mesas_ocupadas'] for dia in por_dia) / (total_mesas * dias_periodo), 4
+            ) if total_mesas and dias_periodo else 0,
+        }
+
+        return jsonify({
+            'inicio': inicio,
+            'fim': fim,
+            'totais': totais,
+            'por_dia': por_dia,
+            'por_mesa': por_mesa,
+            'por_garcom': por_garcom,
+        })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
 
 @app.route('/relatorio/mesa/<int:mesa>', methods=['GET'])
+@condicional(escopo_relatorio_mesa)
 def relatorio_mesa(mesa):
+    try:
+        pagina = ler_paginacao()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute('SELECT * FROM reservas WHERE mesa = ?', (mesa,))
-        rows = cur.fetchall()
-        
-        reservas_formatadas = formatar_dados_com_horario([dict(row) for row in rows])
-        resultado = filtrar_campos_gerente(reservas_formatadas)
-        
-        cur.close()
-        con.close()
-        return Response(json.dumps(resultado, default=converter_para_json), mimetype='application/json')
+        if pagina:
+            limite, chave = pagina
+            cur.execute(consultas.SQL_RELATORIO_MESA_PAGINA, (mesa, *chave, limite + 1))
+            return responder_pagina(cur, formatar_reserva_gerente, limite)
+        cur.execute(consultas.SQL_RELATORIO_MESA, (mesa,))
+        return transmitir_json(cur, formatar_reserva_gerente)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
 
 @app.route('/relatorio/garcom/<string:nome>', methods=['GET'])
+@condicional(escopo_relatorio_garcom)
 def relatorio_garcom(nome):
+    try:
+        pagina = ler_paginacao()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute('SELECT * FROM reservas WHERE garcom = ?', (nome,))
-        rows = cur.fetchall()
-        
-        reservas_formatadas = formatar_dados_com_horario([dict(row) for row in rows])
-        resultado = filtrar_campos_gerente(reservas_formatadas)
-        
-        cur.close()
-        con.close()
-        return Response(json.dumps(resultado, default=converter_para_json), mimetype='application/json')
+        if pagina:
+            limite, chave = pagina
+            cur.execute(consultas.SQL_RELATORIO_GARCOM_PAGINA, (nome, *chave, limite + 1))
+            return responder_pagina(cur, formatar_reserva_gerente, limite)
+        cur.execute(consultas.SQL_RELATORIO_GARCOM, (nome,))
+        return transmitir_json(cur, formatar_reserva_gerente)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+def formatar_reserva_disponivel(row):
+    reserva = dict(row)
+    del reserva['data_ord'], reserva['hora_min']
+    return formatar_reserva_com_horario(reserva)
 
 @app.route('/reservas-disponiveis', methods=['GET'])
+@condicional(escopo_global)
 def listar_reservas_disponiveis():
+    try:
+        pagina = ler_paginacao()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute("SELECT id, data, hora, mesa, pessoas, responsavel, hora_fim FROM reservas WHERE status = 'reservada' ORDER BY data, hora")
+        if pagina:
+            limite, chave = pagina
+            cur.execute(consultas.SQL_RESERVAS_DISPONIVEIS_PAGINA, (*chave, limite + 1))
+            return responder_pagina(cur, formatar_reserva_disponivel, limite)
+        cur.execute(consultas.SQL_RESERVAS_DISPONIVEIS)
         rows = cur.fetchall()
         
         reservas = formatar_dados_com_horario([dict(row) for row in rows])
         
         cur.close()
-        con.close()
-        return Response(json.dumps(reservas, default=converter_para_json), mimetype='application/json')
+        return Response(serializar_json(reservas, default=converter_para_json), mimetype='application/json')
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+@app.route('/mesas', methods=['GET'])
+def listar_mesas():
+    sincronizador.sincronizar()
+    return jsonify([
+        {'mesa': mesa.id, 'capacidade': mesa.capacidade, 'zona': mesa.zona, 'combinavel': mesa.combinavel}
+        for mesa in catalogo_mesas
+    ])
 
 @app.route('/mesas-em-uso', methods=['GET'])
+@condicional(escopo_mesas_em_uso)
 def listar_mesas_em_uso():
     try:
         con = conectar()
         cur = con.cursor()
         agora = datetime.datetime.now()
-        data_atual = agora.strftime('%Y-%m-%d')
-        hora_atual = agora.strftime('%H:%M')
+        minuto_atual = agora.hour * 60 + agora.minute
         
-        cur.execute('''
-            SELECT id, mesa, hora, hora_fim, responsavel, garcom 
-            FROM reservas 
-            WHERE status = 'confirmada' 
-            AND data = ? 
-            AND hora <= ? 
-            AND hora_fim > ?
-            ORDER BY mesa
-        ''', (data_atual, hora_atual, hora_atual))
+        cur.execute(consultas.SQL_MESAS_EM_USO, (agora.toordinal(), minuto_atual, minuto_atual))
         
         rows = cur.fetchall()
         
@@ -488,43 +1142,286 @@ def listar_mesas_em_uso():
             mesa_dict = dict(row)
             mesa_dict['horario'] = formatar_horario_completo(mesa_dict['hora'], mesa_dict['hora_fim'])
             mesa_dict['hora_inicio'] = mesa_dict['hora']
+            mesa = catalogo_mesas.obter(mesa_dict['mesa'])
+            mesa_dict['capacidade'] = mesa.capacidade if mesa else None
+            mesa_dict['zona'] = mesa.zona if mesa else None
             mesas_em_uso.append(mesa_dict)
         
         cur.close()
-        con.close()
         
-        return Response(json.dumps(mesas_em_uso, default=converter_para_json), mimetype='application/json')
+        return Response(serializar_json(mesas_em_uso, default=converter_para_json), mimetype='application/json')
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+def formatar_reserva_debug(row):
+    reserva = dict(row)
+    if not reserva.get('hora_fim') and reserva.get('hora'):
+        reserva['hora_fim'] = calcular_hora_fim(reserva['hora'])
+    
+    if reserva.get('hora'):
+        reserva['horario_completo'] = formatar_horario_completo(
+            reserva['hora'], 
+            reserva.get('hora_fim')
+        )
+        reserva['hora_inicio'] = reserva['hora']
+    return reserva
+
+def ler_ultimo_evento(cabecalho, parametro):
+    """Id do último evento que o cliente recebeu (Last-Event-ID ou ?ultimo_id), ou None."""
+    try:
+        return int(cabecalho or parametro)
+    except (TypeError, ValueError):
+        return None
+
+CABECALHOS_EVENTOS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+@app.route('/eventos', methods=['GET'])
+def transmitir_eventos():
+    """
+    Stream Server-Sent Events com as mudanças de reservas (reserva_criada,
+    reserva_confirmada, reserva_cancelada, reserva_finalizada). As páginas
+    aplicam cada evento à lista local em vez de consultar o servidor de novo.
+    """
+    ultimo_id = ler_ultimo_evento(request.headers.get('Last-Event-ID'), request.args.get('ultimo_id'))
+    sincronizador.sincronizar()
+    assinatura = broker.assinar(ultimo_id, limite=EVENTOS_MAXIMO)
+    if assinatura is None:
+        # Sem thread para mais um cliente: as outras rotas continuam atendendo
+        # e o cliente tenta de novo depois
+        return Response(
+            f'retry: {EVENTOS_RECONEXAO_LOTADO_MS}\n\n', status=503, mimetype='text/event-stream',
+            headers={**CABECALHOS_EVENTOS, 'Retry-After': str(EVENTOS_RECONEXAO_LOTADO_MS // 1000)},
+        )
+
+    def gerar():
+        try:
+            yield f'retry: {EVENTOS_RECONEXAO_MS}\n\n'
+            while not (assinatura.encerrada and assinatura.fila.empty()):
+                evento = assinatura.proximo(EVENTOS_PING)
+                yield ': ping\n\n' if evento is None else eventos.formatar_sse(evento)
+        finally:
+            broker.cancelar(assinatura)
+
+    resposta = Response(gerar(), mimetype='text/event-stream', headers=CABECALHOS_EVENTOS)
+    # Uma resposta fechada antes do primeiro byte não chega a rodar o finally de gerar()
+    resposta.call_on_close(functools.partial(broker.cancelar, assinatura))
+    return resposta
 
 @app.route('/debug/reservas', methods=['GET'])
+@condicional(escopo_global)
 def debug_reservas():
     try:
         con = conectar()
         cur = con.cursor()
-        cur.execute('SELECT * FROM reservas ORDER BY data, hora')
-        rows = cur.fetchall()
-        cur.close()
-        con.close()
-        
-        reservas = []
-        for row in rows:
-            reserva = dict(row)
-            if not reserva.get('hora_fim') and reserva.get('hora'):
-                reserva['hora_fim'] = calcular_hora_fim(reserva['hora'])
-            
-            if reserva.get('hora'):
-                reserva['horario_completo'] = formatar_horario_completo(
-                    reserva['hora'], 
-                    reserva.get('hora_fim')
-                )
-                reserva['hora_inicio'] = reserva['hora']
-            
-            reservas.append(reserva)
-        
-        return Response(json.dumps(reservas, default=converter_para_json, indent=2), mimetype='application/json')
+        cur.execute(consultas.SQL_TODAS_RESERVAS)
+        return transmitir_json(cur, formatar_reserva_debug, indent=2)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return erro_interno(e)
+
+@app.cli.command('migrar')
+def comando_migrar():
+    con = sqlite3.connect(DB_PATH)
+    try:
+        aplicadas = migracoes.migrar(con)
+        print(f"Banco {DB_PATH} na versão {migracoes.versao_atual(con)} ({aplicadas} migrações aplicadas)")
+    finally:
+        con.close()
+
+@app.cli.command('verificar-planos')
+def comando_verificar_planos():
+    con = sqlite3.connect(DB_PATH)
+    try:
+        migracoes.migrar(con)
+        if not consultas.relatorio_planos(con):
+            raise SystemExit(1)
+    finally:
+        con.close()
+
+@app.cli.command('reconstruir-resumos')
+def comando_reconstruir_resumos():
+    con = sqlite3.connect(DB_PATH)
+    try:
+        migracoes.migrar(con)
+        linhas = banco.executar_transacao(con, migracoes.reconstruir_resumo_diario)
+        print(f"Resumo diário de {DB_PATH} recalculado ({linhas} linhas)")
+    finally:
+        con.close()
+
+@app.cli.command('definir-mesa')
+@click.argument('mesa', type=int)
+@click.option('--capacidade', type=click.IntRange(min=1), required=True, help='número de lugares')
+@click.option('--zona', default='salao', show_default=True)
+@click.option('--combinavel/--nao-combinavel', default=False, help='pode ser juntada a outra mesa')
+def comando_definir_mesa(mesa, capacidade, zona, combinavel):
+    def definir(con):
+        con.execute('''
+            INSERT INTO mesas (id, capacidade, zona, combinavel) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                capacidade = excluded.capacidade, zona = excluded.zona, combinavel = excluded.combinavel
+        ''', (mesa, capacidade, zona, int(combinavel)))
+
+    con = sqlite3.connect(DB_PATH)
+    try:
+        migracoes.migrar(con)
+        banco.executar_transacao(con, definir)
+        print(f"Mesa {mesa} cadastrada: {capacidade} lugares, zona {zona}{', combinável' if combinavel else ''}")
+    finally:
+        con.close()
+
+@app.cli.command('remover-mesa')
+@click.argument('mesa', type=int)
+def comando_remover_mesa(mesa):
+    def remover(con):
+        if con.execute(
+            "SELECT 1 FROM reservas WHERE mesa = ? AND status IN ('reservada', 'confirmada') LIMIT 1", (mesa,)
+        ).fetchone():
+            return 'Mesa tem reservas em aberto; cancele ou finalize antes de remover'
+        if not con.execute('DELETE FROM mesas WHERE id = ?', (mesa,)).rowcount:
+            return 'Mesa nao cadastrada'
+        return None
+
+    con = sqlite3.connect(DB_PATH)
+    try:
+        migracoes.migrar(con)
+        erro = banco.executar_transacao(con, remover)
+    finally:
+        con.close()
+    if erro:
+        raise click.ClickException(erro)
+    print(f"Mesa {mesa} removida")
+
+@app.cli.command('importar-reservas')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(sorted(set(importacao.EXTENSOES.values()))),
+              help='json, jsonl ou csv (padrão: pela extensão do arquivo)')
+def comando_importar_reservas(arquivo, formato):
+    formato = formato or importacao.EXTENSOES.get(os.path.splitext(arquivo)[1].lower())
+    if not formato:
+        raise click.UsageError('Nao foi possivel deduzir o formato pela extensao; use --formato')
+    with open(arquivo, encoding='utf-8-sig', newline='') as f:
+        texto = f.read()
+
+    con = sqlite3.connect(DB_PATH)
+    try:
+        migracoes.migrar(con)
+        cadastro = catalogo.CatalogoMesas()
+        cadastro.carregar(con)
+        registros = importacao.ler(texto, formato)
+        relatorio = importar_lote(con, registros, cadastro, indice_do_banco)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        con.close()
+
+    for erro in relatorio['erros']:
+        print(f"[ERRO] linha {erro['linha']}: {erro['mensagem']}")
+    print(f"{relatorio['criadas']} reservas importadas de {arquivo}, {len(relatorio['erros'])} linhas com erro")
+    if relatorio['erros']:
+        raise SystemExit(1)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        'status': 'online',
+        'service': 'API de Reservas',
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    return Response(metricas.coletor.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def exigir_token_perfil(rota):
+    """Rotas dos perfis só respondem a quem traz o X-Perfil-Token (ver perfilador.py)."""
+    @functools.wraps(rota)
+    def verificar(*args, **kwargs):
+        if not perfilador.autorizado(request.headers):
+            return jsonify({'mensagem': 'Nao encontrado'}), 404
+        return rota(*args, **kwargs)
+    return verificar
+
+@app.route('/debug/perfis', methods=['GET'])
+@exigir_token_perfil
+def listar_perfis():
+    return jsonify(perfilador.listar())
+
+@app.route('/debug/perfis/<perfil_id>', methods=['GET'])
+@exigir_token_perfil
+def ver_perfil(perfil_id):
+    """Um perfil gravado: JSON completo, ?formato=prof (pstats) ou ?formato=folded (flame graph)."""
+    formato = request.args.get('formato', 'json')
+    if formato == 'prof':
+        arquivo = perfilador.caminho(perfil_id, '.prof')
+        if arquivo is None:
+            return jsonify({'mensagem': 'Perfil nao encontrado ou sem dados do cProfile'}), 404
+        return send_file(arquivo, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{perfil_id}.prof')
+    dados = perfilador.ler(perfil_id)
+    if dados is None:
+        return jsonify({'mensagem': 'Perfil nao encontrado'}), 404
+    if formato == 'folded':
+        return Response('\n'.join(dados.get('amostras', ())) + '\n', mimetype='text/plain')
+    return jsonify(dados)
+
+@app.route('/debug/pool', methods=['GET'])
+def debug_pool():
+    return jsonify(pool.estatisticas())
+
+@app.route('/debug/eventos', methods=['GET'])
+def debug_eventos():
+    return jsonify(broker.estatisticas())
+
+@app.route('/debug/cache', methods=['GET'])
+def debug_cache():
+    return jsonify(cache_respostas.estatisticas())
+
+@app.route('/debug/sincronizacao', methods=['GET'])
+def debug_sincronizacao():
+    return jsonify(sincronizador.estatisticas())
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Servidor de reservas. Sem comando, roda o servidor de desenvolvimento.')
+    comandos = parser.add_subparsers(dest='comando')
+    serve = comandos.add_parser('serve', help='modo de produção com vários processos (ver servico.py)')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=5000)
+    serve.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    serve.add_argument('--threads', type=int, default=banco.POOL_TAMANHO)
+    variante = serve.add_mutually_exclusive_group()
+    variante.add_argument('--asgi', action='store_true',
+                          help='variante ASGI com uvicorn (ver servidor_asgi.py); o padrão se o uvicorn estiver instalado')
+    variante.add_argument('--wsgi', action='store_true', help='gunicorn ou waitress mesmo com o uvicorn instalado')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    argumentos = ler_argumentos()
+    if argumentos.comando == 'serve':
+        # Migra uma vez antes de criar os workers; cada worker abre as próprias conexões
+        con = sqlite3.connect(DB_PATH)
+        try:
+            migracoes.migrar(con)
+        finally:
+            con.close()
+        temporario = None
+        if not metricas.coletor.diretorio:
+            # Cada worker grava as próprias métricas aqui e o /metrics soma todas
+            temporario = tempfile.mkdtemp(prefix='reservas-metricas-')
+            metricas.coletor.diretorio = os.environ['RESERVAS_METRICAS_DIR'] = temporario
+        try:
+            if argumentos.asgi or (not argumentos.wsgi and servico.uvicorn is not None):
+                servico.servir_asgi(argumentos.host, argumentos.port, argumentos.workers, argumentos.threads)
+            else:
+                if 'RESERVAS_EVENTOS_MAXIMO' not in os.environ:
+                    # Metade das threads de cada worker fica livre para as outras rotas
+                    EVENTOS_MAXIMO = max(1, argumentos.threads // 2)
+                servico.servir(app, argumentos.host, argumentos.port, argumentos.workers, argumentos.threads,
+                               pool.preparar, broker.encerrar, encerrar_worker)
+        finally:
+            if temporario:
+                shutil.rmtree(temporario, ignore_errors=True)
+    else:
+        pool.preparar()
+        app.run(debug=True)
\ No newline at end of file
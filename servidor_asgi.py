@@ -0,0 +1,256 @@
+"""
+Variante ASGI do servidor: python -m servidor serve --asgi (ou diretamente
+uvicorn servidor_asgi:app).
+
+As rotas e o contrato JSON são os de servidor.py: cada requisição é passada
+à aplicação Flask em uma thread do executor dedicado (RESERVAS_ASGI_THREADS
+threads), onde ficam o acesso ao SQLite e a serialização. Só o /eventos roda
+direto no event loop: um cliente conectado esperando eventos é uma corrotina
+parada, sem thread nem conexão com o banco, então milhares deles custam pouco.
+"""
+import asyncio
+import concurrent.futures
+import io
+import os
+import queue
+import signal
+import sys
+import threading
+import urllib.parse
+
+import banco
+import eventos
+import servidor
+
+
+ASGI_THREADS = int(os.environ.get('RESERVAS_ASGI_THREADS', banco.POOL_TAMANHO))
+# Partes de uma resposta em stream que podem esperar o cliente; acima disso a
+# thread que gera a resposta para até o envio andar
+FILA_RESPOSTA = 8
+
+executor = concurrent.futures.ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix='asgi')
+
+CABECALHOS_EVENTOS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'access-control-allow-origin', b'*'),
+] + [(nome.lower().encode(), valor.encode()) for nome, valor in servidor.CABECALHOS_EVENTOS.items()]
+
+
+def montar_environ(scope, corpo):
+    raiz = scope.get('root_path', '')
+    caminho = scope['path']
+    if raiz and caminho.startswith(raiz):
+        caminho = caminho[len(raiz):]
+    servidor_local = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': raiz.encode().decode('latin-1'),
+        'PATH_INFO': caminho.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': servidor_local[0],
+        'SERVER_PORT': str(servidor_local[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for nome, valor in scope['headers']:
+        nome = nome.decode('latin-1').upper().replace('-', '_')
+        chave = nome if nome in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{nome}'
+        valor = valor.decode('latin-1')
+        environ[chave] = f'{environ[chave]},{valor}' if chave in environ else valor
+    return environ
+
+
+async def ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'http.disconnect':
+            break
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            break
+    return b''.join(partes)
+
+
+async def delegar(scope, receive, send):
+    """
+    Responde pela aplicação Flask em uma thread do executor. Respostas em
+    stream (relatórios grandes) continuam saindo por partes, com no máximo
+    FILA_RESPOSTA partes à espera do cliente.
+    """
+    environ = montar_environ(scope, await ler_corpo(receive))
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue(FILA_RESPOSTA)
+    cancelado = threading.Event()
+
+    def colocar(mensagem):
+        asyncio.run_coroutine_threadsafe(fila.put(mensagem), loop).result()
+
+    def executar():
+        inicio = []
+
+        def start_response(status, cabecalhos, exc_info=None):
+            inicio[:] = [int(status.split(' ', 1)[0]),
+                         [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos]]
+
+        completo = False
+        try:
+            corpo = servidor.app(environ, start_response)
+            try:
+                if isinstance(corpo, (list, tuple)):
+                    colocar((*inicio, b''.join(corpo)))
+                    completo = True
+                    return
+                colocar(tuple(inicio))
+                for parte in corpo:
+                    if cancelado.is_set():
+                        break
+                    if parte:
+                        colocar(parte)
+            finally:
+                if hasattr(corpo, 'close'):
+                    corpo.close()
+        finally:
+            if not completo:
+                colocar(None)
+
+    async def vigiar_desconexao():
+        # Sem isto a thread continuaria gerando um relatório que ninguém vai ler
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        cancelado.set()
+
+    futuro = loop.run_in_executor(executor, executar)
+    vigia = asyncio.ensure_future(vigiar_desconexao())
+    try:
+        mensagem = await fila.get()
+        if mensagem is None:
+            # A aplicação falhou antes de começar a resposta: o servidor ASGI responde 500
+            await futuro
+            return
+        await send({'type': 'http.response.start', 'status': mensagem[0], 'headers': mensagem[1]})
+        if len(mensagem) == 3:
+            await send({'type': 'http.response.body', 'body': mensagem[2]})
+            return
+        while (parte := await fila.get()) is not None:
+            await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+        # Uma falha no meio do stream derruba a conexão em vez de fechar o corpo como se estivesse completo
+        await futuro
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        vigia.cancel()
+        # Se o envio falhou no meio, a thread pode estar parada esperando vaga na fila
+        cancelado.set()
+        while not futuro.done():
+            while not fila.empty():
+                fila.get_nowait()
+            await asyncio.wait([futuro], timeout=0.05)
+
+
+async def transmitir_eventos(scope, receive, send):
+    """O mesmo stream do /eventos de servidor.py, sem ocupar uma thread por cliente."""
+    cabecalhos = dict(scope['headers'])
+    parametros = urllib.parse.parse_qs(scope['query_string'].decode('latin-1'))
+    ultimo_id = servidor.ler_ultimo_evento(
+        cabecalhos.get(b'last-event-id', b'').decode('latin-1'), parametros.get('ultimo_id', [None])[0]
+    )
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, servidor.sincronizador.sincronizar)
+
+    sinal = asyncio.Event()
+
+    def avisar():
+        try:
+            loop.call_soon_threadsafe(sinal.set)
+        except RuntimeError:
+            pass  # event loop já encerrado
+
+    async def vigiar_desconexao():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        assinatura.encerrada = True
+        sinal.set()
+
+    assinatura = servidor.broker.assinar(ultimo_id, avisar)
+    vigia = asyncio.ensure_future(vigiar_desconexao())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': CABECALHOS_EVENTOS})
+        await send({'type': 'http.response.body', 'body': f'retry: {servidor.EVENTOS_RECONEXAO_MS}\n\n'.encode(),
+                    'more_body': True})
+        while True:
+            sinal.clear()
+            partes = []
+            while True:
+                try:
+                    evento = assinatura.fila.get_nowait()
+                except queue.Empty:
+                    break
+                if evento is not None:
+                    partes.append(eventos.formatar_sse(evento))
+            if partes:
+                await send({'type': 'http.response.body', 'body': ''.join(partes).encode(), 'more_body': True})
+            if assinatura.encerrada and assinatura.fila.empty():
+                break
+            try:
+                await asyncio.wait_for(sinal.wait(), servidor.EVENTOS_PING)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+        if not vigia.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        vigia.cancel()
+        servidor.broker.cancelar(assinatura)
+
+
+def encerrar_streams_ao_sair(loop):
+    """
+    O servidor ASGI espera as respostas em andamento antes de sair; os streams
+    do /eventos só terminam se forem encerrados quando o sinal chega.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        anterior = signal.getsignal(sinal)
+
+        def tratar(numero, quadro, anterior=anterior):
+            loop.call_soon_threadsafe(servidor.broker.encerrar)
+            if callable(anterior):
+                anterior(numero, quadro)
+
+        signal.signal(sinal, tratar)
+
+
+async def ciclo_de_vida(receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            try:
+                await loop.run_in_executor(executor, servidor.pool.preparar)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            encerrar_streams_ao_sair(loop)
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await loop.run_in_executor(executor, servidor.encerrar_worker)
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await ciclo_de_vida(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/eventos':
+        await transmitir_eventos(scope, receive, send)
+    elif scope['type'] == 'http':
+        await delegar(scope, receive, send)
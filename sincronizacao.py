@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import threading
+import time
+
+import registro
+
+
+SINCRONIZACAO_INTERVALO = float(os.environ.get('RESERVAS_SINCRONIZACAO_INTERVALO', '0.05'))
+SINCRONIZACAO_RECENTE = float(os.environ.get('RESERVAS_SINCRONIZACAO_RECENTE', '0.002'))
+ALTERACOES_MANTIDAS = int(os.environ.get('RESERVAS_ALTERACOES_MANTIDAS', '10000'))
+LIMPEZA_INTERVALO = float(os.environ.get('RESERVAS_LIMPEZA_INTERVALO', '60'))
+
+log = registro.obter('sincronizacao')
+
+SQL_ALTERACOES = '''
+    SELECT id, reserva_id, tipo, status, data_ord, mesa, garcom, hora_min, hora_fim_min,
+           data, hora, hora_fim, pessoas, responsavel
+    FROM alteracoes WHERE id > ? ORDER BY id
+'''
+
+# Apaga as alterações antigas, menos a última de cada dia, mesa e garçom e a
+# última do cadastro de mesas: é delas que versoes.py tira as versões de quem
+# carrega o estado do zero
+SQL_LIMPAR_ALTERACOES = '''
+    DELETE FROM alteracoes
+    WHERE id <= (SELECT max(id) FROM alteracoes) - ?
+      AND id NOT IN (SELECT max(id) FROM alteracoes WHERE tipo != 'mesa' GROUP BY data_ord)
+      AND id NOT IN (SELECT max(id) FROM alteracoes WHERE tipo != 'mesa' GROUP BY mesa)
+      AND id NOT IN (SELECT max(id) FROM alteracoes WHERE tipo != 'mesa' AND garcom IS NOT NULL GROUP BY garcom)
+      AND id NOT IN (SELECT max(id) FROM alteracoes WHERE tipo = 'mesa' GROUP BY tipo)
+'''
+
+
+class Sincronizador:
+    """
+    Mantém o estado em memória de um processo (índice de intervalos, versões,
+    cache e eventos) em dia com a tabela alteracoes, que os triggers preenchem
+    a cada mudança em reservas, venha ela deste processo, de outro worker ou
+    de outro programa usando o mesmo banco.
+
+    sincronizar() compara o PRAGMA data_version de uma conexão dedicada e, se
+    o banco mudou, entrega a aplicar(conn, alteracao) cada alteração ainda
+    não vista, em ordem de id. As rotas chamam sincronizar() antes de consultar o estado e
+    depois de cada commit; uma thread de fundo faz o mesmo a cada intervalo,
+    para que os eventos de outros workers cheguem sem depender de requisições.
+
+    Leituras podem aceitar um estado verificado há menos de recente segundos:
+    sincronizar(leitura=True) então volta sem tomar a trava nem consultar o
+    banco. Escritas, e quem precisa ver o próprio commit, chamam sem leitura.
+
+    Se o processo ficou para trás a ponto de a limpeza já ter apagado
+    alterações que ele não leu, recarregar(conn, ultimo_id) reconstrói o
+    estado inteiro a partir do banco.
+    """
+
+    def __init__(self, pool, aplicar, recarregar, intervalo=SINCRONIZACAO_INTERVALO,
+                 mantidas=ALTERACOES_MANTIDAS, limpeza_intervalo=LIMPEZA_INTERVALO,
+                 recente=SINCRONIZACAO_RECENTE):
+        self.pool = pool
+        self.intervalo = intervalo
+        self.recente = recente
+        self.mantidas = mantidas
+        self.limpeza_intervalo = limpeza_intervalo
+        self._aplicar = aplicar
+        self._recarregar = recarregar
+        self._conn = None
+        self._ultimo_id = 0
+        self._data_version = None
+        # Início da última verificação concluída (time.monotonic()); lido sem a trava
+        self._verificado_em = float('-inf')
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._estatisticas = {'aplicadas': 0, 'recargas': 0, 'limpezas': 0, 'erros': 0}
+
+    def iniciar(self):
+        with self._lock:
+            self._conn = self.pool.abrir_dedicada()
+            self._carregar()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name='sincronizacao', daemon=True)
+        self._thread.start()
+
+    def _versao_banco(self):
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _carregar(self):
+        # Estado e último id saem do mesmo snapshot de leitura
+        self._data_version = self._versao_banco()
+        self._conn.execute('BEGIN')
+        try:
+            self._ultimo_id = self._conn.execute('SELECT coalesce(max(id), 0) FROM alteracoes').fetchone()[0]
+            self._recarregar(self._conn, self._ultimo_id)
+        finally:
+            self._conn.rollback()
+        self._estatisticas['recargas'] += 1
+
+    def sincronizar(self, leitura=False):
+        """Aplica as alterações novas; devolve quantas foram aplicadas."""
+        if leitura and time.monotonic() - self._verificado_em < self.recente:
+            return 0
+        with self._lock:
+            if self._conn is None:
+                return 0
+            inicio = time.monotonic()
+            aplicadas = self._sincronizar()
+            # Só depois de aplicar: quem lê _verificado_em sem a trava não
+            # pode ver o horário novo com o estado antigo
+            self._verificado_em = inicio
+            return aplicadas
+
+    def _sincronizar(self):
+        versao = self._versao_banco()
+        if versao == self._data_version:
+            return 0
+        self._data_version = versao
+
+        alteracoes = self._conn.execute(SQL_ALTERACOES, (self._ultimo_id,)).fetchall()
+        # A limpeza pode deixar linhas soltas no meio do trecho apagado:
+        # só aplica se não faltar nenhuma entre o último id visto e o novo
+        if alteracoes and alteracoes[-1]['id'] != self._ultimo_id + len(alteracoes):
+            self._carregar()
+            return 0
+        for alteracao in alteracoes:
+            self._aplicar(self._conn, alteracao)
+            self._ultimo_id = alteracao['id']
+        self._estatisticas['aplicadas'] += len(alteracoes)
+        return len(alteracoes)
+
+    def _limpar(self, conn):
+        conn.execute(SQL_LIMPAR_ALTERACOES, (self.mantidas,))
+        conn.commit()
+        self._estatisticas['limpezas'] += 1
+
+    def _executar(self):
+        # A limpeza usa outra conexão para não segurar a trava de sincronizar()
+        conn = self.pool.abrir_dedicada()
+        proxima_limpeza = self.limpeza_intervalo
+        try:
+            while not self._parar.wait(self.intervalo):
+                try:
+                    self.sincronizar()
+                    proxima_limpeza -= self.intervalo
+                    if proxima_limpeza <= 0:
+                        proxima_limpeza = self.limpeza_intervalo
+                        self._limpar(conn)
+                except sqlite3.Error as e:
+                    self._estatisticas['erros'] += 1
+                    log.error('Sincronização com o banco falhou: %s', e)
+        finally:
+            conn.close()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def estatisticas(self):
+        with self._lock:
+            dados = dict(self._estatisticas)
+            dados['ultimo_id'] = self._ultimo_id
+        dados['intervalo'] = self.intervalo
+        return dados
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import pytest
+
+
+# banco.py e perfilador.py leem o ambiente na importação: servidor.py, nos
+# testes, usa um banco e um diretório de perfis novos, em um diretório temporário
+_diretorio = tempfile.TemporaryDirectory()
+os.environ['RESERVAS_DB'] = os.path.join(_diretorio.name, 'reservas.db')
+os.environ['RESERVAS_PERFIS_DIR'] = os.path.join(_diretorio.name, 'perfis')
+
+
+@pytest.fixture(scope='session')
+def cliente():
+    import servidor
+    return servidor.app.test_client()
+
+
+@pytest.fixture
+def reservar(cliente):
+    """Cria uma reserva (e a confirma, se garcom for informado) e devolve o id."""
+    def reservar(data, hora, mesa, garcom=None):
+        resposta = cliente.post('/reserva', json={
+            'data': data, 'hora': hora, 'mesa': mesa, 'pessoas': 2, 'responsavel': 'Teste',
+        })
+        assert resposta.status_code == 200, resposta.get_json()
+        reserva_id = resposta.get_json()['id']
+        if garcom is not None:
+            resposta = cliente.post(f'/confirmar/{reserva_id}', json={'garcom': garcom})
+            assert resposta.status_code == 200, resposta.get_json()
+        return reserva_id
+    return reservar
@@ -0,0 +1,49 @@
+def confirmar(cliente, reserva_id):
+    return cliente.post(f'/confirmar/{reserva_id}', json={'garcom': 'Joao'})
+
+
+def test_confirmacao_recusa_sobreposicao(cliente, reservar):
+    primeira = reservar('2099-02-10', '12:00', 3)
+    segunda = reservar('2099-02-10', '12:30', 3)
+    assert confirmar(cliente, primeira).status_code == 200
+    assert confirmar(cliente, segunda).status_code == 400
+
+
+def test_confirmacao_recusa_sobreposicao_apos_a_meia_noite(cliente, reservar):
+    vespera = reservar('2099-02-20', '23:30', 3)
+    seguinte = reservar('2099-02-21', '00:00', 3)
+    assert confirmar(cliente, vespera).status_code == 200
+    assert confirmar(cliente, seguinte).status_code == 400
+
+
+def test_confirmacao_recusa_sobreposicao_com_o_dia_seguinte(cliente, reservar):
+    vespera = reservar('2099-03-01', '23:30', 3)
+    seguinte = reservar('2099-03-02', '00:00', 3)
+    assert confirmar(cliente, seguinte).status_code == 200
+    assert confirmar(cliente, vespera).status_code == 400
+
+
+def test_criacao_e_disponibilidade_concordam_apos_a_meia_noite(cliente, reservar):
+    reservar('2099-03-10', '23:30', 3, garcom='Joao')
+    resposta = cliente.post('/reserva', json={
+        'data': '2099-03-11', 'hora': '00:00', 'mesa': 3, 'pessoas': 2, 'responsavel': 'Teste',
+    })
+    assert resposta.status_code == 400
+    livres = cliente.get('/disponibilidade?data=2099-03-11&hora=00:15&pessoas=2').get_json()
+    assert 3 not in [mesa['mesa'] for mesa in livres['mesas']]
+
+
+def test_lote_informa_conflito_recusado_pelo_trigger(cliente, reservar, monkeypatch):
+    import servidor
+
+    primeira = reservar('2099-03-20', '12:00', 6)
+    sobreposta = reservar('2099-03-20', '12:30', 6)
+    livre = reservar('2099-03-20', '12:00', 7)
+    assert confirmar(cliente, primeira).status_code == 200
+    # Simula um índice desatualizado: só o trigger do banco vê o conflito
+    monkeypatch.setattr(servidor.indice_intervalos, 'conflita', lambda *args, **kwargs: False)
+    resposta = cliente.post('/confirmar/lote', json={'ids': [sobreposta, livre], 'garcom': 'Joao'})
+    assert resposta.status_code == 200
+    resultados = {resultado['id']: resultado['status'] for resultado in resposta.get_json()['resultados']}
+    assert resultados == {sobreposta: 400, livre: 200}
+    assert resposta.get_json()['confirmadas'] == 1
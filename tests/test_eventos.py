@@ -0,0 +1,18 @@
+import servidor
+
+
+def test_eventos_recusa_clientes_acima_do_limite(cliente, monkeypatch):
+    monkeypatch.setattr(servidor, 'EVENTOS_MAXIMO', 1)
+    primeiro = cliente.get('/eventos')
+    assert primeiro.status_code == 200
+
+    recusado = cliente.get('/eventos')
+    assert recusado.status_code == 503
+    assert recusado.get_data(as_text=True).startswith('retry: ')
+    assert 'Retry-After' in recusado.headers
+
+    primeiro.close()
+    segundo = cliente.get('/eventos')
+    assert segundo.status_code == 200
+    segundo.close()
+    assert servidor.broker.estatisticas()['assinantes'] == 0
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+import horarios
+import migracoes
+import repositorio
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    migracoes.migrar(conn)
+    yield conn
+    conn.close()
+
+
+def inserir(conn, data, hora, mesa=3):
+    inicio = horarios.para_minutos(hora)
+    fim = horarios.fim_em_minutos(inicio)
+    return repositorio.inserir(conn, data, hora, mesa, 2, 'Teste', horarios.formatar(fim),
+                               horarios.data_para_ordinal(data), inicio, fim)
+
+
+@pytest.mark.parametrize('primeira, segunda', [
+    (('2099-02-10', '12:00'), ('2099-02-10', '12:30')),
+    (('2099-02-10', '23:30'), ('2099-02-11', '00:00')),
+    (('2099-02-11', '00:00'), ('2099-02-10', '23:30')),
+])
+def test_trigger_recusa_sobreposicao(conn, primeira, segunda):
+    repositorio.confirmar(conn, [inserir(conn, *primeira)], 'Joao')
+    with pytest.raises(sqlite3.IntegrityError, match='conflito_horario'):
+        repositorio.confirmar(conn, [inserir(conn, *segunda)], 'Joao')
+
+
+@pytest.mark.parametrize('primeira, segunda', [
+    (('2099-02-10', '12:00'), ('2099-02-10', '13:00')),
+    (('2099-02-10', '23:00'), ('2099-02-11', '00:00')),
+    (('2099-02-10', '23:30'), ('2099-02-11', '00:30')),
+    (('2099-02-10', '23:30'), ('2099-02-12', '00:00')),
+])
+def test_trigger_aceita_horarios_vizinhos(conn, primeira, segunda):
+    repositorio.confirmar(conn, [inserir(conn, *primeira)], 'Joao')
+    assert repositorio.confirmar(conn, [inserir(conn, *segunda)], 'Joao') == 1
@@ -0,0 +1,29 @@
+import horarios
+import intervalos
+
+
+def test_conflito_no_mesmo_dia():
+    indice = intervalos.IndiceIntervalos()
+    indice.adicionar(1, 3, 100, 12 * 60, 13 * 60)
+    assert indice.conflita(3, 100, 12 * 60 + 30, 13 * 60 + 30)
+    assert not indice.conflita(3, 100, 13 * 60, 14 * 60)
+    assert not indice.conflita(4, 100, 12 * 60, 13 * 60)
+    assert not indice.conflita(3, 100, 12 * 60, 13 * 60, ignorar_id=1)
+
+
+def test_reserva_da_vespera_que_passa_da_meia_noite():
+    indice = intervalos.IndiceIntervalos()
+    inicio = horarios.para_minutos('23:30')
+    indice.adicionar(1, 3, 100, inicio, horarios.fim_em_minutos(inicio))
+    assert indice.conflita(3, 101, 0, 60)
+    assert not indice.conflita(3, 101, 30, 90)
+    assert not indice.conflita(3, 101, 0, 60, ignorar_id=1)
+
+
+def test_reserva_que_passa_da_meia_noite_alcanca_o_dia_seguinte():
+    indice = intervalos.IndiceIntervalos()
+    indice.adicionar(1, 3, 101, 0, 60)
+    inicio = horarios.para_minutos('23:30')
+    assert indice.conflita(3, 100, inicio, horarios.fim_em_minutos(inicio))
+    inicio = horarios.para_minutos('23:00')
+    assert not indice.conflita(3, 100, inicio, horarios.fim_em_minutos(inicio))
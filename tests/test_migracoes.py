@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+import migracoes
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    yield conn
+    conn.close()
+
+
+def horarios_da_reserva(conn):
+    return conn.execute('SELECT hora, hora_fim, hora_min, hora_fim_min FROM reservas').fetchone()
+
+
+def test_banco_antigo_com_hora_sem_zero(conn):
+    # Esquema da primeira versão, antes de hora_fim existir
+    conn.execute('''
+        CREATE TABLE reservas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL, hora TEXT NOT NULL,
+            mesa INTEGER NOT NULL, pessoas INTEGER NOT NULL, responsavel TEXT NOT NULL,
+            status TEXT DEFAULT 'reservada', garcom TEXT
+        )
+    ''')
+    conn.execute("INSERT INTO reservas (data, hora, mesa, pessoas, responsavel) "
+                 "VALUES ('2099-03-01', '9:30', 1, 2, 'Ana')")
+    conn.commit()
+
+    migracoes.migrar(conn)
+
+    assert horarios_da_reserva(conn) == ('09:30', '10:30', 570, 630)
+
+
+def test_banco_ja_migrado_com_hora_sem_zero(conn):
+    # Estado deixado pelas migrações anteriores a _padronizar_horas
+    migracoes.migrar(conn)
+    conn.execute("INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, data_ord, hora_min, hora_fim_min) "
+                 "VALUES ('2099-03-01', '9:30', 1, 2, 'Ana', 730910, 540, 600)")
+    conn.execute(f'PRAGMA user_version = {len(migracoes.MIGRACOES) - 1}')
+    conn.commit()
+
+    assert migracoes.migrar(conn) == 1
+    assert horarios_da_reserva(conn) == ('09:30', '10:30', 570, 630)
@@ -0,0 +1,26 @@
+import perfilador
+
+
+def test_cabecalho_sem_token_nao_liga_o_perfil(cliente, monkeypatch):
+    monkeypatch.setattr(perfilador, 'PERFIL_TOKEN', '')
+    resposta = cliente.get('/mesas', headers={'X-Perfil': 'cprofile', 'X-Perfil-Token': ''})
+    assert 'X-Perfil-Id' not in resposta.headers
+    assert cliente.get('/debug/perfis').status_code == 404
+
+
+def test_token_errado_nao_liga_o_perfil(cliente, monkeypatch):
+    monkeypatch.setattr(perfilador, 'PERFIL_TOKEN', 'segredo')
+    resposta = cliente.get('/mesas', headers={'X-Perfil': 'cprofile', 'X-Perfil-Token': 'outro'})
+    assert 'X-Perfil-Id' not in resposta.headers
+    assert cliente.get('/debug/perfis', headers={'X-Perfil-Token': 'outro'}).status_code == 404
+
+
+def test_token_certo_liga_e_le_o_perfil(cliente, monkeypatch):
+    monkeypatch.setattr(perfilador, 'PERFIL_TOKEN', 'segredo')
+    token = {'X-Perfil-Token': 'segredo'}
+    resposta = cliente.get('/mesas', headers={'X-Perfil': 'amostragem', **token})
+    perfil_id = resposta.headers['X-Perfil-Id']
+    assert cliente.get(f'/debug/perfis/{perfil_id}').status_code == 404
+    perfil = cliente.get(f'/debug/perfis/{perfil_id}', headers=token).get_json()
+    assert perfil['modo'] == 'amostragem'
+    assert perfil_id in [item['id'] for item in cliente.get('/debug/perfis', headers=token).get_json()]
@@ -0,0 +1,28 @@
+import sqlite3
+
+import consultas
+import migracoes
+
+
+def test_consultas_quentes_usam_indices(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    try:
+        migracoes.migrar(conn)
+        assert consultas.verificar_planos(conn) == {}
+    finally:
+        conn.close()
+
+
+def test_varredura_de_indice_inteiro_falha(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    try:
+        migracoes.migrar(conn)
+        monkeypatch.setattr(consultas, 'CONSULTAS_INDEXADAS', {
+            'ordenada': ('SELECT id FROM reservas ORDER BY data_ord, hora_min', ()),
+            'listar_reservas_disponiveis': (consultas.SQL_RESERVAS_DISPONIVEIS, ()),
+        })
+        falhas = consultas.verificar_planos(conn)
+        assert list(falhas) == ['ordenada']
+        assert falhas['ordenada'][0].startswith('SCAN reservas USING')
+    finally:
+        conn.close()
@@ -0,0 +1,14 @@
+import catalogo
+
+
+def test_agregado_sem_mesas_cadastradas(cliente, reservar, monkeypatch):
+    import servidor
+    reservar('2099-07-01', '12:00', 17)
+    monkeypatch.setattr(servidor, 'catalogo_mesas', catalogo.CatalogoMesas())
+
+    resposta = cliente.get('/relatorio/agregado?inicio=2099-07-01&fim=2099-07-02')
+    assert resposta.status_code == 200, resposta.get_json()
+    relatorio = resposta.get_json()
+    assert relatorio['totais']['reservas'] == 1
+    assert relatorio['totais']['taxa_ocupacao'] == 0
+    assert [dia['taxa_ocupacao'] for dia in relatorio['por_dia']] == [0]
@@ -0,0 +1,35 @@
+def nova_reserva(**campos):
+    return {'data': '2099-06-01', 'hora': '12:00', 'mesa': 8, 'pessoas': 2, 'responsavel': 'Teste', **campos}
+
+
+def test_aceita_numeros_em_texto(cliente):
+    resposta = cliente.post('/reserva', json=nova_reserva(mesa='8', pessoas='2'))
+    assert resposta.status_code == 200, resposta.get_json()
+    reserva = [r for r in cliente.get('/relatorio/mesa/8', buffered=True).get_json()
+               if r['id'] == resposta.get_json()['id']]
+    assert reserva[0]['pessoas'] == 2
+
+
+def test_recusa_mesa_e_pessoas_que_nao_sao_inteiros(cliente):
+    for campos in ({'mesa': 'oito'}, {'pessoas': 'duas'}, {'pessoas': None}, {'mesa': True},
+                   {'pessoas': 2.7}, {'pessoas': '3.9'}, {'mesa': 'inf'}):
+        resposta = cliente.post('/reserva', json=nova_reserva(hora='13:00', **campos))
+        assert resposta.status_code == 400, campos
+        assert 'inteiros' in resposta.get_json()['mensagem']
+
+
+def test_recusa_mesa_fora_do_cadastro(cliente):
+    resposta = cliente.post('/reserva', json=nova_reserva(mesa=999))
+    assert resposta.status_code == 400
+    assert 'nao cadastrada' in resposta.get_json()['mensagem']
+
+
+def test_lote_recusa_numeros_fracionarios_por_linha(cliente):
+    lote = [nova_reserva(data='2099-06-02', pessoas=2.7), nova_reserva(data='2099-06-02', mesa='3.9'),
+            nova_reserva(data='2099-06-02', mesa=8.0, pessoas='2.0')]
+    resposta = cliente.post('/reservas/lote', json=lote)
+    assert resposta.status_code == 200, resposta.get_json()
+    relatorio = resposta.get_json()
+    assert relatorio['criadas'] == 1
+    assert [erro['linha'] for erro in relatorio['erros']] == [1, 2]
+    assert all('inteiros' in erro['mensagem'] for erro in relatorio['erros'])
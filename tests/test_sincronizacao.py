@@ -0,0 +1,29 @@
+import banco
+import migracoes
+import sincronizacao
+
+
+def test_leitura_aceita_verificacao_recente(tmp_path, monkeypatch):
+    pool = banco.PoolConexoes(str(tmp_path / 'reservas.db'), tamanho=1, preparar=migracoes.migrar)
+    sincronizador = sincronizacao.Sincronizador(pool, lambda conn, alteracao: None,
+                                                lambda conn, ultimo_id: None, intervalo=60, recente=60)
+    pool.preparar()
+    sincronizador.iniciar()
+    try:
+        sincronizador.sincronizar()
+        verificacoes = []
+        versao_banco = sincronizador._versao_banco
+        monkeypatch.setattr(sincronizador, '_versao_banco', lambda: verificacoes.append(1) or versao_banco())
+
+        sincronizador.sincronizar(leitura=True)
+        assert verificacoes == []
+        # Escritas (e quem precisa ver o próprio commit) sempre vão ao banco
+        sincronizador.sincronizar()
+        assert verificacoes == [1]
+
+        sincronizador.recente = 0
+        sincronizador.sincronizar(leitura=True)
+        assert verificacoes == [1, 1]
+    finally:
+        sincronizador.parar()
+        pool.fechar()
@@ -0,0 +1,25 @@
+import json
+
+
+def conexoes_livres(cliente):
+    pool = cliente.get('/debug/pool', buffered=True).get_json()
+    return pool['conexoes_livres'] == pool['conexoes_abertas']
+
+
+def test_conexao_fica_com_o_stream_ate_ele_fechar(cliente, reservar):
+    reservar('2099-04-01', '12:00', 5)
+    resposta = cliente.get('/relatorio/mesa/5')
+    assert not conexoes_livres(cliente)
+    assert [reserva['mesa'] for reserva in json.loads(resposta.get_data())] == [5]
+    resposta.close()
+    assert conexoes_livres(cliente)
+
+
+def test_stream_fechado_sem_ser_lido(cliente, reservar):
+    reservar('2099-04-02', '12:00', 5)
+    resposta = cliente.get('/relatorio/mesa/5')
+    outra = cliente.get('/relatorio/mesa/5')
+    resposta.close()
+    assert len(json.loads(outra.get_data())) == 2
+    outra.close()
+    assert conexoes_livres(cliente)
@@ -0,0 +1,67 @@
+import sqlite3
+
+import horarios
+import migracoes
+import repositorio
+import sincronizacao
+import versoes
+
+
+def acompanhar(conn, versoes_dados, ultimo_id):
+    """Aplica as alterações depois de ultimo_id como um worker que já estava no ar."""
+    for alteracao in conn.execute(sincronizacao.SQL_ALTERACOES, (ultimo_id,)):
+        if alteracao['tipo'] == 'mesa':
+            versoes_dados.iniciar(alteracao['id'])
+        else:
+            versoes_dados.alterar(alteracao['id'], alteracao['data_ord'], alteracao['mesa'], alteracao['garcom'])
+
+
+def versoes_de(versoes_dados, dias, mesas, garcons):
+    return (
+        versoes_dados.versao(),
+        [versoes_dados.versao_dia(dia) for dia in dias],
+        [versoes_dados.versao_mesa(mesa) for mesa in mesas],
+        [versoes_dados.versao_garcom(garcom) for garcom in garcons],
+    )
+
+
+def test_workers_chegam_as_mesmas_versoes(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    conn.row_factory = sqlite3.Row
+    migracoes.migrar(conn)
+    antigo = versoes.VersoesDados()
+    antigo.carregar(conn, 0)
+
+    conn.execute('UPDATE mesas SET capacidade = 6 WHERE id = 7')
+    dias = [horarios.data_para_ordinal(data) for data in ('2099-05-01', '2099-05-02', '2099-05-03')]
+    for mesa, (data, dia) in enumerate(zip(('2099-05-01', '2099-05-02'), dias), start=1):
+        reserva_id = repositorio.inserir(conn, data, '12:00', mesa, 2, 'Teste', '13:00', dia, 720, 780)
+        repositorio.confirmar(conn, [reserva_id], f'Garcom {mesa}')
+    reserva_id = repositorio.inserir(conn, '2099-05-01', '15:00', 1, 2, 'Teste', '16:00', dias[0], 900, 960)
+    repositorio.confirmar(conn, [reserva_id], 'Garcom 1')
+    conn.commit()
+    acompanhar(conn, antigo, 0)
+
+    ultimo_id = conn.execute('SELECT max(id) FROM alteracoes').fetchone()[0]
+    novo = versoes.VersoesDados()
+    novo.carregar(conn, ultimo_id)
+    escopos = (dias, [1, 2, 3], ['Garcom 1', 'Garcom 2', 'Garcom 3'])
+    assert versoes_de(novo, *escopos) == versoes_de(antigo, *escopos)
+
+    conn.execute(sincronizacao.SQL_LIMPAR_ALTERACOES, (1,))
+    depois_da_limpeza = versoes.VersoesDados()
+    depois_da_limpeza.carregar(conn, ultimo_id)
+    assert versoes_de(depois_da_limpeza, *escopos) == versoes_de(antigo, *escopos)
+    conn.close()
+
+
+def test_limpeza_guarda_a_ultima_alteracao_de_cada_escopo(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'reservas.db')
+    migracoes.migrar(conn)
+    dia = horarios.data_para_ordinal('2099-05-01')
+    for inicio in (600, 720, 840):
+        repositorio.inserir(conn, '2099-05-01', horarios.formatar(inicio), 1, 2, 'Teste',
+                            horarios.formatar(inicio + 60), dia, inicio, inicio + 60)
+    conn.execute(sincronizacao.SQL_LIMPAR_ALTERACOES, (0,))
+    assert conn.execute('SELECT id FROM alteracoes').fetchall() == [(3,)]
+    conn.close()
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+import banco
+import migracoes
+
+
+def test_wal_nao_cresce_com_leitores_sempre_ativos(tmp_path):
+    caminho = str(tmp_path / 'reservas.db')
+    pool = banco.PoolConexoes(caminho, tamanho=4, preparar=migracoes.migrar, checkpoint_intervalo=0.02, wal_limite=200)
+    pool.preparar()
+    parar = threading.Event()
+
+    def ler():
+        # Duas leituras que se sobrepõem: sempre há uma transação de leitura aberta
+        conexoes = [pool.obter(), pool.obter()]
+        try:
+            vez = 0
+            conexoes[vez].execute('BEGIN')
+            conexoes[vez].execute('SELECT count(*) FROM reservas').fetchone()
+            while not parar.is_set():
+                outra = 1 - vez
+                conexoes[outra].execute('BEGIN')
+                conexoes[outra].execute('SELECT count(*) FROM reservas').fetchone()
+                conexoes[vez].rollback()
+                vez = outra
+            conexoes[vez].rollback()
+        finally:
+            for conn in conexoes:
+                pool.liberar(conn)
+
+    leitor = threading.Thread(target=ler)
+    leitor.start()
+    maior_wal = 0
+    conn = pool.obter()
+    try:
+        for i in range(1500):
+            banco.executar_transacao(conn, lambda con: con.execute(
+                "INSERT INTO reservas (data, hora, mesa, pessoas, responsavel, status, data_ord, hora_min, hora_fim_min)"
+                " VALUES ('2099-01-01', '12:00', ?, 2, ?, 'finalizada', 730000, 720, 780)", (i % 20 + 1, 'x' * 200)
+            ))
+            time.sleep(0.0005)
+            if i % 50 == 0:
+                maior_wal = max(maior_wal, os.path.getsize(caminho + '-wal'))
+    finally:
+        parar.set()
+        leitor.join()
+        pool.liberar(conn)
+        pool.fechar()
+
+    assert maior_wal < 20 * 200 * 4096
+    assert pool.estatisticas()['checkpoints_truncate'] > 0
@@ -0,0 +1,86 @@
+import threading
+
+
+SQL_ULTIMA_MUDANCA_MESAS = "SELECT coalesce(max(id), 0) FROM alteracoes WHERE tipo = 'mesa'"
+SQL_VERSOES_DIAS = "SELECT data_ord, max(id) FROM alteracoes WHERE tipo != 'mesa' AND id > ? GROUP BY data_ord"
+SQL_VERSOES_MESAS = "SELECT mesa, max(id) FROM alteracoes WHERE tipo != 'mesa' AND id > ? GROUP BY mesa"
+SQL_VERSOES_GARCONS = '''
+    SELECT garcom, max(id) FROM alteracoes
+    WHERE tipo != 'mesa' AND id > ? AND garcom IS NOT NULL AND garcom != '' GROUP BY garcom
+'''
+
+
+class VersoesDados:
+    """
+    Versões das reservas por escopo (dia, mesa e garçom), usadas para gerar ETags.
+
+    A versão é o id, na tabela alteracoes, da última mudança que tocou o
+    escopo, e nunca menor que o id da última mudança no cadastro de mesas
+    (a base). carregar() lê essas versões da própria tabela e alterar() as
+    avança com cada linha nova, então dois workers que leram alteracoes até
+    o mesmo id chegam às mesmas versões, não importa quando cada um subiu; e
+    como os ids são crescentes e persistem no banco, uma ETag antiga nunca
+    volta a valer, nem depois de reiniciar o servidor. A limpeza de
+    alteracoes (sincronizacao.py) preserva a última linha de cada escopo.
+    Uma rota pode responder 304 comparando números, sem consultar o banco.
+    """
+
+    def __init__(self):
+        self._base = 0
+        self._atual = 0
+        self._dias = {}
+        self._mesas = {}
+        self._garcons = {}
+        self._lock = threading.Lock()
+
+    def carregar(self, conn, ultimo_id):
+        """Versões de todos os escopos a partir de alteracoes, até ultimo_id."""
+        base = conn.execute(SQL_ULTIMA_MUDANCA_MESAS).fetchone()[0]
+        dias = dict(conn.execute(SQL_VERSOES_DIAS, (base,)).fetchall())
+        mesas = dict(conn.execute(SQL_VERSOES_MESAS, (base,)).fetchall())
+        garcons = dict(conn.execute(SQL_VERSOES_GARCONS, (base,)).fetchall())
+        with self._lock:
+            self._base = base
+            self._atual = ultimo_id
+            self._dias = dias
+            self._mesas = mesas
+            self._garcons = garcons
+
+    def iniciar(self, base):
+        with self._lock:
+            self._base = self._atual = base
+            self._dias = {}
+            self._mesas = {}
+            self._garcons = {}
+
+    def alterar(self, versao, data_ord, mesa, garcom=None):
+        with self._lock:
+            self._atual = versao
+            self._dias[data_ord] = versao
+            self._mesas[mesa] = versao
+            if garcom:
+                self._garcons[garcom] = versao
+            return versao
+
+    def versao(self):
+        return self._atual
+
+    def versao_dia(self, data_ord):
+        return self._dias.get(data_ord, self._base)
+
+    def versao_mesa(self, mesa):
+        return self._mesas.get(mesa, self._base)
+
+    def versao_garcom(self, garcom):
+        return self._garcons.get(garcom, self._base)
+
+    def versao_periodo(self, inicio_ord, fim_ord):
+        """Maior versão entre os dias do período (percorre o que for menor: o período ou os dias alterados)."""
+        if fim_ord - inicio_ord + 1 <= len(self._dias):
+            return max((self._dias.get(dia, self._base) for dia in range(inicio_ord, fim_ord + 1)), default=self._base)
+        with self._lock:
+            dias = list(self._dias.items())
+        return max((versao for dia, versao in dias if inicio_ord <= dia <= fim_ord), default=self._base)
+
+    def etag(self, *partes):
+        return '-'.join(map(str, partes))